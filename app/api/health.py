@@ -0,0 +1,34 @@
+# Liveness and readiness probes
+import asyncio
+
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from app.database import get_async_client
+from app.services.ai_client import breaker
+from app.settings import settings
+
+router = APIRouter()
+
+@router.get("/healthz", include_in_schema=False)
+async def healthz():
+    # The process is up and its event loop is responsive
+    return {"status": "ok"}
+
+@router.get("/readyz", include_in_schema=False)
+async def readyz():
+    try:
+        await asyncio.wait_for(
+            get_async_client().admin.command("ping"), timeout=settings.readiness_timeout_seconds
+        )
+        database = "ok"
+    except Exception as e:
+        print(f"Readiness check: database ping failed: {e}")
+        database = "unavailable"
+
+    circuit = breaker.state
+    ready = database == "ok" and circuit != breaker.OPEN
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"ready": ready, "database": database, "ai_circuit": circuit},
+    )
@@ -0,0 +1,41 @@
+# Prometheus scrape endpoint, served to the internal network only
+import ipaddress
+import os
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, generate_latest, multiprocess
+
+from app.settings import settings
+
+router = APIRouter()
+
+_allowed_networks = [
+    ipaddress.ip_network(network.strip())
+    for network in settings.metrics_allowed_networks.split(",")
+    if network.strip()
+]
+
+
+def internal_client(request: Request):
+    # Behind nginx the client address comes from X-Forwarded-For (see serve.py)
+    try:
+        address = ipaddress.ip_address(request.client.host)
+    except (AttributeError, ValueError):
+        address = None
+    if address is None or not any(address in network for network in _allowed_networks):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Metrics are only available from the internal network",
+        )
+
+def _registry():
+    # Under serve.py with several workers, aggregate the samples every worker wrote
+    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+@router.get("/metrics", include_in_schema=False, dependencies=[Depends(internal_client)])
+def metrics():
+    return Response(generate_latest(_registry()), media_type=CONTENT_TYPE_LATEST)
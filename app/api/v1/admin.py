@@ -0,0 +1,60 @@
+# Admin routes for v1
+from fastapi import APIRouter, Depends, Query
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from app.database import get_pool_stats
+from app.dependencies import get_async_database
+from app.middleware.compression import compression_stats
+from app.middleware.concurrency import concurrency_limiter
+from app.security.security import hash_stats
+from app.services.admission import ai_admission
+from app.services.answer_cache import cache_stats, invalidate_category
+from app.services.consultation_jobs import job_queue_stats
+from app.services.consultation_service import ai_requests
+from app.services.email_outbox import outbox_stats
+from app.utils.auth_utils import get_admin_user
+
+router = APIRouter(dependencies=[Depends(get_admin_user)])
+
+@router.get("/db/pool")
+def database_pool_stats():
+    return get_pool_stats()
+
+@router.get("/concurrency")
+def concurrency_limit_stats():
+    return concurrency_limiter.stats()
+
+@router.get("/compression")
+def response_compression_stats():
+    return compression_stats.snapshot()
+
+@router.get("/answer-cache")
+def answer_cache_stats():
+    return cache_stats()
+
+@router.delete("/answer-cache")
+async def invalidate_answer_cache(
+    category: str = Query(..., description="Drop every cached answer tagged with this category"),
+    db: AsyncIOMotorDatabase = Depends(get_async_database),
+):
+    return {"category": category, "removed": await invalidate_category(db, category)}
+
+@router.get("/ai/coalescing")
+def ai_coalescing_stats():
+    return ai_requests.stats()
+
+@router.get("/ai/admission")
+def ai_admission_stats():
+    return ai_admission.stats()
+
+@router.get("/consultation-jobs")
+def consultation_job_stats():
+    return job_queue_stats()
+
+@router.get("/password-hashing")
+def password_hashing_stats():
+    return hash_stats.snapshot()
+
+@router.get("/email-outbox")
+async def email_outbox_stats(db: AsyncIOMotorDatabase = Depends(get_async_database)):
+    return await outbox_stats(db)
@@ -1,36 +1,103 @@
 # api/consultation.py
 
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException ,Query
-from pymongo.collection import Collection
-from app.dependencies import get_database
-from app.schemas.Consultation import ConsultationBase, ConsultationResponce, Consultations
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException ,Query, Request, Response, status
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from app.dependencies import get_async_database
+from app.responses import ClosingStreamingResponse
+from app.settings import settings
+from app.schemas.Consultation import (
+    ConsultationBase, ConsultationBatch, ConsultationBatchDelete, ConsultationIds, ConsultationJob,
+    ConsultationResponce, Consultations, ConsultationSearchResult,
+)
+from app.services.consultation_jobs import submit_consultation_job
 from app.utils.auth_utils import get_current_user  # Updated import
-from app.services.consultation_service import create_consultation, delete_consultation, get_consultation_by_id, get_user_consultations
+from app.services.consultation_service import (
+    consultation_validators, create_consultation, delete_consultation, delete_consultations,
+    get_consultation_by_id, get_consultation_validators, get_consultations_by_ids, get_listing_validators,
+    get_user_consultations, search_consultations, stream_consultation,
+)
+from app.utils.conditional import has_validators, is_not_modified, not_modified_response, set_validators
 
 router = APIRouter()
 
 @router.post("/consultation/create", response_model=ConsultationResponce)
-async def add_consultation(consultation_data: ConsultationBase, db: Collection = Depends(get_database), current_user = Depends(get_current_user)):
+async def add_consultation(consultation_data: ConsultationBase, db: AsyncIOMotorDatabase = Depends(get_async_database), current_user = Depends(get_current_user)):
     try:
         consultation = await create_consultation(current_user.id, consultation_data, db)
         return consultation
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/consultation/create/stream")
+async def add_consultation_stream(consultation_data: ConsultationBase, db: AsyncIOMotorDatabase = Depends(get_async_database), current_user = Depends(get_current_user)):
+    events = await stream_consultation(current_user.id, consultation_data, db)
+    return ClosingStreamingResponse(
+        events,
+        media_type="text/event-stream",
+        # Keep nginx from buffering the events
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.post("/consultation/create/job", response_model=ConsultationJob, status_code=status.HTTP_202_ACCEPTED)
+async def add_consultation_job(consultation_data: ConsultationBase, db: AsyncIOMotorDatabase = Depends(get_async_database), current_user = Depends(get_current_user)):
+    return await submit_consultation_job(current_user.id, consultation_data, db)
+
 @router.put("/consultation/{id}", response_model=ConsultationResponce)
-def update_consultation(id :str, db: Collection = Depends(get_database), current_user = Depends(get_current_user)):
-    return delete_consultation(id,current_user.id, db)
+async def update_consultation(id :str, db: AsyncIOMotorDatabase = Depends(get_async_database), current_user = Depends(get_current_user)):
+    return await delete_consultation(id,current_user.id, db)
+
+@router.get("/consultations/search", response_model=List[ConsultationSearchResult])
+async def search_user_consultations(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=settings.consultations_search_max_query_length, description="Words to look for in titles, questions and answers"),
+    lang: Optional[str] = Query(None, pattern="^(ar|fr|en)$", description="Language of the query; guessed from the words when omitted"),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from the X-Next-Cursor header of the previous page"),
+    size: int = Query(10, ge=1, le=settings.consultations_max_page_size, description="Number of items per page"),
+    db: AsyncIOMotorDatabase = Depends(get_async_database),
+    current_user = Depends(get_current_user),
+):
+    results, next_cursor = await search_consultations(current_user.id, db, q, size, cursor, lang)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return results
 
 @router.get("/consultation/{id}", response_model=ConsultationResponce)
-def consultation_by_id(id :str, db: Collection = Depends(get_database), current_user = Depends(get_current_user)):
-    return get_consultation_by_id(id,current_user.id, db)
+async def consultation_by_id(id :str, request: Request, response: Response, db: AsyncIOMotorDatabase = Depends(get_async_database), current_user = Depends(get_current_user)):
+    if has_validators(request):
+        etag, last_modified = await get_consultation_validators(id, current_user.id, db)
+        if is_not_modified(request, etag, last_modified):
+            return not_modified_response(etag, last_modified)
+    consultation = await get_consultation_by_id(id,current_user.id, db)
+    set_validators(response, *consultation_validators(id, consultation))
+    return consultation
 
 @router.get("/consultations", response_model=List[Consultations])
-def list_consultations(
-    db: Collection = Depends(get_database),
+async def list_consultations(
+    request: Request,
+    response: Response,
+    db: AsyncIOMotorDatabase = Depends(get_async_database),
     current_user = Depends(get_current_user),
-    page: int = Query(1, ge=1, description="Page number starting from 1"),
-    size: int = Query(10, ge=1, description="Number of items per page")
+    cursor: Optional[str] = Query(None, description="Opaque cursor from the X-Next-Cursor header of the previous page"),
+    page: int = Query(1, ge=1, description="Page number starting from 1 (ignored when a cursor is given)"),
+    size: int = Query(10, ge=1, le=settings.consultations_max_page_size, description="Number of items per page")
 ):
-    return get_user_consultations(current_user.id, db, page, size)
+    # Read before the page, so a concurrent write can only make the ETag stale, never too new
+    etag, last_modified = await get_listing_validators(current_user.id, db)
+    if is_not_modified(request, etag, last_modified):
+        return not_modified_response(etag, last_modified)
+    consultations, next_cursor = await get_user_consultations(current_user.id, db, page, size, cursor)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    set_validators(response, etag, last_modified)
+    return consultations
+
+@router.post("/consultations/batch-get", response_model=ConsultationBatch)
+async def batch_get_consultations(body: ConsultationIds, db: AsyncIOMotorDatabase = Depends(get_async_database), current_user = Depends(get_current_user)):
+    return await get_consultations_by_ids(body.ids, current_user.id, db)
+
+@router.post("/consultations/batch-delete", response_model=ConsultationBatchDelete)
+async def batch_delete_consultations(body: ConsultationIds, db: AsyncIOMotorDatabase = Depends(get_async_database), current_user = Depends(get_current_user)):
+    return await delete_consultations(body.ids, current_user.id, db)
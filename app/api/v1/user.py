@@ -2,7 +2,9 @@
 from fastapi import APIRouter, Depends, HTTPException
 from pymongo.collection import Collection
 
-from app.dependencies import get_database
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from app.dependencies import get_async_database, get_database
 from app.schemas.user import ChangeMail, ChangeRole, UserDetails, VerifyMail
 from app.services.user_service import send_validation_code, user_change_mail, user_change_role, verify_validation_code
 from app.utils.auth_utils import get_current_user
@@ -28,7 +30,7 @@ def read_user(mailObject: ChangeMail ,user = Depends(get_current_user), db: Coll
     return user_change_mail(user,  db , mailObject.email)
 
 @router.post("/sendValidationCode")
-async def read_user(user = Depends(get_current_user), db: Collection = Depends(get_database)):
+async def read_user(user = Depends(get_current_user), db: AsyncIOMotorDatabase = Depends(get_async_database)):
     if user is None:
         raise HTTPException(status_code=404, detail="User not found")
     return await send_validation_code(user, db)
@@ -0,0 +1,151 @@
+# Shared MongoDB client and connection pool monitoring
+import threading
+from typing import Optional
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import MongoClient, monitoring
+from pymongo.server_api import ServerApi
+
+from app.metrics import MONGO_POOL_CHECKED_OUT, MONGO_POOL_OPEN
+from app.settings import settings
+
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """Keeps running counters of the connection pool so it can be sized."""
+
+    def __init__(self, client: str):
+        self._lock = threading.Lock()
+        self._open_gauge = MONGO_POOL_OPEN.labels(client)
+        self._checked_out_gauge = MONGO_POOL_CHECKED_OUT.labels(client)
+        self.open_connections = 0
+        self.checked_out = 0
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open_connections += 1
+            self._open_gauge.set(self.open_connections)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open_connections = max(self.open_connections - 1, 0)
+            self._open_gauge.set(self.open_connections)
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.checkout_failures += 1
+
+    def connection_checked_out(self, event):
+        # `duration` is the time spent waiting in the pool's wait queue
+        waited = getattr(event, "duration", None) or 0.0
+        with self._lock:
+            self.checked_out += 1
+            self._checked_out_gauge.set(self.checked_out)
+            self.checkouts += 1
+            self.wait_time_total += waited
+            self.wait_time_max = max(self.wait_time_max, waited)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out = max(self.checked_out - 1, 0)
+            self._checked_out_gauge.set(self.checked_out)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "max_pool_size": settings.mongo_max_pool_size,
+                "open_connections": self.open_connections,
+                "checked_out": self.checked_out,
+                "idle": max(self.open_connections - self.checked_out, 0),
+                "checkouts": self.checkouts,
+                "checkout_failures": self.checkout_failures,
+                "wait_queue_time_avg_ms": (
+                    self.wait_time_total / self.checkouts * 1000 if self.checkouts else 0.0
+                ),
+                "wait_queue_time_max_ms": self.wait_time_max * 1000,
+            }
+
+
+# One listener per client: the sync and Motor clients each have their own pool
+pool_stats = {"sync": PoolStatsListener("sync"), "async": PoolStatsListener("async")}
+
+_client: Optional[MongoClient] = None
+_async_client: Optional[AsyncIOMotorClient] = None
+
+
+def client_options(listener: PoolStatsListener) -> dict:
+    w = settings.mongo_write_concern
+    return {
+        "server_api": ServerApi('1'),
+        "tlsAllowInvalidCertificates": True,
+        "maxPoolSize": settings.mongo_max_pool_size,
+        "minPoolSize": settings.mongo_min_pool_size,
+        "maxIdleTimeMS": settings.mongo_max_idle_time_ms,
+        "waitQueueTimeoutMS": settings.mongo_wait_queue_timeout_ms,
+        "connectTimeoutMS": settings.mongo_connect_timeout_ms,
+        "serverSelectionTimeoutMS": settings.mongo_server_selection_timeout_ms,
+        "socketTimeoutMS": settings.mongo_socket_timeout_ms,
+        "readConcernLevel": settings.mongo_read_concern,
+        "w": int(w) if w.isdigit() else w,
+        "wTimeoutMS": settings.mongo_write_timeout_ms,
+        "event_listeners": [listener],
+    }
+
+
+def connect_to_mongo() -> MongoClient:
+    global _client
+    if _client is None:
+        _client = MongoClient(settings.database_url, **client_options(pool_stats["sync"]))
+    return _client
+
+
+def connect_to_mongo_async() -> AsyncIOMotorClient:
+    global _async_client
+    if _async_client is None:
+        _async_client = AsyncIOMotorClient(settings.database_url, **client_options(pool_stats["async"]))
+    return _async_client
+
+
+def close_mongo_connection():
+    global _client, _async_client
+    if _client is not None:
+        _client.close()
+        _client = None
+    if _async_client is not None:
+        _async_client.close()
+        _async_client = None
+
+
+def get_client() -> MongoClient:
+    # Scripts and tests that never ran the startup hook still get the shared client
+    return connect_to_mongo()
+
+
+def get_async_client() -> AsyncIOMotorClient:
+    return connect_to_mongo_async()
+
+
+def get_pool_stats() -> dict:
+    """Per-client pool counters; `max_pool_size` applies to each pool separately."""
+    return {client: listener.snapshot() for client, listener in pool_stats.items()}
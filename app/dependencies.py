@@ -1,18 +1,15 @@
 # In dependencies.py
 from fastapi import HTTPException, Request
-from pymongo import MongoClient
-from contextlib import contextmanager
+from app.database import get_async_client, get_client
 from app.settings import settings
-from pymongo.server_api import ServerApi
 
 
 def get_database():
-    client = MongoClient(settings.database_url, server_api=ServerApi('1'), tlsAllowInvalidCertificates=True)
-    db = client[settings.database_name]
-    try:
-        yield db
-    finally:
-        client.close()
+    return get_client()[settings.database_name]
+
+
+def get_async_database():
+    return get_async_client()[settings.database_name]
         
 async def user_data_authorization(request: Request, username: str):
     if username and request.state.user != username:
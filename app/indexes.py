@@ -0,0 +1,133 @@
+# Declarative index registry for every collection
+#
+# Applied idempotently at startup. Run `python -m app.indexes` to print the
+# drift between this registry and a live database.
+import sys
+from typing import Dict, List
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ASCENDING, IndexModel
+from pymongo.database import Database
+from pymongo.errors import OperationFailure
+
+from app.repositories.consultations import LISTING_INDEX, SEARCH_INDEX, SEARCH_INDEX_OPTIONS
+
+# Options that change an index's behaviour and must match for it to count as the same index
+_COMPARED_OPTIONS = (
+    "unique", "sparse", "expireAfterSeconds", "partialFilterExpression",
+    "weights", "default_language", "language_override",
+)
+
+INDEXES: Dict[str, List[IndexModel]] = {
+    "users": [
+        IndexModel([("username", ASCENDING)], name="username_unique", unique=True),
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+    ],
+    "consultations": [
+        IndexModel(LISTING_INDEX, name="user_listing"),
+        IndexModel(SEARCH_INDEX, name="user_search", **SEARCH_INDEX_OPTIONS),
+    ],
+    "password_reset_tokens": [
+        IndexModel([("token", ASCENDING)], name="token"),
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "email_outbox": [
+        IndexModel([("status", ASCENDING), ("next_attempt_at", ASCENDING)], name="dispatch_queue"),
+        IndexModel([("expire_at", ASCENDING)], name="expire_at_ttl", expireAfterSeconds=0),
+    ],
+    "answer_cache": [
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+        IndexModel([("categories", ASCENDING)], name="categories"),
+    ],
+}
+
+
+async def apply_indexes(db: AsyncIOMotorDatabase):
+    """Create every registered index; indexes that already exist are left alone.
+
+    Indexes are created one at a time so a failure only costs that index. An
+    existing index with the same keys under another name (e.g. created before
+    the registry named it) is dropped first, as the server refuses to build
+    the same index twice.
+    """
+    for collection, indexes in INDEXES.items():
+        for index in indexes:
+            wanted = index.document
+            try:
+                existing = await db[collection].index_information()
+                for name in _same_keys(existing, wanted):
+                    print(f"Replacing index {name} on {collection} with {wanted['name']}")
+                    await db[collection].drop_index(name)
+                await db[collection].create_indexes([index])
+            except OperationFailure as e:
+                # A conflicting index (or duplicate data under a unique one) must not keep the API down
+                print(f"Failed to create index {wanted['name']} on {collection}: {e}")
+
+
+def _same_keys(existing: dict, wanted: dict) -> List[str]:
+    """Names of existing indexes other than `wanted` that the server would treat as the same one."""
+    key = _normalize_key(wanted["key"].items())
+    is_text = ("_fts", "text") in key
+    return [
+        name
+        for name, spec in existing.items()
+        if name not in ("_id_", wanted["name"])
+        # A collection holds a single text index whatever its fields
+        and (_normalize_key(spec["key"]) == key or (is_text and ("_fts", "text") in _normalize_key(spec["key"])))
+    ]
+
+
+def _normalize_key(key) -> list:
+    normalized = []
+    for field, direction in key:
+        if direction == "text" or field == "_ftsx":
+            # The server stores every text field of the index as one `_fts`/`_ftsx` pair
+            if ("_fts", "text") not in normalized:
+                normalized += [("_fts", "text"), ("_ftsx", 1)]
+            continue
+        normalized.append((field, int(direction) if isinstance(direction, (int, float)) else direction))
+    return normalized
+
+
+def _options(spec: dict) -> dict:
+    return {option: spec[option] for option in _COMPARED_OPTIONS if option in spec}
+
+
+def index_drift(db: Database) -> List[str]:
+    """Describe every difference between the registry and the indexes in `db`."""
+    drift = []
+    for collection, indexes in INDEXES.items():
+        existing = {
+            name: spec
+            for name, spec in db[collection].index_information().items()
+            if name != "_id_"
+        }
+        for index in indexes:
+            wanted = index.document
+            name = wanted["name"]
+            current = existing.pop(name, None)
+            if current is None:
+                drift.append(f"{collection}: missing index {name} {dict(wanted['key'])}")
+                continue
+            if _normalize_key(current["key"]) != _normalize_key(wanted["key"].items()):
+                drift.append(f"{collection}: index {name} has keys {current['key']}, expected {list(wanted['key'].items())}")
+            if _options(current) != _options(wanted):
+                drift.append(f"{collection}: index {name} has options {_options(current)}, expected {_options(wanted)}")
+        for name in existing:
+            drift.append(f"{collection}: unregistered index {name}")
+    return drift
+
+
+def main() -> int:
+    from app.dependencies import get_database
+
+    drift = index_drift(get_database())
+    for line in drift:
+        print(line)
+    if not drift:
+        print("Indexes match the registry.")
+    return 1 if drift else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
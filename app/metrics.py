@@ -0,0 +1,115 @@
+# Prometheus metrics
+#
+# Labels only ever hold bounded values: route templates, methods, status
+# codes and fixed outcome names, never raw paths or ids.
+import os
+
+from prometheus_client import Counter, Gauge, Histogram, multiprocess
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route"],
+)
+HTTP_REQUESTS = Counter(
+    "http_requests_total",
+    "HTTP responses by route template and status code",
+    ["method", "route", "status"],
+)
+HTTP_IN_FLIGHT = Gauge(
+    "http_requests_in_flight",
+    "HTTP requests currently being served",
+    multiprocess_mode="livesum",
+)
+CONCURRENCY_REJECTED = Counter(
+    "http_requests_shed_total",
+    "Requests rejected by the adaptive concurrency limiter",
+    ["priority"],
+)
+COMPRESSION_INPUT_BYTES = Counter(
+    "http_compression_input_bytes_total",
+    "Response bytes before compression",
+    ["route", "encoding"],
+)
+COMPRESSION_OUTPUT_BYTES = Counter(
+    "http_compression_output_bytes_total",
+    "Response bytes after compression",
+    ["route", "encoding"],
+)
+COMPRESSION_CPU_SECONDS = Counter(
+    "http_compression_cpu_seconds_total",
+    "CPU time spent compressing responses",
+    ["route", "encoding"],
+)
+
+AI_UPSTREAM_DURATION = Histogram(
+    "ai_upstream_request_duration_seconds",
+    "Latency of calls to the AI upstream",
+    ["endpoint", "outcome"],
+    buckets=(0.25, 0.5, 1, 2, 4, 8, 15, 30, 60, 120),
+)
+AI_UPSTREAM_ERRORS = Counter(
+    "ai_upstream_errors_total",
+    "Failed calls to the AI upstream by returned status code",
+    ["endpoint", "status"],
+)
+AI_ADMISSION_REJECTED = Counter(
+    "ai_admission_rejected_total",
+    "Consultation requests shed before reaching the AI upstream",
+    ["reason"],
+)
+
+# Live state is set by each worker where it changes; in multiprocess mode a
+# scrape then sums the workers that are still alive. Ratios are left to the
+# query, e.g. rate(ai_requests_total{result="coalesced"}) / rate(ai_requests_total).
+CONCURRENCY_LIMIT = Gauge(
+    "http_concurrency_limit",
+    "Adaptive concurrency limit, summed over workers",
+    multiprocess_mode="livesum",
+)
+MONGO_POOL_OPEN = Gauge(
+    "mongo_pool_connections_open",
+    "Open MongoDB connections",
+    ["client"],
+    multiprocess_mode="livesum",
+)
+MONGO_POOL_CHECKED_OUT = Gauge(
+    "mongo_pool_connections_checked_out",
+    "MongoDB connections in use",
+    ["client"],
+    multiprocess_mode="livesum",
+)
+PASSWORD_HASH_QUEUE = Gauge(
+    "password_hash_queue_length",
+    "Hash operations waiting for a thread",
+    multiprocess_mode="livesum",
+)
+ANSWER_CACHE_LOOKUPS = Counter(
+    "answer_cache_lookups_total",
+    "Answer cache lookups by result: memory_hit, persistent_hit or miss",
+    ["result"],
+)
+AI_REQUESTS = Counter(
+    "ai_requests_total",
+    "AI answers requested: upstream for a new call, coalesced when sharing one in flight",
+    ["result"],
+)
+
+PASSWORD_HASH_DURATION = Histogram(
+    "password_hash_duration_seconds",
+    "bcrypt hash and verify durations",
+    ["operation"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2),
+)
+
+EMAIL_SEND_DURATION = Histogram(
+    "email_send_duration_seconds",
+    "Outbound SMTP delivery duration",
+    ["outcome"],
+)
+
+
+def mark_worker_stopped():
+    # Drops this worker's live gauge samples from the shared multiprocess directory
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        multiprocess.mark_process_dead(os.getpid())
@@ -0,0 +1,65 @@
+# app/middleware/auth.py
+# Pure ASGI authentication middleware
+
+from typing import Optional
+
+from jose import JWTError
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.services.auth_cache import decode_access_token
+
+
+def bearer_token(scope: Scope) -> Optional[str]:
+    """Return the token of a `Bearer` Authorization header, or None when there is none."""
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, credentials = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer" and credentials.strip():
+                return credentials.strip()
+            raise ValueError("Invalid authorization header")
+    return None
+
+
+class AuthMiddleware:
+    """Verifies the bearer token once and stores its claims on the request state.
+
+    `request.state.user` holds the subject and `request.state.claims` the whole
+    payload, so dependencies can reuse them instead of decoding the token again.
+    """
+
+    def __init__(self, app: ASGIApp, public_prefix: str = "/api/v1/auth"):
+        self.app = app
+        self.public_prefix = public_prefix
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["path"].startswith(self.public_prefix):
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            token = bearer_token(scope)
+            if token:
+                claims = decode_access_token(token)
+                state = scope.setdefault("state", {})
+                state["user"] = claims.get("sub")
+                state["claims"] = claims
+                state["token"] = token
+        except JWTError:
+            response = JSONResponse(
+                status_code=401,
+                content={"detail": "Invalid token"},
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+            await response(scope, receive, send)
+            return
+        except ValueError as e:
+            response = JSONResponse(
+                status_code=401,
+                content={"detail": str(e)},
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+            await response(scope, receive, send)
+            return
+
+        await self.app(scope, receive, send)
@@ -0,0 +1,192 @@
+# app/middleware/compression.py
+# Pure ASGI response compression: brotli or gzip, negotiated per request
+
+import threading
+import time
+import zlib
+from typing import Dict, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.metrics import COMPRESSION_CPU_SECONDS, COMPRESSION_INPUT_BYTES, COMPRESSION_OUTPUT_BYTES
+from app.middleware.metrics import route_template
+from app.settings import settings
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/javascript", "application/xml")
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick brotli when the client accepts it (and it is installed), else gzip, else nothing."""
+    accepted = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+    wildcard = accepted.get("*", 0.0)
+    if brotli is not None and accepted.get("br", wildcard) > 0:
+        return "br"
+    if accepted.get("gzip", wildcard) > 0:
+        return "gzip"
+    return None
+
+
+class _Compressor:
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=settings.compression_brotli_quality)
+        else:
+            # wbits=31 writes the gzip header and trailer
+            self._zlib = zlib.compressobj(settings.compression_gzip_level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes, flush: bool) -> bytes:
+        if self.encoding == "br":
+            out = self._brotli.process(data)
+            return out + self._brotli.flush() if flush else out
+        out = self._zlib.compress(data)
+        return out + self._zlib.flush(zlib.Z_SYNC_FLUSH) if flush else out
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._brotli.finish()
+        return self._zlib.flush(zlib.Z_FINISH)
+
+
+class CompressionStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.routes: Dict[str, list] = {}
+
+    def record(self, route: str, encoding: str, raw: int, compressed: int, cpu_seconds: float):
+        COMPRESSION_INPUT_BYTES.labels(route, encoding).inc(raw)
+        COMPRESSION_OUTPUT_BYTES.labels(route, encoding).inc(compressed)
+        COMPRESSION_CPU_SECONDS.labels(route, encoding).inc(cpu_seconds)
+        with self._lock:
+            stats = self.routes.setdefault(route, [0, 0, 0, 0.0])
+            stats[0] += 1
+            stats[1] += raw
+            stats[2] += compressed
+            stats[3] += cpu_seconds
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                route: {
+                    "responses": count,
+                    "bytes_in": raw,
+                    "bytes_out": compressed,
+                    "ratio": raw / compressed if compressed else 0.0,
+                    "cpu_ms_per_response": cpu / count * 1000 if count else 0.0,
+                }
+                for route, (count, raw, compressed, cpu) in self.routes.items()
+            }
+
+
+compression_stats = CompressionStats()
+
+
+class CompressionMiddleware:
+    """Compresses eligible responses; streamed bodies are flushed chunk by chunk.
+
+    Each streamed chunk is sync-flushed, so an SSE event reaches the client as
+    soon as the app sends it instead of waiting for the compressor's window.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message: Optional[Message] = None
+        compressor: Optional[_Compressor] = None
+        raw_bytes = 0
+        compressed_bytes = 0
+        cpu_seconds = 0.0
+
+        def run(fn, *args) -> bytes:
+            nonlocal cpu_seconds
+            # Compression runs on the event loop thread, so thread CPU time is exactly its cost
+            started = time.thread_time()
+            out = fn(*args)
+            cpu_seconds += time.thread_time() - started
+            return out
+
+        async def send_wrapper(message: Message):
+            nonlocal start_message, compressor, raw_bytes, compressed_bytes
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                content_type = headers.get("content-type", "")
+                eligible = (
+                    message["status"] not in (204, 304)
+                    and "content-encoding" not in headers
+                    and content_type.startswith(COMPRESSIBLE_TYPES)
+                )
+                if not eligible:
+                    await send(message)
+                    return
+                # Held back until the first body chunk shows whether compressing is worth it
+                start_message = message
+                return
+
+            if message["type"] != "http.response.body" or (start_message is None and compressor is None):
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if start_message is not None:
+                headers = MutableHeaders(raw=start_message["headers"])
+                headers.add_vary_header("Accept-Encoding")
+                if not more_body and len(body) < settings.compression_min_size:
+                    await send(start_message)
+                    start_message = None
+                    await send(message)
+                    return
+                compressor = _Compressor(encoding)
+                headers["Content-Encoding"] = encoding
+                etag = headers.get("etag")
+                if etag and not etag.startswith("W/"):
+                    # The compressed bytes differ from the ones the strong ETag describes
+                    headers["ETag"] = "W/" + etag
+                if more_body:
+                    del headers["Content-Length"]
+                    out = run(compressor.compress, body, True)
+                else:
+                    out = run(compressor.compress, body, False) + run(compressor.finish)
+                    headers["Content-Length"] = str(len(out))
+                await send(start_message)
+                start_message = None
+            elif more_body:
+                out = run(compressor.compress, body, True)
+            else:
+                out = run(compressor.compress, body, False) + run(compressor.finish)
+
+            raw_bytes += len(body)
+            compressed_bytes += len(out)
+            await send({"type": "http.response.body", "body": out, "more_body": more_body})
+            if not more_body:
+                compression_stats.record(
+                    route_template(scope), encoding, raw_bytes, compressed_bytes, cpu_seconds
+                )
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,152 @@
+# app/middleware/concurrency.py
+# Pure ASGI adaptive concurrency limiter with priority classes
+
+import time
+from typing import Optional
+
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.metrics import CONCURRENCY_LIMIT, CONCURRENCY_REJECTED
+from app.settings import settings
+
+CRITICAL = "critical"
+BULK = "bulk"
+
+# Probes and scrapes must keep answering while the API sheds load
+EXEMPT_PATHS = ("/healthz", "/readyz", "/metrics")
+# Long, upstream-bound requests; they give way first when the limit tightens
+BULK_PREFIXES = ("/api/v1/consultation/create",)
+# Slow by design (bcrypt), however idle the worker is; their latency says nothing about load
+LATENCY_EXEMPT_PATHS = (
+    "/api/v1/auth/token",
+    "/api/v1/auth/register",
+    "/api/v1/auth/reset-password",
+    "/api/v1/auth/logged/reset-password",
+)
+
+
+def priority_class(scope: Scope) -> str:
+    if scope["method"] == "POST" and scope["path"].startswith(BULK_PREFIXES):
+        return BULK
+    return CRITICAL
+
+
+class AIMDLimiter:
+    """Additive-increase / multiplicative-decrease limit on in-flight requests.
+
+    Only critical requests feed the limit: they are short and mostly bound by
+    Mongo, so their latency tracks how loaded the worker is. Bulk requests
+    spend most of their time waiting on the AI upstream, which has its own
+    admission control, and may only use `bulk_share` of the current limit.
+
+    The limit is cut at most once per generation of requests: only a request
+    that started after the previous cut can cut it again, so a burst of slow
+    responses that were all in flight together counts as one signal.
+    """
+
+    def __init__(self, initial: int, minimum: int, maximum: int, latency_threshold: float,
+                 backoff_ratio: float, bulk_share: float):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_threshold = latency_threshold
+        self.backoff_ratio = backoff_ratio
+        self.bulk_share = bulk_share
+        self.in_flight = {CRITICAL: 0, BULK: 0}
+        self.rejected = {CRITICAL: 0, BULK: 0}
+        self._last_backoff = float("-inf")
+
+    @property
+    def total_in_flight(self) -> int:
+        return self.in_flight[CRITICAL] + self.in_flight[BULK]
+
+    @property
+    def bulk_limit(self) -> int:
+        return max(int(self.limit * self.bulk_share), 1)
+
+    def try_acquire(self, priority: str) -> bool:
+        allowed = self.total_in_flight < int(self.limit)
+        if priority == BULK:
+            allowed = allowed and self.in_flight[BULK] < self.bulk_limit
+        if not allowed:
+            self.rejected[priority] += 1
+            CONCURRENCY_REJECTED.labels(priority).inc()
+            return False
+        self.in_flight[priority] += 1
+        return True
+
+    def release(self, priority: str, latency: Optional[float], failed: bool):
+        """Return a slot; `latency` is None for requests whose duration is not a load signal."""
+        in_flight = self.total_in_flight
+        self.in_flight[priority] -= 1
+        if priority != CRITICAL or (latency is None and not failed):
+            return
+        now = time.perf_counter()
+        if failed or latency > self.latency_threshold:
+            started = now - (latency or 0.0)
+            if started >= self._last_backoff:
+                self.limit = max(self.minimum, self.limit * self.backoff_ratio)
+                self._last_backoff = now
+        elif in_flight * 2 >= self.limit:
+            # Only grow while the limit is actually being used
+            self.limit = min(self.maximum, self.limit + 1)
+
+    def stats(self) -> dict:
+        return {
+            "limit": int(self.limit),
+            "min_limit": self.minimum,
+            "max_limit": self.maximum,
+            "bulk_limit": self.bulk_limit,
+            "in_flight": dict(self.in_flight),
+            "rejected": dict(self.rejected),
+        }
+
+
+concurrency_limiter = AIMDLimiter(
+    initial=settings.concurrency_initial_limit,
+    minimum=settings.concurrency_min_limit,
+    maximum=settings.concurrency_max_limit,
+    latency_threshold=settings.concurrency_latency_threshold_ms / 1000,
+    backoff_ratio=settings.concurrency_backoff_ratio,
+    bulk_share=settings.concurrency_bulk_share,
+)
+
+
+class ConcurrencyLimitMiddleware:
+    def __init__(self, app: ASGIApp, limiter: AIMDLimiter = concurrency_limiter):
+        self.app = app
+        self.limiter = limiter
+        CONCURRENCY_LIMIT.set(int(limiter.limit))
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["path"] in EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        priority = priority_class(scope)
+        if not self.limiter.try_acquire(priority):
+            response = JSONResponse(
+                status_code=503,
+                content={"detail": "Server is overloaded, please retry shortly"},
+                headers={"Retry-After": "1"},
+            )
+            await response(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            latency = None if scope["path"] in LATENCY_EXEMPT_PATHS else time.perf_counter() - start
+            # 502-504 mean a dependency is struggling; 500s are usually bugs, not load
+            self.limiter.release(priority, latency, failed=status_code in (502, 503, 504))
+            CONCURRENCY_LIMIT.set(int(self.limiter.limit))
@@ -0,0 +1,49 @@
+# app/middleware/metrics.py
+# Pure ASGI middleware recording per-route Prometheus metrics
+
+import time
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.metrics import HTTP_IN_FLIGHT, HTTP_REQUEST_DURATION, HTTP_REQUESTS
+
+
+def route_template(scope: Scope) -> str:
+    """The matched route's full path template, e.g. `/api/v1/consultation/{id}`.
+
+    FastAPI resolves included routers lazily: `scope["route"]` is the route as
+    declared on its router, without the include prefix, while the effective
+    route context carries the full path. Unmatched paths share one label.
+    """
+    context = scope.get("fastapi", {}).get("effective_route_context")
+    path = getattr(context, "path", None) or getattr(scope.get("route"), "path", None)
+    return path or "unmatched"
+
+
+class MetricsMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # Streamed responses are timed until their last chunk was sent
+            route = route_template(scope)
+            HTTP_IN_FLIGHT.dec()
+            HTTP_REQUEST_DURATION.labels(scope["method"], route).observe(time.perf_counter() - start)
+            HTTP_REQUESTS.labels(scope["method"], route, str(status_code)).inc()
@@ -0,0 +1,96 @@
+# One-off data migrations, run by hand against a live database
+#
+#     python -m app.migrations search-fields
+#     python -m app.migrations compress-payloads
+#
+# Each migration works in batches and only touches documents that still need
+# it, so it can be interrupted and run again.
+import sys
+import time
+from typing import List
+
+from pymongo import UpdateOne
+from pymongo.database import Database
+
+from app.repositories.consultations import search_fields
+from app.repositories.payload_codec import FORMAT_FIELD, PAYLOAD_FIELDS, compress_payload, decode_payload
+
+BATCH_SIZE = 500
+# Gives the primary room to serve live traffic between batches
+BATCH_PAUSE_SECONDS = 0.2
+
+
+def backfill_search_fields(db: Database) -> int:
+    """Add `answer_text` and `search_language` to consultations written before search existed."""
+    consultations = db["consultations"]
+    updated = 0
+    while True:
+        batch = list(
+            consultations.find({"search_language": {"$exists": False}}, {"aiResponse": 1, "lang": 1, FORMAT_FIELD: 1})
+            .limit(BATCH_SIZE)
+        )
+        if not batch:
+            return updated
+        result = consultations.bulk_write([
+            UpdateOne(
+                {"_id": consultation["_id"]},
+                {"$set": search_fields(decode_payload(consultation).get("aiResponse"), consultation.get("lang"))},
+            )
+            for consultation in batch
+        ], ordered=False)
+        updated += result.modified_count
+        print(f"search-fields: {updated} consultations updated")
+
+
+def _compressed_fields(consultation: dict) -> dict:
+    lang = consultation.pop("lang", None)
+    return {
+        **compress_payload(consultation),
+        # The plain answer copy kept for search is capped as on new compressed writes
+        **search_fields(consultation.get("aiResponse"), lang, compressed=True),
+    }
+
+
+def compress_payloads(db: Database) -> int:
+    """Rewrite plain consultations in the compressed storage format, batch by batch."""
+    consultations = db["consultations"]
+    projection = {**{field: 1 for field in PAYLOAD_FIELDS}, "lang": 1}
+    # Unfinished jobs are left alone: a worker may write their answer at any moment
+    query = {FORMAT_FIELD: {"$exists": False}, "status": {"$nin": ["pending", "running"]}}
+    converted = 0
+    while True:
+        batch = list(consultations.find(query, projection).limit(BATCH_SIZE))
+        if not batch:
+            return converted
+        # Re-checked per document, in case another writer got there in between
+        result = consultations.bulk_write([
+            UpdateOne(
+                {"_id": consultation.pop("_id"), **query},
+                {"$set": _compressed_fields(consultation)},
+            )
+            for consultation in batch
+        ], ordered=False)
+        converted += result.modified_count
+        print(f"compress-payloads: {converted} consultations converted")
+        time.sleep(BATCH_PAUSE_SECONDS)
+
+
+MIGRATIONS = {
+    "search-fields": backfill_search_fields,
+    "compress-payloads": compress_payloads,
+}
+
+
+def main(argv: List[str]) -> int:
+    if len(argv) != 1 or argv[0] not in MIGRATIONS:
+        print(f"usage: python -m app.migrations {{{','.join(MIGRATIONS)}}}")
+        return 2
+
+    from app.dependencies import get_database
+
+    MIGRATIONS[argv[0]](get_database())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
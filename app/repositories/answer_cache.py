@@ -0,0 +1,58 @@
+# Async data access for the answer_cache collection
+from datetime import datetime
+from typing import Dict, List
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+
+def _answers(db: AsyncIOMotorDatabase):
+    return db["answer_cache"]
+
+
+async def find_answer(db: AsyncIOMotorDatabase, key: str):
+    return await _answers(db).find_one({"_id": key, "expires_at": {"$gt": datetime.utcnow()}})
+
+
+async def upsert_answer(
+    db: AsyncIOMotorDatabase,
+    key: str,
+    categories: List[str],
+    aiResponse: dict,
+    articlesData,
+    expires_at: datetime,
+):
+    return await _answers(db).replace_one(
+        {"_id": key},
+        {
+            "categories": categories,
+            "aiResponse": aiResponse,
+            "articlesData": articlesData,
+            "expires_at": expires_at,
+        },
+        upsert=True,
+    )
+
+
+async def delete_answers_by_category(db: AsyncIOMotorDatabase, category: str) -> int:
+    result = await _answers(db).delete_many({"categories": category})
+    return result.deleted_count
+
+
+# One generation counter per category; bumping it invalidates the in-memory
+# copies every worker holds of answers in that category.
+
+def _generations(db: AsyncIOMotorDatabase):
+    return db["answer_cache_generations"]
+
+
+async def bump_category_generation(db: AsyncIOMotorDatabase, category: str):
+    return await _generations(db).update_one({"_id": category}, {"$inc": {"generation": 1}}, upsert=True)
+
+
+async def find_category_generations(db: AsyncIOMotorDatabase, categories: List[str]) -> Dict[str, int]:
+    """Current generation of each category; categories never invalidated are at 0."""
+    cursor = _generations(db).find({"_id": {"$in": list(categories)}})
+    generations = {category: 0 for category in categories}
+    async for document in cursor:
+        generations[document["_id"]] = document["generation"]
+    return generations
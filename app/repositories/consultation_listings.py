@@ -0,0 +1,22 @@
+# Async data access for consultation_listings: one version counter per user's consultation list
+from datetime import datetime
+from typing import Optional
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+
+def _listings(db: AsyncIOMotorDatabase):
+    return db["consultation_listings"]
+
+
+async def bump_listing_version(db: AsyncIOMotorDatabase, user_id):
+    return await _listings(db).update_one(
+        {"_id": ObjectId(user_id)},
+        {"$inc": {"version": 1}, "$set": {"modified_at": datetime.utcnow()}},
+        upsert=True,
+    )
+
+
+async def find_listing_version(db: AsyncIOMotorDatabase, user_id: str) -> Optional[dict]:
+    return await _listings(db).find_one({"_id": ObjectId(user_id)})
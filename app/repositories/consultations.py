@@ -0,0 +1,265 @@
+# Async data access for the consultations collection
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+
+from app.repositories.consultation_listings import bump_listing_version
+from app.repositories.payload_codec import encode_payload
+from app.settings import settings
+
+
+def _consultations(db: AsyncIOMotorDatabase):
+    return db["consultations"]
+
+
+# Every write below bumps the document's `version` and, when the owner's list
+# changes, the listing version; both back the ETags of the read routes.
+
+def _new_version() -> dict:
+    return {"$inc": {"version": 1}, "$currentDate": {"updated_at": True}}
+
+
+# MongoDB has no Arabic stemmer; "none" still tokenizes Arabic, just without stemming or stop words
+_SEARCH_LANGUAGES = {"fr": "french", "en": "english"}
+
+
+def search_fields(aiResponse: Optional[dict], lang: Optional[str] = None, compressed: Optional[bool] = None) -> dict:
+    """Derived fields behind the search index: the answer as plain text and its stemming language.
+
+    `compressed` says whether the payload is stored compressed; it defaults to
+    the configured storage format.
+    """
+    if compressed is None:
+        compressed = settings.consultation_storage_compression
+    aiResponse = aiResponse or {}
+    # aiResponse is keyed by the answer's language
+    lang = next(iter(aiResponse), None) or lang or ""
+    answer_text = " ".join(text for text in aiResponse.values() if isinstance(text, str))
+    if compressed:
+        # Kept uncompressed for the text index, so it must not undo the payload compression
+        answer_text = _truncate_words(answer_text, settings.consultation_search_answer_max_chars)
+    return {
+        "answer_text": answer_text,
+        "search_language": _SEARCH_LANGUAGES.get(lang.lower()[:2], "none"),
+    }
+
+
+def _truncate_words(text: str, max_chars: int) -> str:
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    # Drop the word cut in half, which would index as a different term
+    return cut.rsplit(" ", 1)[0] if " " in cut else cut
+
+
+async def insert_consultation(db: AsyncIOMotorDatabase, consultation: dict):
+    consultation.update(search_fields(consultation.get("aiResponse"), consultation.get("lang")))
+    consultation.setdefault("version", 1)
+    consultation.setdefault("updated_at", consultation.get("creationDate") or datetime.utcnow())
+    # Inserted as a copy, so callers keep the decoded payload they return
+    result = await _consultations(db).insert_one(encode_payload(consultation))
+    await bump_listing_version(db, consultation["user_id"])
+    return result
+
+
+async def find_consultation(db: AsyncIOMotorDatabase, query: dict, projection: Optional[dict] = None):
+    return await _consultations(db).find_one(query, projection)
+
+
+# Newest first; _id breaks ties between consultations created in the same millisecond
+LISTING_SORT = [("creationDate", -1), ("_id", -1)]
+LISTING_INDEX = [("user_id", 1), ("is_active", 1), ("creationDate", -1), ("_id", -1)]
+
+
+async def find_user_consultations(
+    db: AsyncIOMotorDatabase,
+    user_id: str,
+    limit: int,
+    projection: Optional[dict] = None,
+    after: Optional[Tuple[datetime, ObjectId]] = None,
+    skip: int = 0,
+) -> List[dict]:
+    """List a user's active consultations, starting after the `(creationDate, _id)` key if given."""
+    query = {"user_id": ObjectId(user_id), "is_active": 1}
+    if after is not None:
+        creation_date, last_id = after
+        query["$or"] = [
+            {"creationDate": {"$lt": creation_date}},
+            {"creationDate": creation_date, "_id": {"$lt": last_id}},
+        ]
+    cursor = (
+        _consultations(db)
+        .find(query, projection)
+        .sort(LISTING_SORT)
+        .skip(skip)
+        .limit(limit)
+    )
+    return await cursor.to_list(length=limit)
+
+
+
+async def deactivate_consultation(db: AsyncIOMotorDatabase, consultation_id: str):
+    consultation = await _consultations(db).find_one_and_update(
+        {"_id": ObjectId(consultation_id), "is_active": 1},
+        {"$set": {"is_active": 0}, **_new_version()},
+        return_document=ReturnDocument.AFTER,
+    )
+    if consultation:
+        await bump_listing_version(db, consultation["user_id"])
+    return consultation
+
+
+# Prefixed by owner, so a search only walks the caller's own entries
+SEARCH_INDEX = [
+    ("user_id", 1), ("is_active", 1),
+    ("title", "text"), ("question", "text"), ("answer_text", "text"),
+]
+SEARCH_INDEX_OPTIONS = {
+    "weights": {"title": 5, "question": 3, "answer_text": 1},
+    "default_language": "none",
+    "language_override": "search_language",
+}
+
+
+async def search_user_consultations(
+    db: AsyncIOMotorDatabase,
+    user_id: str,
+    text: str,
+    language: str,
+    limit: int,
+    projection: Optional[dict] = None,
+    after: Optional[Tuple[float, ObjectId]] = None,
+) -> List[dict]:
+    """Rank a user's active consultations by text score, starting after the `(score, _id)` key if given."""
+    pipeline = [
+        {"$match": {
+            "user_id": ObjectId(user_id),
+            "is_active": 1,
+            "$text": {"$search": text, "$language": language},
+        }},
+        {"$addFields": {"score": {"$meta": "textScore"}}},
+    ]
+    if after is not None:
+        score, last_id = after
+        pipeline.append({"$match": {"$or": [
+            {"score": {"$lt": score}},
+            {"score": score, "_id": {"$lt": last_id}},
+        ]}})
+    pipeline.append({"$sort": {"score": -1, "_id": -1}})
+    pipeline.append({"$limit": limit})
+    if projection is not None:
+        pipeline.append({"$project": {**projection, "score": 1}})
+    return await _consultations(db).aggregate(pipeline).to_list(length=limit)
+
+
+async def find_user_consultations_by_ids(
+    db: AsyncIOMotorDatabase, user_id: str, ids: List[ObjectId], projection: Optional[dict] = None
+) -> List[dict]:
+    if not ids:
+        return []
+    cursor = _consultations(db).find(
+        {"_id": {"$in": ids}, "user_id": ObjectId(user_id), "is_active": 1}, projection
+    )
+    return await cursor.to_list(length=len(ids))
+
+
+async def deactivate_user_consultations(db: AsyncIOMotorDatabase, user_id: str, ids: List[ObjectId]) -> List[ObjectId]:
+    """Soft-delete the user's active consultations among `ids`; returns the ids this call deactivated."""
+    # Each call tags what it deactivates, so a concurrent delete of the same ids
+    # can't make both calls (or neither) report them as deleted
+    batch = ObjectId()
+    # Scoped to the owner, so ids of other users' consultations are simply not matched
+    result = await _consultations(db).update_many(
+        {"_id": {"$in": ids}, "user_id": ObjectId(user_id), "is_active": 1},
+        {"$set": {"is_active": 0, "deletion_batch": batch}, **_new_version()},
+    )
+    if not result.modified_count:
+        return []
+    await bump_listing_version(db, user_id)
+    deleted = _consultations(db).find({"_id": {"$in": ids}, "deletion_batch": batch}, {"_id": 1})
+    return [consultation["_id"] async for consultation in deleted]
+
+
+async def delete_consultation(db: AsyncIOMotorDatabase, consultation_id: str):
+    consultation = await _consultations(db).find_one_and_delete(
+        {"_id": ObjectId(consultation_id)}, {"user_id": 1}
+    )
+    if consultation:
+        await bump_listing_version(db, consultation["user_id"])
+    return consultation
+
+
+def _claimable(stale_before: datetime) -> dict:
+    # Pending jobs, and running jobs whose worker died before finishing them
+    return {
+        "$or": [
+            {"status": "pending"},
+            {"status": "running", "started_at": {"$lt": stale_before}},
+        ]
+    }
+
+
+async def claim_consultation_job(db: AsyncIOMotorDatabase, consultation_id: str, stale_before: datetime):
+    # The status shows in the document and the listing, so both versions move
+    job = await _consultations(db).find_one_and_update(
+        {"_id": ObjectId(consultation_id), **_claimable(stale_before)},
+        {"$set": {"status": "running", "started_at": datetime.utcnow()}, **_new_version()},
+        return_document=ReturnDocument.AFTER,
+    )
+    if job:
+        await bump_listing_version(db, job["user_id"])
+    return job
+
+
+async def renew_consultation_job(db: AsyncIOMotorDatabase, consultation_id: str):
+    """Push back the lease of a running job so recovery leaves it alone."""
+    return await _consultations(db).update_one(
+        {"_id": ObjectId(consultation_id), "status": "running"},
+        {"$set": {"started_at": datetime.utcnow()}},
+    )
+
+
+async def _finish_job(db: AsyncIOMotorDatabase, consultation_id: str, fields: dict):
+    # The status is part of the listing, so its version moves too
+    consultation = await _consultations(db).find_one_and_update(
+        {"_id": ObjectId(consultation_id)},
+        {"$set": fields, **_new_version()},
+        projection={"user_id": 1},
+    )
+    if consultation:
+        await bump_listing_version(db, consultation["user_id"])
+    return consultation
+
+
+async def complete_consultation_job(db: AsyncIOMotorDatabase, consultation_id: str, aiResponse: dict, articlesData):
+    return await _finish_job(
+        db,
+        consultation_id,
+        encode_payload({
+            "status": "completed", "aiResponse": aiResponse, "articlesData": articlesData, **search_fields(aiResponse),
+        }),
+    )
+
+
+async def fail_consultation_job(db: AsyncIOMotorDatabase, consultation_id: str, error: str):
+    return await _finish_job(db, consultation_id, {"status": "failed", "error": error})
+
+
+async def count_user_unfinished_jobs(db: AsyncIOMotorDatabase, user_id: str, limit: int) -> int:
+    # Stops counting at `limit`; callers only compare against it
+    return await _consultations(db).count_documents(
+        {"user_id": ObjectId(user_id), "status": {"$in": ["pending", "running"]}}, limit=limit
+    )
+
+
+async def find_claimable_job_ids(
+    db: AsyncIOMotorDatabase, stale_before: datetime, include_pending: bool = True
+) -> List[str]:
+    query = _claimable(stale_before)
+    if not include_pending:
+        query = query["$or"][1]
+    cursor = _consultations(db).find(query, {"_id": 1})
+    return [str(document["_id"]) async for document in cursor]
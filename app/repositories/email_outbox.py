@@ -0,0 +1,82 @@
+# Async data access for the email_outbox collection
+from datetime import datetime
+from typing import Optional
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+
+
+def _outbox(db: AsyncIOMotorDatabase):
+    return db["email_outbox"]
+
+
+async def insert_message(db: AsyncIOMotorDatabase, to: str, subject: str, body: str):
+    now = datetime.utcnow()
+    return await _outbox(db).insert_one(
+        {
+            "to": to,
+            "subject": subject,
+            "body": body,
+            "status": "pending",
+            "attempts": 0,
+            "next_attempt_at": now,
+            "created_at": now,
+            "sent_at": None,
+            "last_error": None,
+        }
+    )
+
+
+async def claim_message(db: AsyncIOMotorDatabase, stale_before: datetime) -> Optional[dict]:
+    """Take the next due message, or one left 'sending' by a dispatcher that died."""
+    now = datetime.utcnow()
+    return await _outbox(db).find_one_and_update(
+        {
+            "$or": [
+                {"status": "pending", "next_attempt_at": {"$lte": now}},
+                {"status": "sending", "claimed_at": {"$lt": stale_before}},
+            ]
+        },
+        {"$set": {"status": "sending", "claimed_at": now}},
+        sort=[("next_attempt_at", 1)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+# Finished messages keep their metadata until `expire_at`, but not their body:
+# it can hold reset links and validation codes.
+
+async def mark_sent(db: AsyncIOMotorDatabase, message_id: ObjectId, expire_at: datetime):
+    return await _outbox(db).update_one(
+        {"_id": message_id},
+        {
+            "$set": {"status": "sent", "sent_at": datetime.utcnow(), "body": None, "expire_at": expire_at},
+            "$inc": {"attempts": 1},
+        },
+    )
+
+
+async def mark_retry(db: AsyncIOMotorDatabase, message_id: ObjectId, error: str, next_attempt_at: datetime):
+    return await _outbox(db).update_one(
+        {"_id": message_id},
+        {
+            "$set": {"status": "pending", "last_error": error, "next_attempt_at": next_attempt_at},
+            "$inc": {"attempts": 1},
+        },
+    )
+
+
+async def mark_failed(db: AsyncIOMotorDatabase, message_id: ObjectId, error: str, expire_at: datetime):
+    return await _outbox(db).update_one(
+        {"_id": message_id},
+        {
+            "$set": {"status": "failed", "last_error": error, "body": None, "expire_at": expire_at},
+            "$inc": {"attempts": 1},
+        },
+    )
+
+
+async def count_by_status(db: AsyncIOMotorDatabase) -> dict:
+    pipeline = [{"$group": {"_id": "$status", "count": {"$sum": 1}}}]
+    return {row["_id"]: row["count"] async for row in _outbox(db).aggregate(pipeline)}
@@ -0,0 +1,22 @@
+# Async data access for the password_reset_tokens collection
+from datetime import datetime
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+
+def _tokens(db: AsyncIOMotorDatabase):
+    return db["password_reset_tokens"]
+
+
+async def insert_token(db: AsyncIOMotorDatabase, email: str, token: str, expires_at: datetime):
+    return await _tokens(db).insert_one(
+        {"email": email, "token": token, "expires_at": expires_at, "used": False}
+    )
+
+
+async def find_token(db: AsyncIOMotorDatabase, token: str):
+    return await _tokens(db).find_one({"token": token})
+
+
+async def mark_token_used(db: AsyncIOMotorDatabase, token: str):
+    return await _tokens(db).update_one({"token": token}, {"$set": {"used": True}})
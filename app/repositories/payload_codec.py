@@ -0,0 +1,65 @@
+# At-rest encoding of the large consultation fields
+#
+# With `consultation_storage_compression` on, `aiResponse` and `articlesData`
+# are stored as zstd-compressed BSON binaries and the document is marked with
+# `storage_format`. Documents without the marker are plain. Reads only decode
+# when the caller actually returns these fields.
+from typing import Optional
+
+import bson
+from bson import Binary
+
+from app.settings import settings
+
+try:
+    import zstandard
+except ImportError:  # compression stays unavailable
+    zstandard = None
+
+FORMAT_FIELD = "storage_format"
+# Each field is BSON-encoded as {"v": value}, then zstd-compressed
+FORMAT_ZSTD_BSON = 1
+PAYLOAD_FIELDS = ("aiResponse", "articlesData")
+
+_compressor: Optional["zstandard.ZstdCompressor"] = None
+_decompressor: Optional["zstandard.ZstdDecompressor"] = None
+
+
+def _zstd():
+    global _compressor, _decompressor
+    if zstandard is None:
+        raise RuntimeError("Compressed consultation storage needs the zstandard package")
+    if _compressor is None:
+        _compressor = zstandard.ZstdCompressor(level=settings.consultation_storage_zstd_level)
+        _decompressor = zstandard.ZstdDecompressor()
+    return _compressor, _decompressor
+
+
+def compress_payload(fields: dict) -> dict:
+    """Return `fields` with the payload fields compressed and the format marker set."""
+    compressor, _ = _zstd()
+    encoded = dict(fields)
+    for field in PAYLOAD_FIELDS:
+        if encoded.get(field) is not None:
+            encoded[field] = Binary(compressor.compress(bson.encode({"v": encoded[field]})))
+    encoded[FORMAT_FIELD] = FORMAT_ZSTD_BSON
+    return encoded
+
+
+def encode_payload(fields: dict) -> dict:
+    """Apply the configured storage format to a document or `$set` about to be written."""
+    if not settings.consultation_storage_compression:
+        return fields
+    return compress_payload(fields)
+
+
+def decode_payload(consultation: Optional[dict]) -> Optional[dict]:
+    """Decompress the payload fields of a read document in place."""
+    if not consultation or consultation.get(FORMAT_FIELD) != FORMAT_ZSTD_BSON:
+        return consultation
+    _, decompressor = _zstd()
+    for field in PAYLOAD_FIELDS:
+        value = consultation.get(field)
+        if isinstance(value, bytes):
+            consultation[field] = bson.decode(decompressor.decompress(value))["v"]
+    return consultation
@@ -0,0 +1,25 @@
+# Per-use-case projections, derived from the models that consume the documents
+from typing import Type
+
+from pydantic import BaseModel
+
+from app.repositories.payload_codec import FORMAT_FIELD
+from app.schemas.Consultation import ConsultationResponce, Consultations
+from app.schemas.user import User
+
+
+def fields_of(model: Type[BaseModel]) -> dict:
+    """Project exactly the fields `model` reads; `id` comes from `_id`, which Mongo always returns."""
+    return {name: 1 for name in model.model_fields if name != "id"}
+
+
+# GET /consultations: no question, aiResponse or articlesData
+CONSULTATION_LIST = fields_of(Consultations)
+# GET /consultation/{id}; the format marker tells whether the payload needs decoding
+CONSULTATION_DETAIL = {**fields_of(ConsultationResponce), FORMAT_FIELD: 1}
+# ETag / Last-Modified of a single consultation
+CONSULTATION_VALIDATORS = {"version": 1, "updated_at": 1, "creationDate": 1}
+# Ownership check before a write
+CONSULTATION_OWNER = {"user_id": 1}
+# Authenticated user: no validation codes or reset tokens
+USER_AUTH = fields_of(User)
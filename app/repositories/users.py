@@ -0,0 +1,94 @@
+# Async data access for the users collection
+from datetime import datetime
+from typing import Optional
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+
+
+def _users(db: AsyncIOMotorDatabase):
+    return db["users"]
+
+
+# Every write that can change a cached User also increments `auth_version`;
+# a worker only serves its cached copy while the stored version still matches.
+
+def with_auth_version(update: dict) -> dict:
+    """`update` plus the `auth_version` increment."""
+    return {**update, "$inc": {**update.get("$inc", {}), "auth_version": 1}}
+
+
+async def find_auth_version(db: AsyncIOMotorDatabase, username: str) -> Optional[int]:
+    """The user's current `auth_version`, or None if there is no such user."""
+    user = await _users(db).find_one({"username": username}, {"auth_version": 1})
+    return None if user is None else user.get("auth_version", 0)
+
+
+async def insert_user(db: AsyncIOMotorDatabase, user: dict):
+    return await _users(db).insert_one(user)
+
+
+async def find_user_by_id(db: AsyncIOMotorDatabase, user_id: str, projection: Optional[dict] = None):
+    return await _users(db).find_one({"_id": ObjectId(user_id)}, projection)
+
+
+async def find_user_by_username(db: AsyncIOMotorDatabase, username: str, projection: Optional[dict] = None):
+    return await _users(db).find_one({"username": username}, projection)
+
+
+async def find_user_by_email(db: AsyncIOMotorDatabase, email: str, projection: Optional[dict] = None):
+    return await _users(db).find_one({"email": email}, projection)
+
+
+async def update_user(db: AsyncIOMotorDatabase, query: dict, update: dict):
+    return await _users(db).update_one(query, with_auth_version(update))
+
+
+async def find_and_update_user(db: AsyncIOMotorDatabase, query: dict, update: dict):
+    return await _users(db).find_one_and_update(
+        query, with_auth_version(update), return_document=ReturnDocument.AFTER
+    )
+
+
+async def reserve_consultation_balance(db: AsyncIOMotorDatabase, user_id: str, projection: Optional[dict] = None):
+    """Take one consultation unit; returns None when the user has none left."""
+    return await _users(db).find_one_and_update(
+        {"_id": ObjectId(user_id), "consultation_balance": {"$gt": 0}},
+        {"$inc": {"consultation_balance": -1, "auth_version": 1}},
+        projection=projection,
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+async def refund_consultation_balance(db: AsyncIOMotorDatabase, user_id: str, projection: Optional[dict] = None):
+    return await _users(db).find_one_and_update(
+        {"_id": ObjectId(user_id)},
+        {"$inc": {"consultation_balance": 1, "auth_version": 1}},
+        projection=projection,
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+# In-progress consultations of a user, shared by every worker: each holds one
+# {"id", "expires_at"} entry in `consultation_slots` until it finishes.
+
+async def claim_consultation_slot(db: AsyncIOMotorDatabase, user_id: str, slot: dict, limit: int):
+    """Add `slot` unless `limit` slots are already held; returns None when they are."""
+    return await _users(db).find_one_and_update(
+        {"_id": ObjectId(user_id), f"consultation_slots.{limit - 1}": {"$exists": False}},
+        {"$push": {"consultation_slots": slot}},
+        projection={"_id": 1},
+    )
+
+
+async def release_consultation_slot(db: AsyncIOMotorDatabase, user_id: str, slot_id: str):
+    return await _users(db).update_one(
+        {"_id": ObjectId(user_id)}, {"$pull": {"consultation_slots": {"id": slot_id}}}
+    )
+
+
+async def drop_expired_consultation_slots(db: AsyncIOMotorDatabase, user_id: str, now: datetime):
+    return await _users(db).update_one(
+        {"_id": ObjectId(user_id)}, {"$pull": {"consultation_slots": {"expires_at": {"$lt": now}}}}
+    )
@@ -0,0 +1,19 @@
+# A streaming response that always closes its iterator
+import anyio
+from fastapi.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+
+class ClosingStreamingResponse(StreamingResponse):
+    """Streams an iterator with an `aclose()` and always awaits it.
+
+    Starlette only finalizes the iterator when it has been iterated; this also
+    covers a response that failed to start or a client gone before the first chunk.
+    """
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            with anyio.CancelScope(shield=True):
+                await self.body_iterator.aclose()
@@ -1,23 +1,28 @@
 from bson import ObjectId
-from pydantic import BaseModel, Field, validator
+from pydantic import BaseModel, BeforeValidator, ConfigDict, Field
 from datetime import datetime
 from typing import List, Optional, Dict
+from typing_extensions import Annotated
+
+from app.settings import settings
+
+# Accepts the raw ObjectId from Mongo so documents validate without a copy step
+ObjectIdStr = Annotated[str, BeforeValidator(lambda v: str(v) if isinstance(v, ObjectId) else v)]
 
 class ConsultationsBase(BaseModel):
     category: List[str]
     title: str
 
 class Consultations(ConsultationsBase):
-    id: str
+    model_config = ConfigDict(from_attributes=True, populate_by_name=True)
+
+    id: ObjectIdStr
     creationDate: datetime = Field(default_factory=datetime.utcnow)
     role : str
-    @validator('id', pre=True, allow_reuse=True)
-    def convert_id(cls, v):
-        return str(v) if isinstance(v, ObjectId) else v
+    status: str = "completed"
 
-    class Config:
-        orm_mode = True
-        allow_population_by_field_name = True
+class ConsultationSearchResult(Consultations):
+    score: float
 
 class ConsultationBase(BaseModel):
     category: List[str]
@@ -26,30 +31,39 @@ class ConsultationBase(BaseModel):
     lang: str
 
 class Consultation(ConsultationBase):
-    id: str
-    creationDate: datetime = Field(default_factory=datetime.utcnow)
-    
-    @validator('id', pre=True, allow_reuse=True)
-    def convert_id(cls, v):
-        return str(v) if isinstance(v, ObjectId) else v
+    model_config = ConfigDict(from_attributes=True, populate_by_name=True)
 
-    class Config:
-        orm_mode = True
-        allow_population_by_field_name = True
+    id: ObjectIdStr
+    creationDate: datetime = Field(default_factory=datetime.utcnow)
 
 class ConsultationResponce(ConsultationsBase):
-    id: str = Field(..., alias='id')
+    model_config = ConfigDict(from_attributes=True, populate_by_name=True)
+
+    id: ObjectIdStr
     aiResponse: Optional[Dict[str, str]] = None
-    articlesData: dict
+    articlesData: Optional[dict] = None
     creationDate: datetime = Field(default_factory=datetime.utcnow)
     question: str
     role: str
+    # Consultations created before job mode have no status and are complete
+    status: str = "completed"
+    error: Optional[str] = None
+
+
+class ConsultationJob(BaseModel):
+    id: str
+    status: str
+
+
+class ConsultationIds(BaseModel):
+    ids: List[str] = Field(..., max_length=settings.consultations_batch_max_ids)
+
+
+class ConsultationBatch(BaseModel):
+    consultations: List[ConsultationResponce]
+    missing: List[str]
 
-    @validator('id', pre=True, allow_reuse=True)
-    def convert_id(cls, v):
-        return str(v) if isinstance(v, ObjectId) else v
 
-    class Config:
-        orm_mode = True
-        allow_population_by_field_name = True
-        json_encoders = {ObjectId: str}
+class ConsultationBatchDelete(BaseModel):
+    deleted: List[str]
+    missing: List[str]
@@ -1,5 +1,5 @@
 from typing import Optional
-from pydantic import BaseModel, EmailStr, Field
+from pydantic import BaseModel, ConfigDict, EmailStr, Field
 
 class ForgotPassword(BaseModel):
     email: EmailStr
@@ -32,19 +32,19 @@ class UserCreate(UserBase):
     password: str
 
 class User(AccountValidity):
+    model_config = ConfigDict(from_attributes=True)
+
     id: str
     is_active: bool
     consultation_balance: int
     hashed_password: str
-
-    class Config:
-        from_attributes = True
+    # Users written before it existed count as version 0
+    auth_version: int = 0
 
 class UserDetails(AccountValidity):
-    consultation_balance: int
+    model_config = ConfigDict(from_attributes=True)
 
-    class Config:
-        from_attributes = True
+    consultation_balance: int
 
 class UserRegister(UserCreate):
     passwordConfirmation: str = Field(alias="passwordConfirmation")
@@ -1,7 +1,104 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
 
+from passlib.context import CryptContext
 
-def verify_password(pwd_context, plain_password, hashed_password):
+from app.metrics import PASSWORD_HASH_DURATION, PASSWORD_HASH_QUEUE
+from app.settings import settings
+
+# Pinning min/max to the configured cost makes needs_update() flag any other cost
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.bcrypt_rounds,
+    bcrypt__min_rounds=settings.bcrypt_rounds,
+    bcrypt__max_rounds=settings.bcrypt_rounds,
+)
+
+# bcrypt gets its own threads so a login burst can't starve FastAPI's shared threadpool
+_hash_executor = ThreadPoolExecutor(
+    max_workers=settings.password_hash_workers, thread_name_prefix="password-hash"
+)
+
+
+class HashStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.durations = {"hash": [0, 0.0, 0.0], "verify": [0, 0.0, 0.0]}
+
+    def enqueued(self):
+        with self._lock:
+            self.queued += 1
+            PASSWORD_HASH_QUEUE.set(self.queued)
+
+    def started(self):
+        with self._lock:
+            self.queued -= 1
+            PASSWORD_HASH_QUEUE.set(self.queued)
+            self.running += 1
+
+    def finished(self, operation: str, seconds: float):
+        with self._lock:
+            self.running -= 1
+            stats = self.durations[operation]
+            stats[0] += 1
+            stats[1] += seconds
+            stats[2] = max(stats[2], seconds)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            snapshot = {
+                "workers": settings.password_hash_workers,
+                "bcrypt_rounds": settings.bcrypt_rounds,
+                "queue_length": self.queued,
+                "running": self.running,
+            }
+            for operation, (count, total, worst) in self.durations.items():
+                snapshot[operation] = {
+                    "count": count,
+                    "avg_ms": total / count * 1000 if count else 0.0,
+                    "max_ms": worst * 1000,
+                }
+            return snapshot
+
+
+hash_stats = HashStats()
+
+
+def _timed(operation: str, fn, *args):
+    hash_stats.started()
+    start = time.perf_counter()
+    try:
+        return fn(*args)
+    finally:
+        seconds = time.perf_counter() - start
+        hash_stats.finished(operation, seconds)
+        PASSWORD_HASH_DURATION.labels(operation).observe(seconds)
+
+
+async def _run(operation: str, fn, *args):
+    hash_stats.enqueued()
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_hash_executor, _timed, operation, fn, *args)
+
+
+def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
-def get_password_hash(pwd_context, password):
-    return pwd_context.hash(password)
\ No newline at end of file
+def get_password_hash(password):
+    return pwd_context.hash(password)
+
+async def verify_password_async(plain_password, hashed_password) -> bool:
+    return await _run("verify", verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password) -> str:
+    return await _run("hash", get_password_hash, password)
+
+async def verify_and_update_password_async(plain_password, hashed_password) -> Tuple[bool, Optional[str]]:
+    """Verify a password; on success also return a new hash when the stored cost is outdated."""
+    return await _run("verify", pwd_context.verify_and_update, plain_password, hashed_password)
@@ -0,0 +1,118 @@
+# app/services/admission.py
+# Admission control for the AI upstream: bounded concurrency, short wait queue, per-user cap
+#
+# The concurrency limit and wait queue protect one worker process and its
+# share of the upstream; the per-user cap is kept in Mongo and holds across
+# all workers.
+
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import Optional
+
+import pymongo
+from bson import ObjectId
+from fastapi import HTTPException, status
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from app.metrics import AI_ADMISSION_REJECTED
+from app.repositories import users as users_repo
+from app.settings import settings
+
+
+def _overloaded_error(detail: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail=detail,
+        headers={"Retry-After": str(settings.ai_admission_retry_after_seconds)},
+    )
+
+
+class AdmissionController:
+    def __init__(self, max_concurrent: int, max_waiting: int, per_user: int, jobs_per_user: int):
+        self.max_concurrent = max_concurrent
+        self.max_waiting = max_waiting
+        self.per_user = per_user
+        self.jobs_per_user = jobs_per_user
+        # Created on first use so it binds to the worker's running loop
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.active = 0
+        self.waiting = 0
+        self.rejected = {"queue_full": 0, "wait_timeout": 0, "per_user": 0}
+        # User slots taken by this worker and not yet released
+        self.user_slots = 0
+
+    def _reject(self, reason: str, detail: str) -> HTTPException:
+        self.rejected[reason] += 1
+        AI_ADMISSION_REJECTED.labels(reason).inc()
+        return _overloaded_error(detail)
+
+    async def acquire(self, wait_seconds: Optional[float]):
+        """Take an upstream slot, waiting at most `wait_seconds` (None waits without limit)."""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrent)
+        # Background callers (wait_seconds=None) are bounded by their own worker pool
+        if wait_seconds is not None and self._slots.locked() and self.waiting >= self.max_waiting:
+            raise self._reject("queue_full", "The AI service is busy, please retry shortly")
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), wait_seconds)
+        except asyncio.TimeoutError:
+            raise self._reject("wait_timeout", "The AI service is busy, please retry shortly")
+        finally:
+            self.waiting -= 1
+        self.active += 1
+
+    def release(self):
+        self.active -= 1
+        self._slots.release()
+
+    @asynccontextmanager
+    async def slot(self, wait_seconds: Optional[float]):
+        await self.acquire(wait_seconds)
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def enter_user(self, db: AsyncIOMotorDatabase, user_id: str) -> str:
+        """Take one of the account's in-progress slots; returns the slot id to pass to `leave_user`."""
+        now = datetime.utcnow()
+        slot = {"id": str(ObjectId()), "expires_at": now + timedelta(seconds=settings.consultation_slot_lease_seconds)}
+        if await users_repo.claim_consultation_slot(db, user_id, slot, self.per_user) is None:
+            # Slots of a worker that died before releasing them run out after their lease
+            await users_repo.drop_expired_consultation_slots(db, user_id, now)
+            if await users_repo.claim_consultation_slot(db, user_id, slot, self.per_user) is None:
+                raise self._reject("per_user", "Too many consultations in progress for this account")
+        self.user_slots += 1
+        return slot["id"]
+
+    def check_user_jobs(self, unfinished_jobs: int):
+        """Reject a job submission when the account already has its share of unfinished jobs."""
+        if unfinished_jobs >= self.jobs_per_user:
+            raise self._reject("per_user", "Too many consultations in progress for this account")
+
+    async def leave_user(self, db: AsyncIOMotorDatabase, user_id: str, slot_id: str):
+        self.user_slots -= 1
+        try:
+            await users_repo.release_consultation_slot(db, user_id, slot_id)
+        except pymongo.errors.PyMongoError as e:
+            print(f"Failed to release consultation slot of user {user_id}, it expires with its lease: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrent": self.max_concurrent,
+            "active": self.active,
+            "waiting": self.waiting,
+            "max_waiting": self.max_waiting,
+            "user_slots": self.user_slots,
+            "rejected": dict(self.rejected),
+        }
+
+
+ai_admission = AdmissionController(
+    max_concurrent=settings.ai_max_concurrent_calls,
+    max_waiting=settings.ai_admission_queue_size,
+    per_user=settings.consultation_max_per_user,
+    jobs_per_user=settings.consultation_job_max_per_user,
+)
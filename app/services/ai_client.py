@@ -0,0 +1,282 @@
+# app/services/ai_client.py
+# Async, pooled HTTP client for the mostachari_text_101 AI upstream
+
+import asyncio
+import json
+import random
+import time
+from typing import AsyncIterator, Optional
+
+import httpx
+from fastapi import HTTPException, status
+
+from app.metrics import AI_UPSTREAM_DURATION, AI_UPSTREAM_ERRORS
+from app.settings import settings
+
+# Failures where the upstream never started generating, so a retry is safe.
+# A 502 or 504 may come from a proxy after generation started, so only a 503
+# that says when to come back is retried.
+RETRYABLE_EXCEPTIONS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+class CircuitBreaker:
+    """Opens after consecutive failures and lets one trial call through once the reset delay is over.
+
+    The trial holds a lease of `reset_seconds`: if its outcome is never
+    recorded, another trial is let through when the lease runs out.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_started_at: Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow_request(self) -> bool:
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN:
+            now = time.monotonic()
+            if self.trial_started_at is None or now - self.trial_started_at >= self.reset_seconds:
+                self.trial_started_at = now
+                return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_started_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        self.trial_started_at = None
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+    def release_trial(self):
+        """Give up the trial without a verdict, e.g. when the caller stopped reading early."""
+        self.trial_started_at = None
+
+    def retry_after(self) -> int:
+        if self.opened_at is None:
+            return 0
+        return max(int(self.reset_seconds - (time.monotonic() - self.opened_at)) + 1, 1)
+
+
+breaker = CircuitBreaker(
+    failure_threshold=settings.ai_circuit_failure_threshold,
+    reset_seconds=settings.ai_circuit_reset_seconds,
+)
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def _build_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(
+            settings.ai_read_timeout_seconds,
+            connect=settings.ai_connect_timeout_seconds,
+            pool=settings.ai_connect_timeout_seconds,
+        ),
+        limits=httpx.Limits(
+            max_connections=settings.ai_max_connections,
+            max_keepalive_connections=settings.ai_max_keepalive_connections,
+        ),
+    )
+
+
+def get_ai_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None:
+        _client = _build_client()
+    return _client
+
+
+async def close_ai_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def _backoff_delay(attempt: int) -> float:
+    # Full jitter: a random delay between 0 and the exponential cap
+    return random.uniform(0, settings.ai_retry_backoff_seconds * (2 ** attempt))
+
+
+def _retry_after_delay(response: httpx.Response) -> Optional[float]:
+    """Seconds to wait before retrying `response`, or None if it must not be retried."""
+    if response.status_code != status.HTTP_503_SERVICE_UNAVAILABLE:
+        return None
+    try:
+        delay = float(response.headers["Retry-After"])
+    except (KeyError, ValueError):
+        # Missing, or an HTTP date: not worth holding the caller for
+        return None
+    if delay < 0 or delay > settings.ai_retry_after_max_seconds:
+        return None
+    return delay
+
+
+def _circuit_open_error() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="AI service is temporarily unavailable",
+        headers={"Retry-After": str(breaker.retry_after())},
+    )
+
+
+async def _send(url: str, payload: dict, stream: bool = False) -> httpx.Response:
+    if not breaker.allow_request():
+        raise _circuit_open_error()
+
+    client = get_ai_client()
+    attempt = 0
+    while True:
+        try:
+            request = client.build_request("POST", url, json=payload)
+            response = await client.send(request, stream=stream)
+        except RETRYABLE_EXCEPTIONS:
+            if attempt < settings.ai_max_retries:
+                await asyncio.sleep(_backoff_delay(attempt))
+                attempt += 1
+                continue
+            breaker.record_failure()
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="AI service is unreachable",
+            )
+        except httpx.TimeoutException:
+            breaker.record_failure()
+            raise HTTPException(
+                status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+                detail="AI service timed out",
+            )
+        except httpx.HTTPError:
+            breaker.record_failure()
+            raise HTTPException(
+                status_code=status.HTTP_502_BAD_GATEWAY,
+                detail="Failed to fetch AI response",
+            )
+
+        delay = _retry_after_delay(response)
+        if delay is not None and attempt < settings.ai_max_retries:
+            await response.aclose()
+            await asyncio.sleep(delay)
+            attempt += 1
+            continue
+        break
+
+    if response.status_code != 200:
+        await response.aclose()
+        if response.status_code >= 500:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        raise HTTPException(
+            status_code=response.status_code, detail="Failed to fetch AI response"
+        )
+    return response
+
+
+async def _timed_send(endpoint: str, url: str, payload: dict, stream: bool = False) -> httpx.Response:
+    # Retries and backoff count towards the latency the caller actually waited
+    start = time.perf_counter()
+    try:
+        response = await _send(url, payload, stream=stream)
+    except HTTPException as e:
+        AI_UPSTREAM_DURATION.labels(endpoint, "error").observe(time.perf_counter() - start)
+        AI_UPSTREAM_ERRORS.labels(endpoint, str(e.status_code)).inc()
+        raise
+    AI_UPSTREAM_DURATION.labels(endpoint, "success").observe(time.perf_counter() - start)
+    return response
+
+
+async def request_ai_response(payload: dict) -> dict:
+    """POST a consultation payload to the AI upstream and return the decoded JSON body."""
+    response = await _timed_send("response", settings.ai_upstream_url, payload)
+    try:
+        data = response.json()
+    except ValueError:
+        breaker.record_failure()
+        AI_UPSTREAM_ERRORS.labels("response", "invalid_json").inc()
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail="AI service returned an invalid response",
+        )
+    breaker.record_success()
+    return data
+
+
+def _parse_stream_line(line: str) -> Optional[dict]:
+    line = line.strip()
+    if not line or line.startswith(":") or line.startswith("event:"):
+        return None
+    if line.startswith("data:"):
+        line = line[len("data:"):].strip()
+    if line == "[DONE]":
+        return None
+    return json.loads(line)
+
+
+async def open_ai_stream(payload: dict) -> httpx.Response:
+    """Start a streamed generation; the status is checked before any event is read."""
+    # Timed until the response headers arrive, i.e. time to first byte
+    return await _timed_send("stream", settings.ai_stream_url, payload, stream=True)
+
+
+async def close_ai_stream(response: httpx.Response):
+    """Close a stream that was opened but never read; it gives no verdict on the upstream."""
+    breaker.release_trial()
+    await response.aclose()
+
+
+async def iter_ai_stream_events(response: httpx.Response) -> AsyncIterator[dict]:
+    """Yield the upstream events of an open stream.
+
+    The upstream sends one JSON object per line (optionally SSE `data:` framed):
+    `{"chunk": "..."}` for each piece of text, then a final `{"data": {...}}`
+    with the same shape as the non-streamed response.
+
+    An `{"error": ...}` event counts as an upstream failure. Callers that stop
+    reading early must `aclose()` the iterator so the outcome is settled.
+    """
+    recorded = False
+    try:
+        async for line in response.aiter_lines():
+            event = _parse_stream_line(line)
+            if event is None:
+                continue
+            if event.get("error") and not recorded:
+                breaker.record_failure()
+                recorded = True
+            yield event
+        if not recorded:
+            breaker.record_success()
+            recorded = True
+    except httpx.HTTPError:
+        breaker.record_failure()
+        recorded = True
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail="AI response stream was interrupted",
+        )
+    finally:
+        if not recorded:
+            # Abandoned mid-stream (client gone, bad line): says nothing about the upstream
+            breaker.release_trial()
+        await response.aclose()
@@ -0,0 +1,116 @@
+# app/services/answer_cache.py
+# Shared cache of AI answers for repeated questions
+
+import hashlib
+import json
+import re
+import unicodedata
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from app.metrics import ANSWER_CACHE_LOOKUPS
+from app.repositories import answer_cache as answer_cache_repo
+from app.settings import settings
+from app.utils.cache import LRUCache
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_question(question: str) -> str:
+    question = unicodedata.normalize("NFKC", question).casefold()
+    return _WHITESPACE.sub(" ", question).strip()
+
+
+def cache_key(question: str, categories: List[str], lang: str, role: str) -> str:
+    raw = json.dumps(
+        [normalize_question(question), sorted(categories), lang, role],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+# Entries are `(answer, generations)`: the category generations at the time
+# the answer was cached. Each worker has its own copy, so a memory hit is only
+# served while those generations are still current in Mongo.
+_memory = LRUCache(settings.answer_cache_max_entries, settings.answer_cache_ttl_seconds)
+
+_stats = {"hits": 0, "memory_hits": 0, "persistent_hits": 0, "misses": 0}
+
+
+def _hit(source: str):
+    _stats["hits"] += 1
+    _stats[f"{source}_hits"] += 1
+    ANSWER_CACHE_LOOKUPS.labels(f"{source}_hit").inc()
+
+
+async def answer_generations(db: AsyncIOMotorDatabase, categories: List[str]) -> Dict[str, int]:
+    """Category generations to pass to `store_answer`; read them before asking the upstream."""
+    return await answer_cache_repo.find_category_generations(db, categories)
+
+
+async def get_cached_answer(db: AsyncIOMotorDatabase, key: str) -> Optional[Tuple[dict, dict]]:
+    """Return the cached `(aiResponse, articlesData)` pair for `key`, if any."""
+    if not settings.answer_cache_enabled:
+        return None
+
+    entry = _memory.get(key)
+    if entry is not None:
+        answer, generations = entry
+        if await answer_cache_repo.find_category_generations(db, list(generations)) == generations:
+            _hit("memory")
+            return answer
+        # A category was invalidated, possibly by another worker
+        _memory.invalidate(key)
+
+    if settings.answer_cache_persistent:
+        document = await answer_cache_repo.find_answer(db, key)
+        if document:
+            answer = (document["aiResponse"], document["articlesData"])
+            generations = await answer_generations(db, document.get("categories", []))
+            _memory.set(key, (answer, generations), list(generations))
+            _hit("persistent")
+            return answer
+
+    _stats["misses"] += 1
+    ANSWER_CACHE_LOOKUPS.labels("miss").inc()
+    return None
+
+
+async def store_answer(
+    db: AsyncIOMotorDatabase, key: str, categories: List[str], aiResponse: dict, articlesData,
+    generations: Optional[Dict[str, int]] = None,
+):
+    """Cache an answer computed while the categories were at `generations`.
+
+    An answer whose categories were invalidated while it was being generated
+    is not cached, since it may predate the invalidation.
+    """
+    if not settings.answer_cache_enabled:
+        return
+    current = await answer_generations(db, categories)
+    if generations is not None and generations != current:
+        return
+    _memory.set(key, ((aiResponse, articlesData), current), categories)
+    if settings.answer_cache_persistent:
+        expires_at = datetime.utcnow() + timedelta(seconds=settings.answer_cache_ttl_seconds)
+        await answer_cache_repo.upsert_answer(db, key, categories, aiResponse, articlesData, expires_at)
+
+
+async def invalidate_category(db: AsyncIOMotorDatabase, category: str) -> dict:
+    """Drop the category's answers from every worker; `memory` counts this worker's entries only."""
+    await answer_cache_repo.bump_category_generation(db, category)
+    removed = {"memory": _memory.invalidate_tag(category), "persistent": 0}
+    if settings.answer_cache_persistent:
+        removed["persistent"] = await answer_cache_repo.delete_answers_by_category(db, category)
+    return removed
+
+
+def cache_stats() -> dict:
+    lookups = _stats["hits"] + _stats["misses"]
+    return {
+        **_stats,
+        "hit_ratio": _stats["hits"] / lookups if lookups else 0.0,
+        "memory_entries": len(_memory),
+    }
@@ -0,0 +1,56 @@
+# app/services/auth_cache.py
+# Short-lived cache of verified token claims and of the users they resolve to
+
+import time
+from typing import Optional
+
+from jose import JWTError, jwt
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from app.repositories import users as users_repo
+from app.schemas.user import User
+from app.settings import settings
+from app.utils.cache import LRUCache
+
+_claims = LRUCache(settings.auth_cache_max_entries, settings.auth_cache_ttl_seconds)
+_users = LRUCache(settings.auth_cache_max_entries, settings.auth_cache_ttl_seconds)
+
+
+def decode_access_token(token: str) -> dict:
+    """Decode and verify a JWT, reusing the result for repeated tokens.
+
+    Raises `JWTError` like `jwt.decode` when the token is invalid or expired.
+    """
+    payload = _claims.get(token)
+    if payload is not None:
+        if payload.get("exp", 0) > time.time():
+            return payload
+        _claims.invalidate(token)
+        raise JWTError("Signature has expired.")
+    payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
+    _claims.set(token, payload)
+    return payload
+
+
+async def get_cached_user(db: AsyncIOMotorDatabase, username: str) -> Optional[User]:
+    """This worker's cached User, unless its document has been written since.
+
+    Writes may come from any worker, so the stored `auth_version` is read
+    back (a small indexed lookup instead of the whole user) on every hit.
+    """
+    user = _users.get(username)
+    if user is None:
+        return None
+    if await users_repo.find_auth_version(db, username) != user.auth_version:
+        _users.invalidate(username)
+        return None
+    return user
+
+
+def cache_user(user: User):
+    _users.set(user.username, user)
+
+
+def invalidate_user(username: str):
+    """Drop a user's cached record from this worker; other workers notice the `auth_version` bump."""
+    _users.invalidate(username)
@@ -2,8 +2,7 @@ from datetime import datetime, timedelta
 import re
 from typing import Collection
 from jose import JWTError, jwt
-from passlib.context import CryptContext
-from fastapi import HTTPException, status, logger
+from fastapi import HTTPException, status
 
 from app.schemas.user import (
     AccountValidity,
@@ -12,24 +11,26 @@ from app.schemas.user import (
     LoginData,
     UserCreate,
 )
-from app.services.email_service import send_email
+from app.repositories import password_reset_tokens as reset_tokens_repo
+from app.repositories import users as users_repo
+from app.services.auth_cache import cache_user, decode_access_token, get_cached_user, invalidate_user
+from app.services.email_outbox import enqueue_email
 from app.settings import settings
-from app.security.security import get_password_hash, verify_password
+from app.security.security import (
+    get_password_hash_async,
+    verify_and_update_password_async,
+    verify_password_async,
+)
 from app.services.user_service import (
     create_user,
-    get_user_by_username,
+    find_user_by_username,
     get_user_by_email,
 )
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 
 def decode_token(token: str):
     try:
-        payload = jwt.decode(
-            token, settings.secret_key, algorithms=[settings.algorithm]
-        )
-        return payload
+        return decode_access_token(token)
     except JWTError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -37,26 +38,40 @@ def decode_token(token: str):
         )
 
 
-def verify_token(token: str, credentials_exception, db):
-    payload = decode_token(token)
+async def verify_token(token: str, credentials_exception, db, payload: dict = None):
+    # AuthMiddleware hands over the claims it already verified
+    if payload is None:
+        payload = decode_token(token)
     username: str = payload.get("sub")
     if username is None:
         raise credentials_exception
-    user = get_user_by_username(username, db)
+    user = await get_cached_user(db, username)
     if user is None:
-        raise credentials_exception
+        user = await find_user_by_username(username, db)
+        if user is None:
+            raise credentials_exception
+        cache_user(user)
     return user
 
 
-def authenticate_user(username: str, password: str, db):
-    user = get_user_by_username(username, db)
-    if not user or not verify_password(pwd_context, password, user.hashed_password):
+async def authenticate_user(username: str, password: str, db):
+    user = await find_user_by_username(username, db)
+    if not user:
+        return False
+    verified, new_hash = await verify_and_update_password_async(password, user.hashed_password)
+    if not verified:
         return False
+    if new_hash:
+        # Stored with an outdated bcrypt cost; upgrade it now that we know the password
+        await users_repo.update_user(
+            db, {"username": user.username}, {"$set": {"hashed_password": new_hash}}
+        )
+        invalidate_user(user.username)
     return user
 
 
-def verify_password_service(password: str, hashed_password: str):
-    return verify_password(pwd_context, password, hashed_password)
+async def verify_password_service(password: str, hashed_password: str):
+    return await verify_password_async(password, hashed_password)
 
 
 def create_access_token(data: dict, expires_delta: timedelta = None):
@@ -106,19 +121,17 @@ def validate_user_role(user_role: str):
         raise HTTPException(status_code=400, detail="Role doesn't match")
 
 
-def store_password_reset_token(email: str, token: str, db, expires_at: datetime):
-    db["password_reset_tokens"].insert_one(
-        {"email": email, "token": token, "expires_at": expires_at, "used": False}
-    )
+async def store_password_reset_token(email: str, token: str, db, expires_at: datetime):
+    await reset_tokens_repo.insert_token(db, email, token, expires_at)
 
 
-def mark_token_as_used(token: str, db):
-    db["password_reset_tokens"].update_one({"token": token}, {"$set": {"used": True}})
+async def mark_token_as_used(token: str, db):
+    await reset_tokens_repo.mark_token_used(db, token)
 
 
-def validate_reset_token(token: str, db):
+async def validate_reset_token(token: str, db):
     email = decode_token(token).get("sub")
-    if not email or not get_user_by_email(email, db):
+    if not email or not await get_user_by_email(email, db):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid token or expired token",
@@ -126,8 +139,8 @@ def validate_reset_token(token: str, db):
     return email
 
 
-def generate_login_access_token(form_data: LoginData, db: Collection):
-    user = authenticate_user(form_data.username, form_data.password, db)
+async def generate_login_access_token(form_data: LoginData, db):
+    user = await authenticate_user(form_data.username, form_data.password, db)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -156,7 +169,7 @@ def generate_login_access_token(form_data: LoginData, db: Collection):
     }
 
 
-def handle_user_registration(user, db):
+async def handle_user_registration(user, db):
     if user.password != user.passwordConfirmation:
         raise HTTPException(status_code=400, detail="Confirm password does not match")
 
@@ -175,13 +188,13 @@ def handle_user_registration(user, db):
         password=user.password,
     )
     try:
-        return create_user(user=user_data, db=db)
+        return await create_user(user=user_data, db=db)
     except HTTPException as e:
         raise e
 
 
 async def handle_forgot_password(email, db):
-    user = get_user_by_email(email.email, db)
+    user = await get_user_by_email(email.email, db)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Email not registered"
@@ -189,13 +202,13 @@ async def handle_forgot_password(email, db):
     token = create_access_token(
         data={"sub": user["email"]}, expires_delta=timedelta(minutes=15)
     )
-    db["users"].update_one({"email": email.email}, {"$set": {"reset_token": token}})
+    await users_repo.update_user(db, {"email": email.email}, {"$set": {"reset_token": token}})
     reset_link = f"http://localhost:4200/reset?token={token}"
     body = f"Hi, click on the link to reset your password: {reset_link}"
     try:
-        await send_email(email.email, "Reset Your Password", body)
+        await enqueue_email(db, email.email, "Reset Your Password", body)
     except Exception as e:
-        logger.error(f"Failed to send email: {e}")
+        print(f"Failed to queue email: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to send email",
@@ -207,42 +220,45 @@ async def handle_forgot_password(email, db):
     )
 
 
-def handle_password_reset(reset_password_data, token, db):
+async def handle_password_reset(reset_password_data, token, db):
     if reset_password_data.newPassword != reset_password_data.confirmNewPassword:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="Passwords do not match"
         )
-    email = validate_reset_token(token, db)
-    user = get_user_by_email(email, db)
+    email = await validate_reset_token(token, db)
+    user = await get_user_by_email(email, db)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
         )
     validate_password_strength(reset_password_data.newPassword)
-    hashed_password = get_password_hash(pwd_context, reset_password_data.newPassword)
-    db["users"].update_one(
+    hashed_password = await get_password_hash_async(reset_password_data.newPassword)
+    await users_repo.update_user(
+        db,
         {"email": email},
         {"$set": {"hashed_password": hashed_password, "reset_token": None}},
     )
+    invalidate_user(user["username"])
     return {"message": "Password reset successfully."}
 
 
-def reset_password_for_logged_user(reset_password_data, db, token, current_user):
+async def reset_password_for_logged_user(reset_password_data, db, token, current_user):
     if not current_user:
         raise HTTPException(status_code=404, detail="User not found")
     username = decode_token(token).get("sub")
     if username != current_user.username:
         raise HTTPException(status_code=403, detail="Token does not match")
-    user = get_user_by_username(username, db)
-    if not user or not verify_password_service(
+    user = await find_user_by_username(username, db)
+    if not user or not await verify_password_service(
         reset_password_data.oldPassword, user.hashed_password
     ):
         raise HTTPException(status_code=400, detail="Old password is incorrect")
     if reset_password_data.newPassword != reset_password_data.confirmNewPassword:
         raise HTTPException(status_code=400, detail="Confirm password does not match")
     validate_password_strength(reset_password_data.newPassword)
-    hashed_password = get_password_hash(pwd_context, reset_password_data.newPassword)
-    db["users"].update_one(
-        {"username": user.username}, {"$set": {"hashed_password": hashed_password}}
+    hashed_password = await get_password_hash_async(reset_password_data.newPassword)
+    await users_repo.update_user(
+        db, {"username": user.username}, {"$set": {"hashed_password": hashed_password}}
     )
+    invalidate_user(user.username)
     return {"message": "Password reset successfully."}
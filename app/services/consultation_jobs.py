@@ -0,0 +1,167 @@
+# app/services/consultation_jobs.py
+# Background consultation jobs: accept now, answer from a bounded worker pool
+
+import asyncio
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from bson import ObjectId
+from fastapi import HTTPException, status
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from app.repositories import consultations as consultations_repo
+from app.schemas.Consultation import ConsultationBase
+from app.services.admission import ai_admission
+from app.services.consultation_service import get_ai_answer, refund_consultation, reserve_consultation
+from app.settings import settings
+
+_queue: Optional[asyncio.Queue] = None
+_workers: List[asyncio.Task] = []
+_db: Optional[AsyncIOMotorDatabase] = None
+
+
+def _stale_before() -> datetime:
+    return datetime.utcnow() - timedelta(seconds=settings.consultation_job_lease_seconds)
+
+
+def _queue_full_error() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many consultations in progress, please retry shortly",
+        headers={"Retry-After": "5"},
+    )
+
+
+async def submit_consultation_job(user_id: str, consultation_data: ConsultationBase, db: AsyncIOMotorDatabase):
+    if _queue is None or _queue.full():
+        raise _queue_full_error()
+
+    # Also bounds how many of the user's submissions run at once, so few can race past the count
+    user_slot = await ai_admission.enter_user(db, user_id)
+    try:
+        unfinished = await consultations_repo.count_user_unfinished_jobs(
+            db, user_id, ai_admission.jobs_per_user
+        )
+        ai_admission.check_user_jobs(unfinished)
+        return await _enqueue_job(user_id, consultation_data, db)
+    finally:
+        await ai_admission.leave_user(db, user_id, user_slot)
+
+
+async def _enqueue_job(user_id: str, consultation_data: ConsultationBase, db: AsyncIOMotorDatabase):
+    user = await reserve_consultation(user_id, db)
+    consultation = {
+        "user_id": ObjectId(user_id),
+        "category": consultation_data.category,
+        "question": consultation_data.question,
+        "title": consultation_data.title,
+        "lang": consultation_data.lang,
+        "aiResponse": None,
+        "articlesData": None,
+        "creationDate": datetime.utcnow(),
+        "role": user.get("role"),
+        "is_active": 1,
+        "status": "pending",
+    }
+    try:
+        result = await consultations_repo.insert_consultation(db, consultation)
+    except Exception:
+        await refund_consultation(user_id, db)
+        raise
+    consultation_id = str(result.inserted_id)
+    try:
+        _queue.put_nowait(consultation_id)
+    except asyncio.QueueFull:
+        # Lost the last slot while inserting; don't leave an orphan behind
+        await consultations_repo.delete_consultation(db, consultation_id)
+        await refund_consultation(user_id, db)
+        raise _queue_full_error()
+    return {"id": consultation_id, "status": "pending"}
+
+
+async def _run_job(consultation_id: str):
+    job = await consultations_repo.claim_consultation_job(_db, consultation_id, _stale_before())
+    if job is None:
+        # Already taken by another worker or process
+        return
+    consultation_data = ConsultationBase(
+        category=job["category"],
+        title=job["title"],
+        question=job["question"],
+        lang=job.get("lang", ""),
+    )
+    heartbeat = asyncio.create_task(_renew_lease(consultation_id))
+    try:
+        # Workers are already a bounded pool, so they queue for an upstream slot instead of being shed
+        aiResponse, articlesData = await get_ai_answer(consultation_data, job.get("role"), _db, interactive=False)
+    except HTTPException as e:
+        await consultations_repo.fail_consultation_job(_db, consultation_id, str(e.detail))
+        await refund_consultation(str(job["user_id"]), _db)
+    except Exception as e:
+        print(f"Consultation job {consultation_id} failed: {e}")
+        await consultations_repo.fail_consultation_job(_db, consultation_id, "Failed to fetch AI response")
+        await refund_consultation(str(job["user_id"]), _db)
+    else:
+        await consultations_repo.complete_consultation_job(_db, consultation_id, aiResponse, articlesData)
+    finally:
+        heartbeat.cancel()
+
+
+async def _renew_lease(consultation_id: str):
+    # Waiting for an upstream slot plus a slow call with retries can outlast the
+    # lease; without renewal recovery would queue the job a second time.
+    while True:
+        await asyncio.sleep(settings.consultation_job_lease_seconds / 3)
+        try:
+            await consultations_repo.renew_consultation_job(_db, consultation_id)
+        except Exception as e:
+            print(f"Failed to renew the lease of consultation job {consultation_id}: {e}")
+
+
+async def _worker():
+    while True:
+        consultation_id = await _queue.get()
+        try:
+            await _run_job(consultation_id)
+        except Exception as e:
+            print(f"Consultation job {consultation_id} crashed: {e}")
+        finally:
+            _queue.task_done()
+
+
+async def _recover_jobs():
+    # First pass picks up jobs left pending by a previous process; later passes
+    # only look for running jobs whose worker died before finishing them.
+    include_pending = True
+    while True:
+        stale_ids = await consultations_repo.find_claimable_job_ids(_db, _stale_before(), include_pending)
+        for consultation_id in stale_ids:
+            # put() waits for room instead of rejecting
+            await _queue.put(consultation_id)
+        include_pending = False
+        await asyncio.sleep(settings.consultation_job_lease_seconds)
+
+
+async def start_job_workers(db: AsyncIOMotorDatabase):
+    global _queue, _db
+    _db = db
+    _queue = asyncio.Queue(maxsize=settings.consultation_job_queue_size)
+    _workers.extend(
+        asyncio.create_task(_worker()) for _ in range(settings.consultation_job_workers)
+    )
+    _workers.append(asyncio.create_task(_recover_jobs()))
+
+
+async def stop_job_workers():
+    for task in _workers:
+        task.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
+
+
+def job_queue_stats() -> dict:
+    return {
+        "workers": settings.consultation_job_workers,
+        "queue_size": _queue.qsize() if _queue else 0,
+        "queue_capacity": settings.consultation_job_queue_size,
+    }
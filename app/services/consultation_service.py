@@ -1,15 +1,37 @@
 # app/services/consultation_service.py
 
+import asyncio
+import base64
+import json
+import re
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, Tuple
+
+import anyio
 from bson import ObjectId
-import requests
 import pymongo
 from fastapi import HTTPException, status
-from pymongo.collection import Collection
+from fastapi.encoders import jsonable_encoder
+from motor.motor_asyncio import AsyncIOMotorDatabase
 from datetime import datetime
 from bson.errors import InvalidId
 
-from app.schemas.Consultation import ConsultationBase, ConsultationResponce
-from app.services.user_service import get_user_by_id
+from app.metrics import AI_REQUESTS
+from app.repositories import consultation_listings as listings_repo
+from app.repositories import consultations as consultations_repo
+from app.repositories import projections
+from app.repositories.payload_codec import decode_payload
+from app.repositories import users as users_repo
+from app.schemas.Consultation import ConsultationBase
+from app.services.admission import ai_admission
+from app.services.ai_client import close_ai_stream, iter_ai_stream_events, open_ai_stream, request_ai_response
+from app.services.answer_cache import answer_generations, cache_key, get_cached_answer, store_answer
+from app.services.auth_cache import invalidate_user
+from app.services.single_flight import SingleFlight
+from app.settings import settings
+from app.utils.conditional import make_etag
+
+
+ai_requests = SingleFlight(counter=AI_REQUESTS)
 
 
 def is_valid_object_id(id):
@@ -20,28 +42,18 @@ def is_valid_object_id(id):
         return False
 
 
-async def create_consultation(
-    user_id: str, consultation_data: ConsultationBase, db: Collection
-):  
-    
-    user=get_user_by_id(user_id,db)
-    
-    payload = {
-        "openai_model": "gpt-4o",
+def build_ai_payload(consultation_data: ConsultationBase, role: str) -> dict:
+    return {
+        "openai_model": settings.ai_model,
         "question": consultation_data.question,
         "categories": consultation_data.category,
         "output_lang": consultation_data.lang,
-        "role" : user.get("role")
+        "role" : role
     }
 
-    url = "http://167.71.66.203:8081/api/v1/mostachari_text_101/response"
-    response = requests.post(url, json=payload)
-    if response.status_code != 200:
-        raise HTTPException(
-            status_code=response.status_code, detail="Failed to fetch AI response"
-        )
 
-    response_data = response.json()
+def parse_ai_response(response_data: dict):
+    """Return the `(aiResponse, articlesData)` pair stored on a consultation."""
     if response_data.get("error"):
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -59,21 +71,31 @@ async def create_consultation(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Empty AI response received",
         )
-    
+    return {aiResponseLang: aiResponseText}, data.get("articlesData")
+
+
+async def save_consultation(
+    user_id: str,
+    consultation_data: ConsultationBase,
+    role: str,
+    aiResponse: dict,
+    articlesData: dict,
+    db: AsyncIOMotorDatabase,
+):
     consultation = {
         "user_id": ObjectId(user_id),
         "category": consultation_data.category,
         "question": consultation_data.question,
         "title": consultation_data.title,
-        "aiResponse": {aiResponseLang: aiResponseText},
-        "articlesData": data.get("articlesData"),
+        "aiResponse": aiResponse,
+        "articlesData": articlesData,
         "creationDate": datetime.utcnow(),
-        "role" : user.get("role"),
+        "role" : role,
         "is_active": 1
     }
 
     try:
-        result = db["consultations"].insert_one(consultation)
+        result = await consultations_repo.insert_consultation(db, consultation)
         consultation["id"] = str(result.inserted_id)
         return {
             "id": consultation["id"],
@@ -91,55 +113,351 @@ async def create_consultation(
         )
 
 
-def get_user_consultations(user_id: str, db: Collection, page: int, size: int):
-    skip_amount = (page - 1) * size
+async def reserve_consultation(user_id: str, db: AsyncIOMotorDatabase) -> dict:
+    """Take one unit of the user's balance in a single conditional update."""
+    user = await users_repo.reserve_consultation_balance(db, user_id, {"username": 1, "role": 1})
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_402_PAYMENT_REQUIRED,
+            detail="No consultation balance left.",
+        )
+    # The cached User carries the balance
+    invalidate_user(user["username"])
+    return user
+
+
+async def refund_consultation(user_id: str, db: AsyncIOMotorDatabase):
+    try:
+        user = await users_repo.refund_consultation_balance(db, user_id, {"username": 1})
+        if user:
+            invalidate_user(user["username"])
+    except pymongo.errors.PyMongoError as e:
+        print(f"Failed to refund consultation balance of user {user_id}: {e}")
+
+
+async def create_consultation(
+    user_id: str, consultation_data: ConsultationBase, db: AsyncIOMotorDatabase
+):
+    user_slot = await ai_admission.enter_user(db, user_id)
+    try:
+        user = await reserve_consultation(user_id, db)
+        role = user.get("role")
+        try:
+            aiResponse, articlesData = await get_ai_answer(consultation_data, role, db)
+            return await save_consultation(user_id, consultation_data, role, aiResponse, articlesData, db)
+        except (Exception, asyncio.CancelledError):
+            await refund_consultation(user_id, db)
+            raise
+    finally:
+        await ai_admission.leave_user(db, user_id, user_slot)
+
+
+async def _fetch_ai_answer(
+    key: str, consultation_data: ConsultationBase, role: str, db: AsyncIOMotorDatabase,
+    wait_seconds: Optional[float],
+):
+    generations = await answer_generations(db, consultation_data.category)
+    async with ai_admission.slot(wait_seconds):
+        response_data = await request_ai_response(build_ai_payload(consultation_data, role))
+    aiResponse, articlesData = parse_ai_response(response_data)
+    await store_answer(db, key, consultation_data.category, aiResponse, articlesData, generations)
+    return aiResponse, articlesData
+
+
+async def get_ai_answer(
+    consultation_data: ConsultationBase, role: str, db: AsyncIOMotorDatabase, interactive: bool = True
+):
+    """Return `(aiResponse, articlesData)` from the answer cache or a coalesced upstream call.
+
+    Interactive callers wait briefly for an upstream slot and get a 429 when
+    none frees up; background jobs wait for as long as it takes.
+    """
+    key = cache_key(consultation_data.question, consultation_data.category, consultation_data.lang, role)
+
+    cached = await get_cached_answer(db, key)
+    if cached:
+        return cached
+    wait_seconds = settings.ai_admission_wait_seconds if interactive else None
+    return await ai_requests.do(
+        key, lambda: _fetch_ai_answer(key, consultation_data, role, db, wait_seconds)
+    )
+
+
+def _sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data))}\n\n"
+
+
+class ConsultationStream:
+    """The SSE events of one streamed consultation.
+
+    Once iteration has started the events generator releases what the stream
+    holds; a stream dropped before its first event (the response never
+    started, the client left early) is released by `aclose()` instead, so
+    callers must always close it.
+    """
+
+    def __init__(self, events: AsyncIterator[str], abandon: Callable[[], Awaitable[None]]):
+        self._events = events
+        self._abandon = abandon
+        self._started = False
+        self._closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> str:
+        self._started = True
+        return await self._events.__anext__()
+
+    async def aclose(self):
+        if self._closed:
+            return
+        self._closed = True
+        if self._started:
+            await self._events.aclose()
+        else:
+            await self._abandon()
+
+
+async def stream_consultation(
+    user_id: str, consultation_data: ConsultationBase, db: AsyncIOMotorDatabase
+) -> ConsultationStream:
+    """Open the upstream stream and return the SSE events to relay to the client.
+
+    The upstream is contacted before returning so that connection, admission
+    and status errors still surface as regular HTTP errors. Once the stream
+    completes the assembled answer is saved exactly like `create_consultation`
+    saves it; the balance unit is refunded if it never gets that far.
+    """
+    user_slot = await ai_admission.enter_user(db, user_id)
+    reserved = False
+    upstream_slot = False
+    upstream = None
+    try:
+        user = await reserve_consultation(user_id, db)
+        reserved = True
+        role = user.get("role")
+        key = cache_key(consultation_data.question, consultation_data.category, consultation_data.lang, role)
+
+        cached = await get_cached_answer(db, key)
+        if not cached:
+            generations = await answer_generations(db, consultation_data.category)
+            await ai_admission.acquire(settings.ai_admission_wait_seconds)
+            upstream_slot = True
+            upstream = await open_ai_stream(build_ai_payload(consultation_data, role))
+    except (Exception, asyncio.CancelledError):
+        await _release_stream(user_id, user_slot, db, refund=reserved, upstream_slot=upstream_slot)
+        raise
+
+    async def events():
+        saved = False
+        try:
+            if cached:
+                aiResponse, articlesData = cached
+                for text in aiResponse.values():
+                    yield _sse_event("chunk", {"text": text})
+            else:
+                chunks = []
+                final = None
+                upstream_events = iter_ai_stream_events(upstream)
+                try:
+                    async for event in upstream_events:
+                        if event.get("error"):
+                            yield _sse_event("error", {"message": event.get("error_message") or "AI response failed"})
+                            return
+                        if event.get("chunk"):
+                            chunks.append(event["chunk"])
+                            yield _sse_event("chunk", {"text": event["chunk"]})
+                        if "data" in event:
+                            final = event["data"]
+                finally:
+                    # Settles the breaker and frees the connection even when we stop early
+                    with anyio.CancelScope(shield=True):
+                        await upstream_events.aclose()
+
+                data = final or {}
+                llm_response = data.get("llm_response") or {}
+                llm_response.setdefault("response", "".join(chunks))
+                llm_response.setdefault("output_lang", consultation_data.lang)
+                aiResponse, articlesData = parse_ai_response(
+                    {"data": {**data, "llm_response": llm_response}}
+                )
+                await store_answer(db, key, consultation_data.category, aiResponse, articlesData, generations)
+            consultation = await save_consultation(
+                user_id, consultation_data, role, aiResponse, articlesData, db
+            )
+            saved = True
+            yield _sse_event("done", consultation)
+        except HTTPException as e:
+            yield _sse_event("error", {"message": e.detail})
+        finally:
+            # Also runs when the client disconnects mid-stream, hence the shield
+            with anyio.CancelScope(shield=True):
+                await _release_stream(user_id, user_slot, db, refund=not saved, upstream_slot=upstream_slot)
+
+    async def abandon():
+        with anyio.CancelScope(shield=True):
+            if upstream is not None:
+                await close_ai_stream(upstream)
+            await _release_stream(user_id, user_slot, db, refund=True, upstream_slot=upstream_slot)
+
+    return ConsultationStream(events(), abandon)
+
+
+async def _release_stream(user_id: str, user_slot: str, db: AsyncIOMotorDatabase, refund: bool, upstream_slot: bool):
+    if upstream_slot:
+        ai_admission.release()
+    await ai_admission.leave_user(db, user_id, user_slot)
+    if refund:
+        await refund_consultation(user_id, db)
+
+
+def _pack_cursor(values: list) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+
+def _unpack_cursor(cursor: str, parse):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return parse(*json.loads(base64.urlsafe_b64decode(padded)))
+    except (ValueError, TypeError, InvalidId):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid pagination cursor.",
+        )
+
+
+def encode_cursor(consultation: dict) -> str:
+    return _pack_cursor([consultation["creationDate"].isoformat(), str(consultation["_id"])])
+
+
+def decode_cursor(cursor: str):
+    return _unpack_cursor(
+        cursor, lambda creation_date, last_id: (datetime.fromisoformat(creation_date), ObjectId(last_id))
+    )
+
+
+async def get_user_consultations(
+    user_id: str, db: AsyncIOMotorDatabase, page: int, size: int, cursor: Optional[str] = None
+) -> Tuple[List[dict], Optional[str]]:
+    """Return one page of consultations and the cursor of the next page, if there is one.
+
+    With a cursor the page is found by keyset on `(creationDate, _id)`; without
+    one the legacy `page` number is honoured through skip.
+    """
+    after = decode_cursor(cursor) if cursor else None
+    skip_amount = 0 if cursor else (page - 1) * size
+    try:
+        consultations = await consultations_repo.find_user_consultations(
+            db, user_id, size + 1, projections.CONSULTATION_LIST, after=after, skip=skip_amount
+        )
+        next_cursor = encode_cursor(consultations[size - 1]) if len(consultations) > size else None
+        # The documents go to the response model as-is; it is the only conversion
+        for consultation in consultations:
+            consultation["id"] = consultation["_id"]
+        return consultations[:size], next_cursor
+    except pymongo.errors.PyMongoError as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e)
+        )
+
+
+def consultation_validators(id, consultation: dict) -> Tuple[str, Optional[datetime]]:
+    """ETag and Last-Modified of one consultation; documents older than versioning count as version 0."""
+    last_modified = consultation.get("updated_at") or consultation.get("creationDate")
+    return make_etag(id, consultation.get("version", 0)), last_modified
+
+
+async def get_consultation_validators(id, user_id: str, db: AsyncIOMotorDatabase) -> Tuple[str, Optional[datetime]]:
+    """Answer a conditional GET from the _id index without loading the document body."""
+    consultation = await get_consultation_by_id(id, user_id, db, projections.CONSULTATION_VALIDATORS)
+    return consultation_validators(id, consultation)
+
+
+async def get_listing_validators(user_id: str, db: AsyncIOMotorDatabase) -> Tuple[str, Optional[datetime]]:
+    listing = await listings_repo.find_listing_version(db, user_id)
+    if listing is None:
+        # Nothing was written since versioning started
+        return make_etag(user_id, 0), None
+    return make_etag(user_id, listing["version"]), listing.get("modified_at")
+
+
+_QUERY_LANGUAGES = {"fr": "french", "en": "english", "ar": "none"}
+
+
+_FRENCH_WORDS = frozenset(
+    "le la les un une des du de au aux et est sont pour par avec dans sur sans que qui quel quelle "
+    "quels ne pas mon ma mes son sa ses leur je il elle nous vous ils ou où comment combien".split()
+)
+_ENGLISH_WORDS = frozenset(
+    "the a an of and is are for by with in on without that which what who not my his her their "
+    "i he she we you they or where how much many can do does".split()
+)
+_WORD = re.compile(r"\w+")
+
+
+def _query_language(q: str, lang: Optional[str]) -> str:
+    """Stemming language for the query terms; "none" when it can't be told, which only loses stemming."""
+    # Query terms are stemmed in this language, so it has to match the documents being looked for
+    if lang:
+        return _QUERY_LANGUAGES[lang]
+    if any("\u0600" <= char <= "\u06ff" for char in q):
+        return "none"
+    words = _WORD.findall(q.casefold())
+    french = sum(word in _FRENCH_WORDS for word in words)
+    if any(char in "àâçéèêëîïôûùüÿœ" for char in q.casefold()):
+        french += 1
+    english = sum(word in _ENGLISH_WORDS for word in words)
+    if french > english:
+        return "french"
+    if english > french:
+        return "english"
+    return "none"
+
+
+async def search_consultations(
+    user_id: str, db: AsyncIOMotorDatabase, q: str, size: int,
+    cursor: Optional[str] = None, lang: Optional[str] = None,
+) -> Tuple[List[dict], Optional[str]]:
+    """Return one page of the user's consultations ranked by relevance, and the next cursor."""
+    after = _unpack_cursor(cursor, lambda score, last_id: (float(score), ObjectId(last_id))) if cursor else None
     try:
-        consultations = list(
-            db["consultations"]
-            .find({"user_id": ObjectId(user_id), "is_active": 1}, {"question": 0})
-            .skip(skip_amount)
-            .limit(size)
-        )
-        converted_consultations = [
-            {
-                **consultation,
-                "id": str(consultation["_id"]),
-                "_id": str(consultation["_id"]),
-            }
-            for consultation in consultations
-        ]
-        return converted_consultations
+        results = await consultations_repo.search_user_consultations(
+            db, user_id, q, _query_language(q, lang), size + 1, projections.CONSULTATION_LIST, after=after
+        )
     except pymongo.errors.PyMongoError as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e)
         )
+    next_cursor = None
+    if len(results) > size:
+        last = results[size - 1]
+        next_cursor = _pack_cursor([last["score"], str(last["_id"])])
+    for result in results:
+        result["id"] = result["_id"]
+    return results[:size], next_cursor
 
 
-def get_consultation_by_id(id, user_id: str, db: Collection):
+async def get_consultation_by_id(id, user_id: str, db: AsyncIOMotorDatabase, projection: Optional[dict] = None):
     if not is_valid_object_id(id):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid consultation ID format.",
         )
+    if projection is None:
+        projection = {**projections.CONSULTATION_DETAIL, **projections.CONSULTATION_VALIDATORS}
     try:
-        consultation = db["consultations"].find_one(
-            {"_id": ObjectId(id), "is_active": 1}
+        consultation = await consultations_repo.find_consultation(
+            db,
+            {"_id": ObjectId(id), "user_id": ObjectId(user_id), "is_active": 1},
+            projection,
         )
-        if consultation and consultation.get("user_id") == ObjectId(user_id):
-            consultation = {
-                **consultation,
-                "id": str(consultation["_id"]),
-                "_id": str(consultation["_id"]),
-            }
-            if consultation:
-                return ConsultationResponce(
-                    **consultation
-                )  # Serialize result into Pydantic model
-            else:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail="No active consultation found.",
-                )
+        if consultation:
+            # Only decoded here, where the payload is actually returned
+            decode_payload(consultation)
+            # Validated once, by the route's response model
+            consultation["id"] = consultation.pop("_id")
+            return consultation
         else:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -152,7 +470,7 @@ def get_consultation_by_id(id, user_id: str, db: Collection):
         )
 
 
-def delete_consultation(id, user_id: str, db: Collection):
+async def delete_consultation(id, user_id: str, db: AsyncIOMotorDatabase):
     if not ObjectId.is_valid(id):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -160,17 +478,15 @@ def delete_consultation(id, user_id: str, db: Collection):
         )
 
     try:
-        consultation = db["consultations"].find_one({"_id": ObjectId(id)})
+        consultation = await consultations_repo.find_consultation(
+            db, {"_id": ObjectId(id)}, projections.CONSULTATION_OWNER
+        )
         if consultation and consultation.get("user_id") == ObjectId(user_id):
-            result = db["consultations"].find_one_and_update(
-                {"_id": ObjectId(id), "is_active": 1},
-                {"$set": {"is_active": 0}},
-                return_document=pymongo.ReturnDocument.AFTER,
-            )
+            result = await consultations_repo.deactivate_consultation(db, id)
             if result:
-                # Make sure to rename _id to id when passing to Pydantic
-                result["id"] = str(result.pop("_id"))
-                return ConsultationResponce(**result)  # Serialize result into Pydantic model
+                decode_payload(result)
+                result["id"] = result.pop("_id")
+                return result
             else:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
@@ -185,3 +501,53 @@ def delete_consultation(id, user_id: str, db: Collection):
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e)
         )
+
+
+def _batch_object_ids(ids: List[str]) -> Tuple[List[str], List[ObjectId]]:
+    """Deduplicate the requested ids, keeping their order, and return the valid ones as ObjectIds."""
+    # The batch size is capped by the ConsultationIds schema
+    unique_ids = list(dict.fromkeys(ids))
+    return unique_ids, [ObjectId(id) for id in unique_ids if ObjectId.is_valid(id)]
+
+
+async def get_consultations_by_ids(ids: List[str], user_id: str, db: AsyncIOMotorDatabase) -> dict:
+    """Fetch several of the user's active consultations with one query; unknown or foreign ids are missing."""
+    unique_ids, object_ids = _batch_object_ids(ids)
+    try:
+        found = await consultations_repo.find_user_consultations_by_ids(
+            db, user_id, object_ids, projections.CONSULTATION_DETAIL
+        )
+    except pymongo.errors.PyMongoError as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e)
+        )
+    by_id = {str(consultation["_id"]): consultation for consultation in found}
+    consultations = []
+    for id in unique_ids:
+        consultation = by_id.get(id)
+        if consultation is not None:
+            decode_payload(consultation)
+            consultation["id"] = consultation.pop("_id")
+            consultations.append(consultation)
+    return {
+        "consultations": consultations,
+        "missing": [id for id in unique_ids if id not in by_id],
+    }
+
+
+async def delete_consultations(ids: List[str], user_id: str, db: AsyncIOMotorDatabase) -> dict:
+    """Soft-delete several of the user's consultations with one ownership-scoped update."""
+    unique_ids, object_ids = _batch_object_ids(ids)
+    try:
+        deleted_ids = (
+            await consultations_repo.deactivate_user_consultations(db, user_id, object_ids) if object_ids else []
+        )
+    except pymongo.errors.PyMongoError as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e)
+        )
+    deleted = {str(id) for id in deleted_ids}
+    return {
+        "deleted": [id for id in unique_ids if id in deleted],
+        "missing": [id for id in unique_ids if id not in deleted],
+    }
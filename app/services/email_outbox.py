@@ -0,0 +1,146 @@
+# app/services/email_outbox.py
+# Persistent email outbox and the background dispatcher that drains it
+
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from typing import Optional
+
+import aiosmtplib
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from app.metrics import EMAIL_SEND_DURATION
+from app.repositories import email_outbox as outbox_repo
+from app.services.email_service import conf
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+_db: Optional[AsyncIOMotorDatabase] = None
+_task: Optional[asyncio.Task] = None
+_wakeup: Optional[asyncio.Event] = None
+_smtp: Optional[aiosmtplib.SMTP] = None
+
+
+async def enqueue_email(db: AsyncIOMotorDatabase, email: str, subject: str, body: str):
+    """Store the message for the dispatcher; the caller does not wait for SMTP."""
+    await outbox_repo.insert_message(db, email, subject, body)
+    if _wakeup is not None:
+        _wakeup.set()
+
+
+def _build_message(message: dict) -> EmailMessage:
+    email = EmailMessage()
+    email["From"] = conf.MAIL_FROM
+    email["To"] = message["to"]
+    email["Subject"] = message["subject"]
+    email.set_content(message["body"], subtype="html")
+    return email
+
+
+async def _connection() -> aiosmtplib.SMTP:
+    # One connection is kept open across batches and reopened when the server drops it
+    global _smtp
+    if _smtp is None or not _smtp.is_connected:
+        _smtp = aiosmtplib.SMTP(
+            hostname=conf.MAIL_SERVER,
+            port=conf.MAIL_PORT,
+            username=conf.MAIL_USERNAME or None,
+            password=conf.MAIL_PASSWORD.get_secret_value(),
+            use_tls=conf.MAIL_SSL_TLS,
+            start_tls=conf.MAIL_STARTTLS,
+            timeout=settings.email_smtp_timeout_seconds,
+        )
+        await _smtp.connect()
+    return _smtp
+
+
+async def _close_connection():
+    global _smtp
+    if _smtp is not None and _smtp.is_connected:
+        try:
+            await _smtp.quit()
+        except aiosmtplib.SMTPException:
+            _smtp.close()
+    _smtp = None
+
+
+def _expire_at() -> datetime:
+    return datetime.utcnow() + timedelta(seconds=settings.email_outbox_retention_seconds)
+
+
+def _retry_delay(attempts: int) -> timedelta:
+    return timedelta(seconds=settings.email_outbox_retry_base_seconds * (2 ** attempts))
+
+
+async def _deliver(message: dict):
+    start = time.perf_counter()
+    try:
+        smtp = await _connection()
+        await smtp.send_message(_build_message(message))
+    except (aiosmtplib.SMTPException, OSError) as e:
+        EMAIL_SEND_DURATION.labels("error").observe(time.perf_counter() - start)
+        await _close_connection()
+        attempts = message.get("attempts", 0) + 1
+        if attempts >= settings.email_outbox_max_attempts:
+            await outbox_repo.mark_failed(_db, message["_id"], str(e), _expire_at())
+            logger.error("Giving up on outbox message %s after %d attempts: %s", message["_id"], attempts, e)
+        else:
+            await outbox_repo.mark_retry(
+                _db, message["_id"], str(e), datetime.utcnow() + _retry_delay(attempts - 1)
+            )
+            logger.warning("Failed to send outbox message %s (attempt %d): %s", message["_id"], attempts, e)
+    else:
+        EMAIL_SEND_DURATION.labels("sent").observe(time.perf_counter() - start)
+        await outbox_repo.mark_sent(_db, message["_id"], _expire_at())
+
+
+async def dispatch_batch() -> int:
+    """Send up to one batch of due messages and return how many were taken."""
+    stale_before = datetime.utcnow() - timedelta(seconds=settings.email_outbox_lease_seconds)
+    taken = 0
+    while taken < settings.email_outbox_batch_size:
+        message = await outbox_repo.claim_message(_db, stale_before)
+        if message is None:
+            break
+        taken += 1
+        await _deliver(message)
+    return taken
+
+
+async def _run():
+    while True:
+        try:
+            taken = await dispatch_batch()
+        except Exception:
+            logger.exception("Email dispatcher error")
+            taken = 0
+        if taken:
+            continue
+        _wakeup.clear()
+        try:
+            await asyncio.wait_for(_wakeup.wait(), timeout=settings.email_outbox_poll_seconds)
+        except asyncio.TimeoutError:
+            pass
+
+
+def start_email_dispatcher(db: AsyncIOMotorDatabase):
+    global _db, _task, _wakeup
+    _db = db
+    _wakeup = asyncio.Event()
+    _task = asyncio.create_task(_run())
+
+
+async def stop_email_dispatcher():
+    global _task
+    if _task is not None:
+        _task.cancel()
+        await asyncio.gather(_task, return_exceptions=True)
+        _task = None
+    await _close_connection()
+
+
+async def outbox_stats(db: AsyncIOMotorDatabase) -> dict:
+    return await outbox_repo.count_by_status(db)
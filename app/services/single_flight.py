@@ -0,0 +1,49 @@
+# app/services/single_flight.py
+# Coalesces concurrent calls that share a key onto one in-flight task
+
+import asyncio
+from typing import Awaitable, Callable, Dict, Optional
+
+from prometheus_client import Counter
+
+
+class SingleFlight:
+    def __init__(self, counter: Optional[Counter] = None):
+        # `counter` gets one increment per call, labelled "upstream" or "coalesced"
+        self._counter = counter
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable]):
+        """Run `fn` once per key; callers arriving while it runs share its result."""
+        self.calls += 1
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+            result = "upstream"
+        else:
+            self.coalesced += 1
+            result = "coalesced"
+        if self._counter is not None:
+            self._counter.labels(result).inc()
+        # A caller that disconnects must not cancel the call the others are waiting on
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: asyncio.Future):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        if not task.cancelled():
+            # Mark the exception as retrieved even if every caller went away
+            task.exception()
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "upstream_calls": self.calls - self.coalesced,
+            "coalesced_calls": self.coalesced,
+            "coalescing_ratio": self.coalesced / self.calls if self.calls else 0.0,
+            "in_flight": len(self._in_flight),
+        }
@@ -6,22 +6,23 @@ import string
 from typing import Optional
 from bson import ObjectId
 from jose import JWTError, jwt
-from app.services.email_service import send_email
+from app.services.email_outbox import enqueue_email
 from app.settings import settings
 
 import pymongo
 from pymongo.collection import Collection
+from motor.motor_asyncio import AsyncIOMotorDatabase
 from fastapi import HTTPException, status, Depends
 from app.dependencies import get_database
+from app.repositories import projections
+from app.repositories import users as users_repo
+from app.services.auth_cache import invalidate_user
 from app.schemas.user import User, UserCreate, UserDetails
-from app.security.security import get_password_hash
-from passlib.context import CryptContext
+from app.security.security import get_password_hash_async
 
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-def create_user(user: UserCreate, db: Collection = Depends(get_database)):
-    hashed_password = get_password_hash(pwd_context, user.password)
+async def create_user(user: UserCreate, db: AsyncIOMotorDatabase):
+    hashed_password = await get_password_hash_async(user.password)
     new_user = {
         "username": user.username,
         "email": user.email,
@@ -35,7 +36,7 @@ def create_user(user: UserCreate, db: Collection = Depends(get_database)):
         "consultation_balance": 5,
     }
     try:
-        db['users'].insert_one(new_user)
+        await users_repo.insert_user(db, new_user)
     except pymongo.errors.DuplicateKeyError:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -63,26 +64,23 @@ def create_user(user: UserCreate, db: Collection = Depends(get_database)):
      
 
 
-def get_user_by_username(username: str, db: Collection = Depends(get_database)) -> Optional[UserDetails]:
-    user_data = db['users'].find_one({"username": username})
+async def find_user_by_username(username: str, db: AsyncIOMotorDatabase) -> Optional[User]:
+    user_data = await users_repo.find_user_by_username(db, username, projections.USER_AUTH)
     if user_data:
-        user_id = str(user_data.pop('_id'))  # Convert ObjectId to string and remove from user_data
-        return User(id=user_id, **user_data)  # Create User instance using the retrieved data
+        user_id = str(user_data.pop('_id'))
+        return User(id=user_id, **user_data)
     return None
 
-def get_user_by_id(user_id: str,db):
-    try:
-        # Convert the string ID to ObjectId
-        object_id = ObjectId(user_id)
-    except Exception as e:
-        raise ValueError("Invalid ObjectId format") from e
+async def get_user_by_id(user_id: str, db: AsyncIOMotorDatabase):
+    if not ObjectId.is_valid(user_id):
+        raise ValueError("Invalid ObjectId format")
     
     # Fetch the user data from the database
-    user_data = db['users'].find_one({"_id": object_id})
+    user_data = await users_repo.find_user_by_id(db, user_id)
     return user_data
 
-def get_user_by_email(email: str, db: Collection):
-    user = db['users'].find_one({"email": email})
+async def get_user_by_email(email: str, db: AsyncIOMotorDatabase):
+    user = await users_repo.find_user_by_email(db, email)
     if user is None:
         return None
     return user
@@ -121,7 +119,10 @@ def user_change_role(user,  db ,role):
     update = {
         "$set": {"role": role}
     }
-    result = db["users"].find_one_and_update(query, update, return_document=pymongo.ReturnDocument.AFTER)
+    result = db["users"].find_one_and_update(
+        query, users_repo.with_auth_version(update), return_document=pymongo.ReturnDocument.AFTER
+    )
+    invalidate_user(user.username)
 
     if not result:
         raise HTTPException(
@@ -163,7 +164,10 @@ def user_change_mail(user,  db ,email):
     update = {
         "$set": {"email": email, "is_valid" : False}
     }
-    result = db["users"].find_one_and_update(query, update, return_document=pymongo.ReturnDocument.AFTER)
+    result = db["users"].find_one_and_update(
+        query, users_repo.with_auth_version(update), return_document=pymongo.ReturnDocument.AFTER
+    )
+    invalidate_user(user.username)
 
     if not result:
         raise HTTPException(
@@ -184,11 +188,11 @@ async def send_validation_code(user, db):
         "$set": {"validationCode": validationCode, "validationCodeAttempt": 3}
     }
 
-    db["users"].find_one_and_update(query, update, return_document=pymongo.ReturnDocument.AFTER)
+    await users_repo.find_and_update_user(db, query, update)
     body = f"Validation Code : {validationCode}"
     print(user.email)
     try:
-        await send_email(user.email, "Reset Your Password", body)
+        await enqueue_email(db, user.email, "Reset Your Password", body)
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to send email")
 
@@ -216,7 +220,10 @@ def verify_validation_code(user,  db , verifyObject):
             "$set": {"validationCode": "", "validationCodeAttempt": None ,"is_valid":True}
         }
 
-        db["users"].find_one_and_update(query, update, return_document=pymongo.ReturnDocument.AFTER)
+        db["users"].find_one_and_update(
+            query, users_repo.with_auth_version(update), return_document=pymongo.ReturnDocument.AFTER
+        )
+        invalidate_user(user.username)
 
     else :
 
@@ -12,6 +12,106 @@ class Settings(BaseSettings):
     secret_key: str = os.getenv('API_SECRET_KEY')
     algorithm: str = 'HS256'
     access_token_expire_minutes: int = 180
+    admin_usernames: str = os.getenv('ADMIN_USERNAMES', '')
+    # Cached token claims and user records; other workers see changes after this TTL
+    auth_cache_ttl_seconds: int = 30
+    auth_cache_max_entries: int = 10000
+    # Password hashing; stored hashes with a different cost are rehashed on login
+    bcrypt_rounds: int = 12
+    password_hash_workers: int = 4
+
+    # MongoDB connection pool
+    mongo_max_pool_size: int = 100
+    mongo_min_pool_size: int = 0
+    mongo_max_idle_time_ms: int = 60000
+    mongo_wait_queue_timeout_ms: int = 5000
+    mongo_connect_timeout_ms: int = 5000
+    mongo_server_selection_timeout_ms: int = 5000
+    mongo_socket_timeout_ms: int = 30000
+    mongo_read_concern: str = 'local'
+    mongo_write_concern: str = 'majority'
+    mongo_write_timeout_ms: int = 5000
+
+    # AI upstream (mostachari_text_101)
+    ai_upstream_url: str = 'http://167.71.66.203:8081/api/v1/mostachari_text_101/response'
+    ai_stream_url: str = 'http://167.71.66.203:8081/api/v1/mostachari_text_101/response/stream'
+    ai_model: str = 'gpt-4o'
+    ai_connect_timeout_seconds: float = 5.0
+    ai_read_timeout_seconds: float = 120.0
+    ai_max_connections: int = 50
+    ai_max_keepalive_connections: int = 20
+    ai_max_retries: int = 2
+    ai_retry_backoff_seconds: float = 0.5
+    # Longest Retry-After of a 503 that is still retried rather than passed on
+    ai_retry_after_max_seconds: float = 2.0
+    ai_circuit_failure_threshold: int = 5
+    ai_circuit_reset_seconds: float = 30.0
+    # Admission control in front of the upstream, per worker process
+    ai_max_concurrent_calls: int = 16
+    ai_admission_queue_size: int = 32
+    ai_admission_wait_seconds: float = 2.0
+    ai_admission_retry_after_seconds: int = 5
+    # Consultations one account may have in progress, across all workers
+    consultation_max_per_user: int = 2
+    # Covers the admission wait plus the slowest upstream call; frees slots of crashed workers
+    consultation_slot_lease_seconds: int = 600
+
+    # Answer cache for repeated questions
+    answer_cache_enabled: bool = True
+    answer_cache_max_entries: int = 1000
+    answer_cache_ttl_seconds: int = 86400
+    answer_cache_persistent: bool = False
+
+    consultations_max_page_size: int = 50
+    # Store aiResponse/articlesData as zstd-compressed BSON (needs zstandard); reads handle both formats
+    consultation_storage_compression: bool = False
+    consultation_storage_zstd_level: int = 3
+    # With storage compression on, only this much of the answer stays plain text for search
+    consultation_search_answer_max_chars: int = 2000
+    consultations_batch_max_ids: int = 100
+    consultations_search_max_query_length: int = 200
+
+    # Email outbox dispatcher
+    email_outbox_batch_size: int = 20
+    email_outbox_poll_seconds: float = 5.0
+    email_outbox_max_attempts: int = 5
+    email_outbox_retry_base_seconds: int = 30
+    email_outbox_lease_seconds: int = 300
+    # Sent and failed messages are deleted this long after they finish
+    email_outbox_retention_seconds: int = 7 * 86400
+    email_smtp_timeout_seconds: float = 30.0
+
+    # Background consultation jobs
+    consultation_job_workers: int = 4
+    consultation_job_queue_size: int = 100
+    consultation_job_lease_seconds: int = 300
+    # Pending or running jobs one account may have at a time, across all workers
+    consultation_job_max_per_user: int = 5
+
+    # Production server (serve.py); each worker process opens its own Mongo clients
+    web_host: str = "0.0.0.0"
+    web_port: int = 8000
+    web_workers: int = os.cpu_count() or 1
+    # Time in-flight requests get to finish after SIGTERM before workers are stopped
+    web_graceful_shutdown_seconds: int = 30
+    readiness_timeout_seconds: float = 2.0
+    # Client networks allowed to scrape /metrics (comma-separated CIDRs)
+    metrics_allowed_networks: str = "127.0.0.0/8,::1/128,10.0.0.0/8,172.16.0.0/12,192.168.0.0/16"
+
+    # Response compression; smaller bodies are sent as they are
+    compression_min_size: int = 1024
+    compression_gzip_level: int = 6
+    compression_brotli_quality: int = 4
+
+    # Adaptive (AIMD) limit on in-flight requests per worker
+    concurrency_initial_limit: int = 100
+    concurrency_min_limit: int = 10
+    concurrency_max_limit: int = 500
+    # Critical requests slower than this shrink the limit
+    concurrency_latency_threshold_ms: int = 500
+    concurrency_backoff_ratio: float = 0.9
+    # Share of the limit consultation creation may occupy
+    concurrency_bulk_share: float = 0.5
 
 
 settings = Settings()
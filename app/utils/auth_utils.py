@@ -1,22 +1,34 @@
 # app/utils/auth_utils.py
 
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt, JWTError
-from pymongo.collection import Collection
+from motor.motor_asyncio import AsyncIOMotorDatabase
 from app.settings import settings
-from app.dependencies import get_database
+from app.dependencies import get_async_database
 from app.services.auth_service import verify_token
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/token")
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Collection = Depends(get_database)):
+async def get_current_user(request: Request, token: str = Depends(oauth2_scheme), db: AsyncIOMotorDatabase = Depends(get_async_database)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        return verify_token(token, credentials_exception, db)
+        claims = getattr(request.state, "claims", None)
+        if getattr(request.state, "token", None) != token:
+            claims = None
+        return await verify_token(token, credentials_exception, db, claims)
     except JWTError:
         raise credentials_exception
+
+def get_admin_user(current_user = Depends(get_current_user)):
+    admins = [name.strip() for name in settings.admin_usernames.split(",") if name.strip()]
+    if current_user.username not in admins:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin privileges required",
+        )
+    return current_user
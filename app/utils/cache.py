@@ -0,0 +1,53 @@
+# app/utils/cache.py
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Bounded in-process cache whose entries also expire after `ttl_seconds`.
+
+    Sync routes invalidate entries from threadpool threads while the event
+    loop reads them, so every operation holds the lock.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value, _ = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, tags=()):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value, frozenset(tags))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_tag(self, tag) -> int:
+        with self._lock:
+            stale = [key for key, (_, _, tags) in self._entries.items() if tag in tags]
+            for key in stale:
+                del self._entries[key]
+            return len(stale)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
@@ -0,0 +1,53 @@
+# Conditional GET helpers: ETag / Last-Modified validators and 304 checks
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+
+from fastapi import Request, Response
+
+
+def make_etag(*parts) -> str:
+    return '"' + "-".join(str(part) for part in parts) + '"'
+
+
+def _utc(value: datetime) -> datetime:
+    # Mongo hands back naive UTC datetimes; HTTP dates have second precision
+    return value.replace(tzinfo=timezone.utc, microsecond=0)
+
+
+def has_validators(request: Request) -> bool:
+    return "if-none-match" in request.headers or "if-modified-since" in request.headers
+
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime]) -> bool:
+    """Evaluate If-None-Match, or If-Modified-Since when there is none (RFC 9110 13.2.2)."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # Weak comparison, so ETags weakened by a compressing proxy still match
+        tags = {tag.strip().replace("W/", "", 1) for tag in if_none_match.split(",")}
+        return "*" in tags or etag in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return _utc(last_modified) <= since
+    return False
+
+
+def set_validators(response: Response, etag: str, last_modified: Optional[datetime]):
+    response.headers["ETag"] = etag
+    if last_modified is not None:
+        response.headers["Last-Modified"] = format_datetime(_utc(last_modified), usegmt=True)
+    # Clients may keep the body but must revalidate before reusing it
+    response.headers["Cache-Control"] = "private, no-cache"
+
+
+def not_modified_response(etag: str, last_modified: Optional[datetime]) -> Response:
+    response = Response(status_code=304)
+    set_validators(response, etag, last_modified)
+    return response
@@ -0,0 +1,85 @@
+"""Throughput of the authentication middleware on a trivial authenticated route.
+
+Compares the previous BaseHTTPMiddleware implementation with the pure ASGI
+`app.middleware.auth.AuthMiddleware`. Run from the repository root:
+
+    python -m benchmarks.auth_middleware --requests 5000 --concurrency 50
+"""
+import argparse
+import asyncio
+import time
+from datetime import timedelta
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from jose import JWTError, jwt
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from app.middleware.auth import AuthMiddleware
+from app.services.auth_service import create_access_token
+from app.settings import settings
+
+
+class LegacyAuthMiddleware(BaseHTTPMiddleware):
+    """The middleware as it was before the pure ASGI rewrite."""
+
+    async def dispatch(self, request: Request, call_next):
+        if not request.url.path.startswith("/api/v1/auth"):
+            token = request.headers.get("Authorization")
+            if token:
+                try:
+                    token = token.split(" ")[1]
+                    payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
+                    request.state.user = payload.get("sub")
+                except JWTError:
+                    return JSONResponse(status_code=498, content={"detail": "Invalid token"})
+                except Exception as e:
+                    return JSONResponse(status_code=401, content={"detail": str(e)})
+        return await call_next(request)
+
+
+def build_app(middleware) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(middleware)
+
+    @app.get("/whoami")
+    async def whoami(request: Request):
+        return {"user": request.state.user}
+
+    return app
+
+
+async def run(app: FastAPI, token: str, total: int, concurrency: int) -> float:
+    headers = {"Authorization": f"Bearer {token}"}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        remaining = iter(range(total))
+
+        async def worker():
+            for _ in remaining:
+                response = await client.get("/whoami", headers=headers)
+                assert response.status_code == 200, response.text
+
+        # Warm up, then time
+        await asyncio.gather(*(client.get("/whoami", headers=headers) for _ in range(concurrency)))
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return total / (time.perf_counter() - start)
+
+
+async def main(total: int, concurrency: int):
+    token = create_access_token({"sub": "benchmark"}, timedelta(minutes=30))
+    results = {}
+    for name, middleware in (("BaseHTTPMiddleware (before)", LegacyAuthMiddleware), ("pure ASGI (after)", AuthMiddleware)):
+        results[name] = await run(build_app(middleware), token, total, concurrency)
+    for name, rps in results.items():
+        print(f"{name:<30} {rps:10.0f} req/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency))
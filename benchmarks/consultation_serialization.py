@@ -0,0 +1,88 @@
+"""Serialization cost of a realistic ~50 KB consultation on GET /consultation/{id}.
+
+"before" returns a ConsultationResponce built in the service, which FastAPI
+dumps and validates again, rendered with the stdlib JSONResponse. "after"
+returns the raw document, configured like the app: no default response
+class, so the response model validates it once and pydantic-core writes the
+JSON bytes directly. Run from the repository root:
+
+    python -m benchmarks.consultation_serialization --requests 2000
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime
+
+import httpx
+from bson import ObjectId
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+
+from app.schemas.Consultation import ConsultationResponce
+
+
+def realistic_document() -> dict:
+    """A consultation whose articlesData and aiResponse add up to roughly 50 KB."""
+    article = {
+        "article_number": "Article 77",
+        "law": "Dahir portant Code des obligations et des contrats",
+        "text": "Tout fait quelconque de l'homme qui, sans l'autorité de la loi, cause sciemment "
+        "et volontairement à autrui un dommage matériel ou moral, oblige son auteur à réparer ledit dommage. " * 3,
+        "score": 0.87,
+    }
+    return {
+        "_id": ObjectId(),
+        "user_id": ObjectId(),
+        "category": ["civil", "obligations"],
+        "title": "Responsabilité délictuelle",
+        "question": "Quelle est la responsabilité d'un voisin en cas de dégât des eaux ?",
+        "aiResponse": {"fr": "Selon l'article 77 du DOC, " + "la réparation est due. " * 400},
+        "articlesData": {"articles": [dict(article, id=i) for i in range(60)]},
+        "creationDate": datetime.utcnow(),
+        "role": "NORMAL",
+        "is_active": 1,
+    }
+
+
+def build_apps(document: dict):
+    before = FastAPI(default_response_class=JSONResponse)
+    after = FastAPI()
+
+    @before.get("/consultation/{id}", response_model=ConsultationResponce)
+    async def legacy(id: str):
+        consultation = {**document, "id": str(document["_id"]), "_id": str(document["_id"])}
+        return ConsultationResponce(**consultation)
+
+    @after.get("/consultation/{id}", response_model=ConsultationResponce)
+    async def single_conversion(id: str):
+        consultation = dict(document)
+        consultation["id"] = consultation.pop("_id")
+        return consultation
+
+    return before, after
+
+
+async def run(app: FastAPI, total: int) -> float:
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        response = await client.get("/consultation/x")
+        assert response.status_code == 200, response.text
+        start = time.perf_counter()
+        for _ in range(total):
+            await client.get("/consultation/x")
+        return (time.perf_counter() - start) / total
+
+
+async def main(total: int):
+    document = realistic_document()
+    before, after = build_apps(document)
+    size = len(ConsultationResponce(**{**document, "id": document["_id"]}).model_dump_json())
+    print(f"payload: {size / 1024:.1f} KB")
+    for name, app in (("before", before), ("after", after)):
+        print(f"{name:<8} {await run(app, total) * 1e6:8.0f} us/request")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests))
@@ -0,0 +1,173 @@
+"""Throughput and latency percentiles of the main API endpoints, in process.
+
+The app runs through an ASGI test transport against an in-memory Mongo
+(mongomock-motor) and a stub mostachari_text_101 upstream with a configurable
+latency, so no network service is needed. Results are written as JSON so runs
+can be compared across commits. Run from the repository root:
+
+    pip install mongomock-motor
+    python -m benchmarks.endpoints --requests 200 --concurrency 20 --upstream-latency-ms 300
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, List
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--upstream-latency-ms", type=float, default=300.0)
+    parser.add_argument("--bcrypt-rounds", type=int, default=4, help="production uses Settings.bcrypt_rounds")
+    parser.add_argument("--answer-cache", action="store_true", help="leave the answer cache on for /consultation/create")
+    parser.add_argument("--output", help="defaults to benchmarks/results/endpoints-<commit>.json")
+    return parser.parse_args()
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    index = min(int(round(fraction * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def current_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def measure(total: int, concurrency: int, call: Callable[[int], Awaitable]) -> dict:
+    latencies = []
+    errors = 0
+    counter = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            start = time.perf_counter()
+            response = await call(i)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {
+        "requests": total,
+        "errors": errors,
+        "throughput_rps": total / elapsed,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+
+
+async def run(args) -> dict:
+    # Imported here so the environment overrides above apply to Settings
+    import httpx
+    from mongomock_motor import AsyncMongoMockClient
+
+    import app.database as database
+    from app.services import ai_client
+    from app.settings import settings
+
+    database._async_client = AsyncMongoMockClient()
+    settings.answer_cache_enabled = args.answer_cache
+    # One user creates every consultation; admission control must not shed the benchmark itself
+    settings.consultation_max_per_user = args.concurrency
+    settings.ai_max_concurrent_calls = max(settings.ai_max_concurrent_calls, args.concurrency)
+    upstream_latency = args.upstream_latency_ms / 1000
+
+    async def stub_upstream(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(upstream_latency)
+        return httpx.Response(200, json={"data": {
+            "llm_response": {"response": "Réponse de référence. " * 200, "output_lang": "fr"},
+            "articlesData": {"articles": [{"id": i, "text": "Article du code. " * 40} for i in range(20)]},
+        }})
+
+    ai_client._client = httpx.AsyncClient(transport=httpx.MockTransport(stub_upstream))
+
+    from main import app
+
+    results = {}
+    password = "Bench#2024pass"
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        def register(i):
+            return client.post("/api/v1/auth/register", json={
+                "username": f"bench{i}", "email": f"bench{i}@example.ma", "password": password,
+                "passwordConfirmation": password, "role": "NORMAL", "phoneNumber": "0612345678",
+            })
+
+        results["POST /auth/register"] = await measure(args.requests, args.concurrency, register)
+        results["POST /auth/token"] = await measure(
+            args.requests, args.concurrency,
+            lambda i: client.post("/api/v1/auth/token", json={"username": f"bench{i}", "password": password}),
+        )
+
+        token = (await client.post("/api/v1/auth/token", json={"username": "bench0", "password": password})).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        await database.get_async_client()[settings.database_name]["users"].update_one(
+            {"username": "bench0"}, {"$set": {"consultation_balance": args.requests}}
+        )
+
+        def create(i):
+            return client.post("/api/v1/consultation/create", headers=headers, json={
+                "category": ["civil"], "title": f"Consultation {i}",
+                "question": f"Question numéro {i} sur la responsabilité civile ?", "lang": "fr",
+            })
+
+        results["POST /consultation/create"] = await measure(args.requests, args.concurrency, create)
+        results["GET /user/details"] = await measure(
+            args.requests, args.concurrency, lambda i: client.get("/api/v1/user/details", headers=headers)
+        )
+        results["GET /consultations"] = await measure(
+            args.requests, args.concurrency, lambda i: client.get("/api/v1/consultations?size=10", headers=headers)
+        )
+        consultation_id = (await client.get("/api/v1/consultations?size=1", headers=headers)).json()[0]["id"]
+        results["GET /consultation/{id}"] = await measure(
+            args.requests, args.concurrency, lambda i: client.get(f"/api/v1/consultation/{consultation_id}", headers=headers)
+        )
+
+    await ai_client.close_ai_client()
+    return results
+
+
+def main():
+    args = parse_args()
+    os.environ["BCRYPT_ROUNDS"] = str(args.bcrypt_rounds)
+    commit = current_commit()
+    results = asyncio.run(run(args))
+
+    report = {
+        "commit": commit,
+        "timestamp": datetime.utcnow().isoformat(),
+        "config": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "upstream_latency_ms": args.upstream_latency_ms,
+            "bcrypt_rounds": args.bcrypt_rounds,
+            "answer_cache": args.answer_cache,
+        },
+        "results": results,
+    }
+    output = args.output or os.path.join("benchmarks", "results", f"endpoints-{commit}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"{'endpoint':<28} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for endpoint, stats in results.items():
+        print(f"{endpoint:<28} {stats['throughput_rps']:9.1f} {stats['p50_ms']:9.1f} "
+              f"{stats['p95_ms']:9.1f} {stats['p99_ms']:9.1f} {stats['errors']:7d}")
+    print(f"written to {output}")
+
+
+if __name__ == "__main__":
+    main()
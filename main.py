@@ -1,41 +1,63 @@
-from fastapi import FastAPI, HTTPException, Request
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
-from pymongo import MongoClient
-from pymongo.server_api import ServerApi
+from app.database import close_mongo_connection, connect_to_mongo, connect_to_mongo_async
+from app.indexes import apply_indexes
+from app.metrics import mark_worker_stopped
+from app.middleware.auth import AuthMiddleware
+from app.middleware.compression import CompressionMiddleware
+from app.middleware.concurrency import ConcurrencyLimitMiddleware
+from app.middleware.metrics import MetricsMiddleware
+from app.services.ai_client import close_ai_client, get_ai_client
+from app.services.consultation_jobs import start_job_workers, stop_job_workers
+from app.services.email_outbox import start_email_dispatcher, stop_email_dispatcher
 from app.settings import settings
-from app.api.v1 import auth, consultation, user
-from starlette.middleware.base import BaseHTTPMiddleware
-from jose import jwt, JWTError
-
-app = FastAPI()
+from app.api import health, metrics
+from app.api.v1 import admin, auth, consultation, user
 
-db_client = None
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Runs once per worker process, so every connection is opened after the worker started
+    connect_to_mongo()
+    async_client = connect_to_mongo_async()
+    # Just a simple operation to validate connection
+    await async_client.admin.command("ping")
+    db = async_client[settings.database_name]
+    await apply_indexes(db)
+    get_ai_client()
+    await start_job_workers(db)
+    start_email_dispatcher(db)
+    try:
+        yield
+    finally:
+        await stop_job_workers()
+        await stop_email_dispatcher()
+        await close_ai_client()
+        close_mongo_connection()
+        mark_worker_stopped()
 
-class AuthMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        if not request.url.path.startswith("/api/v1/auth"):
-            token = request.headers.get("Authorization")
-            if token:
-                try:
-                    token = token.split(" ")[1]
-                    payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
-                    request.state.user = payload.get("sub")
-                except JWTError:
-                    return JSONResponse(status_code=498, content={"detail": "Invalid token"})
-                except Exception as e:
-                    return JSONResponse(status_code=401, content={"detail": str(e)})
-        response = await call_next(request)
-        return response
 
+# No default response class: routes with a response model are then serialized
+# straight to JSON bytes by pydantic-core, validated once and never re-encoded
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(AuthMiddleware)
+# Sheds load before auth or routing spend any work on the request
+app.add_middleware(ConcurrencyLimitMiddleware)
+app.add_middleware(CompressionMiddleware)
+# Added last so it wraps everything and also times auth rejections
+app.add_middleware(MetricsMiddleware)
 
 
 # Including routers
 app.include_router(auth.router, prefix="/api/v1/auth", tags=["auth"])
 app.include_router(user.router, prefix="/api/v1/user", tags=["user"])
 app.include_router(consultation.router, prefix="/api/v1", tags=["consultations"])
+app.include_router(admin.router, prefix="/api/v1/admin", tags=["admin"])
+app.include_router(metrics.router)
+app.include_router(health.router)
 
 origins = [
     "https://152.42.131.144",
@@ -55,6 +77,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
 @app.exception_handler(HTTPException)
@@ -70,19 +93,6 @@ async def custom_http_exception_handler(request, exc: HTTPException):
     
     return JSONResponse(
         status_code=status_code,
-        content={"error": True, "message": error_message}
+        content={"error": True, "message": error_message},
+        headers=getattr(exc, "headers", None),
     )
-
-@app.on_event("startup")
-async def startup_event():
-    global db_client
-    db_client = MongoClient(settings.database_url, server_api=ServerApi('1'), tlsAllowInvalidCertificates=True)
-    db = db_client[settings.database_name]
-    # Just a simple operation to validate connection
-    db.list_collection_names()
-
-@app.on_event("shutdown")
-async def shutdown_event():
-    global db_client
-    if db_client:
-        db_client.close()
@@ -0,0 +1,39 @@
+# Production entry point: `python serve.py`
+#
+# Runs `settings.web_workers` uvicorn worker processes. Workers are spawned,
+# not forked, and import the app themselves, so Mongo clients, the AI client
+# and background tasks are all created inside each worker by the lifespan
+# handler. On SIGTERM uvicorn stops accepting connections, lets in-flight
+# requests finish for up to `web_graceful_shutdown_seconds`, then runs the
+# lifespan shutdown in every worker.
+import os
+import shutil
+import tempfile
+
+import uvicorn
+
+from app.settings import settings
+
+
+def prepare_metrics_dir():
+    # Workers share their Prometheus samples through files in this directory
+    if settings.web_workers <= 1:
+        return
+    path = os.environ.setdefault(
+        "PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "mostachari-metrics")
+    )
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+
+
+if __name__ == "__main__":
+    prepare_metrics_dir()
+    uvicorn.run(
+        "main:app",
+        host=settings.web_host,
+        port=settings.web_port,
+        workers=settings.web_workers,
+        timeout_graceful_shutdown=settings.web_graceful_shutdown_seconds,
+        proxy_headers=True,
+        forwarded_allow_ips="127.0.0.1",
+    )
@@ -0,0 +1,51 @@
+import pytest
+
+from app.api import health
+from app.services.ai_client import CircuitBreaker
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def breaker(monkeypatch):
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=30)
+    monkeypatch.setattr(health, "breaker", breaker)
+    return breaker
+
+
+async def test_healthz(client):
+    response = await client.get("/healthz")
+
+    assert response.status_code == 200
+    assert response.json() == {"status": "ok"}
+
+
+async def test_ready_when_database_answers_and_circuit_is_closed(client, breaker):
+    response = await client.get("/readyz")
+
+    assert response.status_code == 200
+    assert response.json() == {"ready": True, "database": "ok", "ai_circuit": "closed"}
+
+
+async def test_not_ready_when_database_is_unreachable(client, breaker, monkeypatch):
+    class Unreachable:
+        class admin:
+            @staticmethod
+            async def command(name):
+                raise ConnectionError("no primary")
+
+    monkeypatch.setattr(health, "get_async_client", lambda: Unreachable)
+
+    response = await client.get("/readyz")
+
+    assert response.status_code == 503
+    assert response.json()["database"] == "unavailable"
+
+
+async def test_not_ready_while_circuit_is_open(client, breaker):
+    breaker.record_failure()
+
+    response = await client.get("/readyz")
+
+    assert response.status_code == 503
+    assert response.json() == {"ready": False, "database": "ok", "ai_circuit": "open"}
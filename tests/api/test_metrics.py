@@ -0,0 +1,52 @@
+import os
+import subprocess
+import sys
+
+import httpx
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_metrics_are_served_to_internal_clients(client):
+    response = await client.get("/metrics")
+
+    assert response.status_code == 200
+    assert "http_requests_total" in response.text
+
+
+@pytest.mark.parametrize("address", ["203.0.113.5", "2001:db8::1"])
+async def test_metrics_are_hidden_from_public_clients(address):
+    from main import app
+
+    transport = httpx.ASGITransport(app=app, client=(address, 4242))
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await client.get("/metrics")
+
+    assert response.status_code == 403
+
+
+SCRAPE = """
+import asyncio, httpx
+from main import app
+
+async def scrape():
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        await client.get("/healthz")
+        print((await client.get("/metrics")).text)
+
+asyncio.run(scrape())
+"""
+
+
+def test_worker_state_is_published_in_multiprocess_mode(tmp_path):
+    # The metric backend is chosen at import time, hence the separate interpreter
+    env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": str(tmp_path)}
+    output = subprocess.run(
+        [sys.executable, "-c", SCRAPE], env=env, capture_output=True, text=True, check=True,
+    ).stdout
+
+    assert "http_concurrency_limit 100.0" in output
+    assert 'mongo_pool_connections_open{client="async"} 0.0' in output
+    assert "password_hash_queue_length 0.0" in output
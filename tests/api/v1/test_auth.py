@@ -0,0 +1,37 @@
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+REGISTRATION = {
+    "username": "youssef",
+    "email": "youssef@example.ma",
+    "phoneNumber": "0698765432",
+    "role": "NORMAL",
+    "password": "Str0ng#Pass",
+    "passwordConfirmation": "Str0ng#Pass",
+}
+
+
+async def test_register_then_login(client):
+    response = await client.post("/api/v1/auth/register", json=REGISTRATION)
+    assert response.status_code == 200
+    assert response.json()["user"]["username"] == "youssef"
+
+    response = await client.post("/api/v1/auth/token", json={"username": "youssef", "password": "Str0ng#Pass"})
+    assert response.status_code == 200
+    assert response.json()["token_type"] == "bearer"
+
+
+async def test_register_twice_is_rejected(client, db):
+    # The unique indexes are created at startup, which the test client skips
+    await db.users.create_index("username", unique=True)
+    await client.post("/api/v1/auth/register", json=REGISTRATION)
+
+    response = await client.post("/api/v1/auth/register", json=REGISTRATION)
+    assert response.status_code == 400
+
+
+async def test_login_with_a_wrong_password(client, user):
+    response = await client.post("/api/v1/auth/token", json={"username": "amina", "password": "nope"})
+    assert response.status_code == 401
+    assert response.headers["www-authenticate"] == "Bearer"
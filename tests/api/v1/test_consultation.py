@@ -0,0 +1,115 @@
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+from fastapi.datastructures import DefaultPlaceholder
+
+from app.repositories import consultations as consultations_repo
+from app.schemas.Consultation import ConsultationResponce
+from app.services.auth_service import create_access_token
+from app.settings import settings
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def auth():
+    return {"Authorization": f"Bearer {create_access_token({'sub': 'amina'})}"}
+
+
+@pytest.mark.parametrize("route", ["batch-get", "batch-delete"])
+async def test_batches_are_capped(client, user, auth, route):
+    ids = [str(ObjectId()) for _ in range(settings.consultations_batch_max_ids + 1)]
+
+    response = await client.post(f"/api/v1/consultations/{route}", json={"ids": ids}, headers=auth)
+
+    assert response.status_code == 422
+
+
+async def test_batch_at_the_cap(client, user, auth):
+    ids = [str(ObjectId()) for _ in range(settings.consultations_batch_max_ids)]
+
+    response = await client.post("/api/v1/consultations/batch-get", json={"ids": ids}, headers=auth)
+
+    assert response.status_code == 200
+    assert response.json() == {"consultations": [], "missing": ids}
+
+
+async def _pending_job(db, user):
+    result = await consultations_repo.insert_consultation(db, {
+        "user_id": user["_id"], "category": ["civil"], "title": "Bail", "question": "Préavis ?",
+        "lang": "fr", "aiResponse": None, "articlesData": None, "creationDate": datetime.utcnow(),
+        "role": "NORMAL", "is_active": 1, "status": "pending",
+    })
+    return str(result.inserted_id)
+
+
+async def _claim(db, consultation_id):
+    assert await consultations_repo.claim_consultation_job(db, consultation_id, datetime.utcnow())
+
+
+@pytest.mark.parametrize("path", ["/api/v1/consultation/{id}", "/api/v1/consultations"])
+async def test_matching_etag_is_a_304_until_the_job_is_claimed(client, db, user, auth, path):
+    consultation_id = await _pending_job(db, user)
+    url = path.format(id=consultation_id)
+
+    first = await client.get(url, headers=auth)
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+
+    for tag in (etag, f"W/{etag}", f'"other", {etag}'):
+        cached = await client.get(url, headers={**auth, "If-None-Match": tag})
+        assert cached.status_code == 304
+        assert cached.headers["ETag"] == etag
+        assert cached.content == b""
+
+    await _claim(db, consultation_id)
+
+    changed = await client.get(url, headers={**auth, "If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    body = changed.json()
+    assert (body if isinstance(body, dict) else body[0])["status"] == "running"
+
+
+async def test_if_modified_since(client, db, user, auth):
+    consultation_id = await _pending_job(db, user)
+    url = f"/api/v1/consultation/{consultation_id}"
+    last_modified = (await client.get(url, headers=auth)).headers["Last-Modified"]
+
+    cached = await client.get(url, headers={**auth, "If-Modified-Since": last_modified})
+    assert cached.status_code == 304
+
+    older = await client.get(url, headers={**auth, "If-Modified-Since": "Mon, 01 Jan 2001 00:00:00 GMT"})
+    assert older.status_code == 200
+
+    # If-None-Match wins over If-Modified-Since
+    stale_tag = await client.get(
+        url, headers={**auth, "If-Modified-Since": last_modified, "If-None-Match": '"stale"'}
+    )
+    assert stale_tag.status_code == 200
+
+
+async def test_consultation_is_serialized_once_by_its_response_model(client, db, user, auth, monkeypatch):
+    from main import app
+
+    # A default response class would take FastAPI off its direct-to-bytes path
+    assert isinstance(app.router.default_response_class, DefaultPlaceholder)
+    monkeypatch.setattr(settings, "consultation_storage_compression", True)
+    result = await consultations_repo.insert_consultation(db, {
+        "user_id": user["_id"], "category": ["civil"], "title": "Bail", "question": "Préavis ?", "lang": "fr",
+        "aiResponse": {"fr": "Un mois."}, "articlesData": {"627": {"text": "Article 627", "score": 0.9}},
+        "creationDate": datetime(2024, 5, 1), "role": "NORMAL", "is_active": 1,
+    })
+
+    response = await client.get(f"/api/v1/consultation/{result.inserted_id}", headers=auth)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/json"
+    expected = ConsultationResponce(
+        id=str(result.inserted_id), category=["civil"], title="Bail", question="Préavis ?", role="NORMAL",
+        aiResponse={"fr": "Un mois."}, articlesData={"627": {"text": "Article 627", "score": 0.9}},
+        creationDate=datetime(2024, 5, 1),
+    )
+    assert response.content == expected.model_dump_json().encode()
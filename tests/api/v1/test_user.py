@@ -0,0 +1,25 @@
+import pytest
+
+from app.services.auth_service import create_access_token
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_user_details_need_a_token(client, user):
+    response = await client.get("/api/v1/user/details")
+    assert response.status_code == 401
+
+
+async def test_user_details(client, user):
+    token = create_access_token({"sub": "amina"})
+    response = await client.get("/api/v1/user/details", headers={"Authorization": f"Bearer {token}"})
+
+    assert response.status_code == 200
+    assert response.json()["consultation_balance"] == 5
+
+
+async def test_invalid_token_is_a_bearer_challenge(client, user):
+    response = await client.get("/api/v1/user/details", headers={"Authorization": "Bearer not-a-jwt"})
+
+    assert response.status_code == 401
+    assert response.headers["www-authenticate"] == "Bearer"
@@ -1 +1,69 @@
-# Test configuration and fixtures
\ No newline at end of file
+# Test configuration and fixtures
+import os
+
+# Cheap bcrypt for tests; read by the settings when the app is first imported
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+
+import httpx
+import mongomock
+import pytest
+from bson import ObjectId
+from mongomock_motor import AsyncMongoMockClient
+
+from app import database
+from app.services import auth_cache
+from app.settings import settings
+from app.utils.cache import LRUCache
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture(autouse=True)
+def mongo(monkeypatch):
+    """In-memory stand-ins for both Mongo clients, fresh for every test."""
+    client = AsyncMongoMockClient()
+    monkeypatch.setattr(database, "_async_client", client)
+    monkeypatch.setattr(database, "_client", mongomock.MongoClient())
+    # Cached users would outlive the database they were read from
+    monkeypatch.setattr(auth_cache, "_users", LRUCache(settings.auth_cache_max_entries, settings.auth_cache_ttl_seconds))
+    return client
+
+
+@pytest.fixture
+def db(mongo):
+    return mongo[settings.database_name]
+
+
+@pytest.fixture
+async def client():
+    # Imported late so the mocked clients are in place before anything connects
+    from main import app
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        yield client
+
+
+@pytest.fixture
+async def user(db):
+    """A stored NORMAL user with a balance of 5 and the password `Secret#123`."""
+    from app.security.security import get_password_hash_async
+
+    document = {
+        "_id": ObjectId(),
+        "username": "amina",
+        "email": "amina@example.ma",
+        "hashed_password": await get_password_hash_async("Secret#123"),
+        "role": "NORMAL",
+        "is_active": True,
+        "phoneNumber": "0612345678",
+        "is_valid": True,
+        "validationCode": "",
+        "validationCodeAttempt": 0,
+        "consultation_balance": 5,
+    }
+    await db.users.insert_one(document)
+    return document
@@ -0,0 +1,123 @@
+import gzip
+import zlib
+
+import brotli
+import pytest
+from starlette.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+
+from app.middleware.compression import CompressionMiddleware, choose_encoding
+from app.settings import settings
+
+BODY = "Le préavis est d'un mois. " * 100
+
+
+@pytest.mark.parametrize("accept, encoding", [
+    ("gzip, deflate, br", "br"),
+    ("gzip", "gzip"),
+    ("br;q=0, gzip", "gzip"),
+    ("*", "br"),
+    ("identity", None),
+    ("gzip;q=0", None),
+    ("", None),
+])
+def test_choose_encoding(accept, encoding):
+    assert choose_encoding(accept) == encoding
+
+
+async def _call(response: Response, accept="gzip, br", method="GET"):
+    """Run `response` through the middleware and return the ASGI messages it sends."""
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    # ASGI 2.4: streaming responses learn of disconnects from send and never poll receive
+    scope = {
+        "type": "http", "asgi": {"spec_version": "2.4"}, "method": method, "path": "/",
+        "raw_path": b"/", "query_string": b"", "headers": [(b"accept-encoding", accept.encode())],
+    }
+    await CompressionMiddleware(response)(scope, receive, send)
+    return messages
+
+
+def _headers(messages):
+    return {key.decode().lower(): value.decode() for key, value in messages[0]["headers"]}
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("accept, decompress", [
+    ("gzip, br", brotli.decompress),
+    ("gzip", gzip.decompress),
+])
+async def test_large_bodies_are_compressed(accept, decompress):
+    messages = await _call(PlainTextResponse(BODY), accept)
+
+    headers = _headers(messages)
+    assert headers["content-encoding"] == accept.split(",")[-1].strip()
+    assert headers["vary"] == "Accept-Encoding"
+    assert int(headers["content-length"]) == len(messages[1]["body"])
+    assert decompress(messages[1]["body"]).decode() == BODY
+
+
+@pytest.mark.anyio
+async def test_small_bodies_are_sent_as_they_are():
+    body = "x" * (settings.compression_min_size - 1)
+    messages = await _call(PlainTextResponse(body))
+
+    headers = _headers(messages)
+    assert "content-encoding" not in headers
+    # Still varies: a larger body for the same URL would be compressed
+    assert headers["vary"] == "Accept-Encoding"
+    assert messages[1]["body"] == body.encode()
+
+
+@pytest.mark.anyio
+async def test_strong_etag_is_weakened():
+    response = JSONResponse({"text": BODY}, headers={"ETag": '"abc-3"'})
+    messages = await _call(response)
+
+    assert _headers(messages)["etag"] == 'W/"abc-3"'
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("response", [
+    Response(status_code=304, headers={"ETag": '"abc-3"'}),
+    Response(BODY, media_type="image/png"),
+    Response(BODY, media_type="text/plain", headers={"Content-Encoding": "gzip"}),
+])
+async def test_ineligible_responses_pass_through(response):
+    messages = await _call(response)
+
+    headers = _headers(messages)
+    assert headers.get("content-encoding") in (None, "gzip")
+    assert "vary" not in headers
+    assert headers.get("etag") in (None, '"abc-3"')
+
+
+@pytest.mark.anyio
+async def test_each_streamed_event_can_be_decoded_on_arrival():
+    events = [f"event: chunk\ndata: {i}\n\n" for i in range(3)]
+
+    async def stream():
+        for event in events:
+            yield event
+
+    messages = await _call(StreamingResponse(stream(), media_type="text/event-stream"), "gzip")
+
+    assert _headers(messages)["content-encoding"] == "gzip"
+    assert "content-length" not in _headers(messages)
+    decoder = zlib.decompressobj(31)
+    received = [decoder.decompress(message["body"]).decode() for message in messages[1:]]
+    # Every event is readable as soon as its own chunk arrives
+    assert received[:3] == events
+    assert "".join(received) == "".join(events)
+
+
+@pytest.mark.anyio
+async def test_head_requests_are_not_compressed():
+    messages = await _call(PlainTextResponse(BODY), method="HEAD")
+
+    assert "content-encoding" not in _headers(messages)
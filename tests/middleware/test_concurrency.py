@@ -0,0 +1,78 @@
+import httpx
+import pytest
+from starlette.responses import PlainTextResponse
+
+from app.middleware.concurrency import BULK, CRITICAL, AIMDLimiter, ConcurrencyLimitMiddleware
+
+
+def _limiter(initial=100, latency_threshold=0.5):
+    return AIMDLimiter(
+        initial=initial, minimum=10, maximum=500, latency_threshold=latency_threshold,
+        backoff_ratio=0.9, bulk_share=0.5,
+    )
+
+
+def _acquire(limiter, count, priority=CRITICAL):
+    for _ in range(count):
+        assert limiter.try_acquire(priority)
+
+
+def test_slow_requests_in_flight_together_back_off_once():
+    limiter = _limiter()
+    _acquire(limiter, 50)
+
+    for _ in range(50):
+        limiter.release(CRITICAL, 2.0, failed=False)
+
+    assert limiter.limit == 90
+
+
+def test_requests_started_after_a_backoff_can_back_off_again():
+    limiter = _limiter()
+    _acquire(limiter, 1)
+    limiter.release(CRITICAL, 2.0, failed=False)
+
+    _acquire(limiter, 1)
+    # Started after the first cut
+    limiter.release(CRITICAL, 0.0, failed=True)
+
+    assert limiter.limit == pytest.approx(81)
+
+
+def test_limit_grows_while_in_use_and_never_drops_below_the_minimum():
+    limiter = _limiter(initial=10)
+    _acquire(limiter, 6)
+    limiter.release(CRITICAL, 0.01, failed=False)
+    assert limiter.limit == 11
+
+    limiter.release(CRITICAL, None, failed=True)
+    assert limiter.limit == 10
+
+
+def test_bulk_requests_use_a_share_and_do_not_move_the_limit():
+    limiter = _limiter(initial=10)
+    _acquire(limiter, 5, BULK)
+    assert not limiter.try_acquire(BULK)
+    assert limiter.try_acquire(CRITICAL)
+
+    limiter.release(BULK, 30.0, failed=True)
+    assert limiter.limit == 10
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("path, limit", [
+    ("/api/v1/auth/token", 100),
+    ("/api/v1/auth/register", 100),
+    ("/api/v1/consultations", 90),
+])
+async def test_password_hashing_routes_are_not_a_latency_signal(path, limit):
+    limiter = _limiter(latency_threshold=0.0)
+
+    async def app(scope, receive, send):
+        await PlainTextResponse("ok")(scope, receive, send)
+
+    transport = httpx.ASGITransport(app=ConcurrencyLimitMiddleware(app, limiter))
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        await client.post(path)
+
+    assert limiter.limit == pytest.approx(limit)
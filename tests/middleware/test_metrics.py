@@ -0,0 +1,29 @@
+import pytest
+from prometheus_client import REGISTRY
+
+pytestmark = pytest.mark.anyio
+
+
+def _requests(method, route, status):
+    labels = {"method": method, "route": route, "status": status}
+    return REGISTRY.get_sample_value("http_requests_total", labels) or 0
+
+
+async def test_routes_are_labelled_with_their_full_template(client):
+    before = _requests("POST", "/api/v1/auth/register", "422")
+
+    response = await client.post("/api/v1/auth/register", json={})
+
+    assert response.status_code == 422
+    assert _requests("POST", "/api/v1/auth/register", "422") == before + 1
+
+
+async def test_path_parameters_stay_in_the_template(client, user):
+    from app.services.auth_service import create_access_token
+
+    token = create_access_token({"sub": "amina"})
+    before = _requests("GET", "/api/v1/consultation/{id}", "400")
+
+    await client.get("/api/v1/consultation/not-an-id", headers={"Authorization": f"Bearer {token}"})
+
+    assert _requests("GET", "/api/v1/consultation/{id}", "400") == before + 1
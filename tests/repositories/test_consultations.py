@@ -0,0 +1,114 @@
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+from app.repositories import consultation_listings as listings_repo
+from app.repositories import consultations as consultations_repo
+from app.repositories.payload_codec import FORMAT_FIELD, decode_payload
+from app.settings import settings
+
+pytestmark = pytest.mark.anyio
+
+
+def _consultation(user_id, title="Bail", minutes_ago=0):
+    return {
+        "user_id": user_id,
+        "category": ["civil"],
+        "question": "Puis-je résilier mon bail ?",
+        "title": title,
+        "aiResponse": {"fr": "Oui, avec un préavis."},
+        "articlesData": {"627": "Article 627"},
+        "creationDate": datetime(2024, 5, 1) - timedelta(minutes=minutes_ago),
+        "role": "NORMAL",
+        "is_active": 1,
+    }
+
+
+async def test_insert_consultation_adds_search_fields_and_versions(db):
+    user_id = ObjectId()
+    result = await consultations_repo.insert_consultation(db, _consultation(user_id))
+
+    stored = await consultations_repo.find_consultation(db, {"_id": result.inserted_id})
+    assert stored["answer_text"] == "Oui, avec un préavis."
+    assert stored["search_language"] == "french"
+    assert stored["version"] == 1
+    listing = await listings_repo.find_listing_version(db, str(user_id))
+    assert listing["version"] == 1
+
+
+def test_search_text_is_capped_when_payloads_are_compressed(monkeypatch):
+    answer = {"fr": "Le préavis est d'un mois. " * 200}
+    assert consultations_repo.search_fields(answer)["answer_text"] == answer["fr"]
+
+    monkeypatch.setattr(settings, "consultation_storage_compression", True)
+    monkeypatch.setattr(settings, "consultation_search_answer_max_chars", 30)
+    assert consultations_repo.search_fields(answer)["answer_text"] == "Le préavis est d'un mois. Le"
+
+
+async def test_insert_consultation_compressed(db, monkeypatch):
+    monkeypatch.setattr(settings, "consultation_storage_compression", True)
+    consultation = _consultation(ObjectId())
+    result = await consultations_repo.insert_consultation(db, consultation)
+
+    # The caller keeps its decoded copy
+    assert consultation["aiResponse"] == {"fr": "Oui, avec un préavis."}
+    stored = await consultations_repo.find_consultation(db, {"_id": result.inserted_id})
+    assert isinstance(stored["aiResponse"], bytes)
+    assert stored[FORMAT_FIELD] == 1
+    assert decode_payload(stored)["articlesData"] == {"627": "Article 627"}
+
+
+async def test_find_user_consultations_pages_newest_first(db):
+    user_id = ObjectId()
+    for minutes_ago, title in enumerate(["c", "b", "a"]):
+        await consultations_repo.insert_consultation(db, _consultation(user_id, title, minutes_ago))
+    await consultations_repo.insert_consultation(db, _consultation(ObjectId(), "other"))
+
+    first = await consultations_repo.find_user_consultations(db, str(user_id), 2, {"title": 1, "creationDate": 1})
+    assert [c["title"] for c in first] == ["c", "b"]
+
+    last = first[-1]
+    rest = await consultations_repo.find_user_consultations(
+        db, str(user_id), 2, {"title": 1}, after=(last["creationDate"], last["_id"])
+    )
+    assert [c["title"] for c in rest] == ["a"]
+
+
+async def test_deactivate_consultation(db):
+    user_id = ObjectId()
+    result = await consultations_repo.insert_consultation(db, _consultation(user_id))
+
+    deactivated = await consultations_repo.deactivate_consultation(db, str(result.inserted_id))
+    assert deactivated["is_active"] == 0
+    assert deactivated["version"] == 2
+    assert (await listings_repo.find_listing_version(db, str(user_id)))["version"] == 2
+
+    # Already inactive: nothing matched, listing untouched
+    assert await consultations_repo.deactivate_consultation(db, str(result.inserted_id)) is None
+    assert (await listings_repo.find_listing_version(db, str(user_id)))["version"] == 2
+
+
+async def test_batch_reads_and_deletes_are_scoped_to_the_owner(db):
+    owner, other = ObjectId(), ObjectId()
+    mine = (await consultations_repo.insert_consultation(db, _consultation(owner))).inserted_id
+    theirs = (await consultations_repo.insert_consultation(db, _consultation(other))).inserted_id
+
+    found = await consultations_repo.find_user_consultations_by_ids(db, str(owner), [mine, theirs], {"_id": 1})
+    assert [c["_id"] for c in found] == [mine]
+
+    assert await consultations_repo.deactivate_user_consultations(db, str(owner), [mine, theirs]) == [mine]
+    assert (await consultations_repo.find_consultation(db, {"_id": theirs}))["is_active"] == 1
+    assert await consultations_repo.find_user_consultations_by_ids(db, str(owner), [mine]) == []
+
+
+async def test_overlapping_batch_deletes_report_each_id_once(db):
+    owner = ObjectId()
+    ids = [(await consultations_repo.insert_consultation(db, _consultation(owner))).inserted_id for _ in range(3)]
+
+    first = await consultations_repo.deactivate_user_consultations(db, str(owner), ids[:2])
+    second = await consultations_repo.deactivate_user_consultations(db, str(owner), ids)
+
+    assert sorted(first) == sorted(ids[:2])
+    assert second == [ids[2]]
+    assert await consultations_repo.deactivate_user_consultations(db, str(owner), ids) == []
@@ -0,0 +1,24 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.repositories import password_reset_tokens as reset_tokens_repo
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_insert_find_and_mark_token_used(db):
+    expires_at = datetime.utcnow().replace(microsecond=0) + timedelta(hours=1)
+    await reset_tokens_repo.insert_token(db, "amina@example.ma", "t0k3n", expires_at)
+
+    token = await reset_tokens_repo.find_token(db, "t0k3n")
+    assert token["email"] == "amina@example.ma"
+    assert token["expires_at"] == expires_at
+    assert token["used"] is False
+
+    await reset_tokens_repo.mark_token_used(db, "t0k3n")
+    assert (await reset_tokens_repo.find_token(db, "t0k3n"))["used"] is True
+
+
+async def test_find_unknown_token(db):
+    assert await reset_tokens_repo.find_token(db, "missing") is None
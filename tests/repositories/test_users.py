@@ -0,0 +1,36 @@
+import pytest
+
+from app.repositories import users as users_repo
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_find_user_by_username_and_email(db, user):
+    found = await users_repo.find_user_by_username(db, "amina", {"email": 1})
+    assert found == {"_id": user["_id"], "email": "amina@example.ma"}
+
+    found = await users_repo.find_user_by_email(db, "amina@example.ma")
+    assert found["username"] == "amina"
+
+    assert await users_repo.find_user_by_username(db, "nobody") is None
+
+
+async def test_find_and_update_user_returns_the_updated_document(db, user):
+    updated = await users_repo.find_and_update_user(db, {"username": "amina"}, {"$set": {"role": "PRO"}})
+    assert updated["role"] == "PRO"
+
+
+async def test_reserve_consultation_balance_stops_at_zero(db, user):
+    await db.users.update_one({"_id": user["_id"]}, {"$set": {"consultation_balance": 1}})
+
+    reserved = await users_repo.reserve_consultation_balance(db, str(user["_id"]), {"consultation_balance": 1})
+    assert reserved["consultation_balance"] == 0
+
+    assert await users_repo.reserve_consultation_balance(db, str(user["_id"])) is None
+    stored = await users_repo.find_user_by_id(db, str(user["_id"]))
+    assert stored["consultation_balance"] == 0
+
+
+async def test_refund_consultation_balance(db, user):
+    refunded = await users_repo.refund_consultation_balance(db, str(user["_id"]), {"consultation_balance": 1})
+    assert refunded["consultation_balance"] == 6
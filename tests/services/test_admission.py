@@ -0,0 +1,34 @@
+# Per-user admission shared between workers
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+
+from app.services.admission import AdmissionController
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_per_user_cap_holds_across_workers(db, user):
+    user_id = str(user["_id"])
+    first, second = AdmissionController(4, 4, per_user=2, jobs_per_user=2), AdmissionController(4, 4, per_user=2, jobs_per_user=2)
+
+    slots = [await first.enter_user(db, user_id), await second.enter_user(db, user_id)]
+    with pytest.raises(HTTPException) as raised:
+        await first.enter_user(db, user_id)
+    assert raised.value.status_code == 429
+
+    await second.leave_user(db, user_id, slots[1])
+    await first.enter_user(db, user_id)
+    assert first.user_slots == 2 and second.user_slots == 0
+
+
+async def test_expired_slots_are_reclaimed(db, user):
+    user_id = str(user["_id"])
+    stale = {"id": "crashed-worker", "expires_at": datetime.utcnow() - timedelta(seconds=1)}
+    await db.users.update_one({"_id": user["_id"]}, {"$set": {"consultation_slots": [stale]}})
+
+    slot = await AdmissionController(4, 4, per_user=1, jobs_per_user=1).enter_user(db, user_id)
+
+    stored = await db.users.find_one({"_id": user["_id"]})
+    assert [s["id"] for s in stored["consultation_slots"]] == [slot]
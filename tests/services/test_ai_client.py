@@ -0,0 +1,191 @@
+import httpx
+import pytest
+from fastapi import HTTPException
+
+from app.services import ai_client
+from app.services.ai_client import CircuitBreaker, request_ai_response
+from app.settings import settings
+
+pytestmark = pytest.mark.anyio
+
+ANSWER = {"data": {"llm_response": {"response": "Oui", "output_lang": "fr"}}}
+
+
+@pytest.fixture
+def breaker(monkeypatch):
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=30)
+    monkeypatch.setattr(ai_client, "breaker", breaker)
+    return breaker
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Backoff delays the client asked for; nothing actually sleeps."""
+    delays = []
+
+    async def sleep(seconds):
+        delays.append(seconds)
+
+    monkeypatch.setattr(ai_client.asyncio, "sleep", sleep)
+    return delays
+
+
+@pytest.fixture
+def upstream(monkeypatch, breaker, sleeps):
+    """Serves the queued responses (or raises the queued exceptions) in order."""
+    replies = []
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        reply = replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+    monkeypatch.setattr(ai_client, "_client", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    monkeypatch.setattr(settings, "ai_max_retries", 2)
+    return replies, requests
+
+
+def _expire(breaker):
+    breaker.opened_at -= breaker.reset_seconds
+
+
+async def test_retries_a_503_after_its_retry_after(upstream, sleeps):
+    replies, requests = upstream
+    replies += [httpx.Response(503, headers={"Retry-After": "1"}), httpx.Response(200, json=ANSWER)]
+
+    assert await request_ai_response({"question": "q"}) == ANSWER
+    assert len(requests) == 2
+    assert sleeps == [1.0]
+
+
+@pytest.mark.parametrize(
+    "reply",
+    [
+        httpx.Response(502),
+        httpx.Response(504),
+        httpx.Response(503),
+        httpx.Response(503, headers={"Retry-After": "60"}),
+    ],
+)
+async def test_statuses_that_may_follow_generation_are_not_retried(upstream, breaker, reply):
+    replies, requests = upstream
+    replies.append(reply)
+
+    with pytest.raises(HTTPException) as error:
+        await request_ai_response({"question": "q"})
+    assert error.value.status_code == reply.status_code
+    assert len(requests) == 1
+    assert breaker.failures == 1
+
+
+async def test_invalid_json_is_a_502_and_a_failure(upstream, breaker):
+    replies, _ = upstream
+    replies.append(httpx.Response(200, text="<html>proxy error</html>"))
+
+    with pytest.raises(HTTPException) as error:
+        await request_ai_response({"question": "q"})
+    assert error.value.status_code == 502
+    assert breaker.failures == 1
+
+
+async def test_gives_up_after_the_last_retry(upstream, breaker):
+    replies, requests = upstream
+    replies += [httpx.ConnectError("refused")] * 3
+
+    with pytest.raises(HTTPException) as error:
+        await request_ai_response({"question": "q"})
+    assert error.value.status_code == 503
+    assert len(requests) == 3
+    assert breaker.failures == 1
+
+
+async def test_client_errors_are_not_retried(upstream, breaker):
+    replies, requests = upstream
+    replies.append(httpx.Response(422))
+
+    with pytest.raises(HTTPException) as error:
+        await request_ai_response({"question": "q"})
+    assert error.value.status_code == 422
+    assert len(requests) == 1
+    assert breaker.failures == 0
+
+
+async def test_read_timeout_is_a_504_and_not_retried(upstream, breaker):
+    replies, requests = upstream
+    replies.append(httpx.ReadTimeout("slow"))
+
+    with pytest.raises(HTTPException) as error:
+        await request_ai_response({"question": "q"})
+    assert error.value.status_code == 504
+    assert len(requests) == 1
+    assert breaker.failures == 1
+
+
+def test_backoff_uses_full_jitter(monkeypatch):
+    monkeypatch.setattr(settings, "ai_retry_backoff_seconds", 0.5)
+    bounds = []
+    monkeypatch.setattr(ai_client.random, "uniform", lambda low, high: bounds.append((low, high)) or high)
+
+    assert [ai_client._backoff_delay(attempt) for attempt in range(3)] == [0.5, 1.0, 2.0]
+    assert all(low == 0 for low, _ in bounds)
+
+
+async def test_breaker_opens_and_fails_fast(upstream, breaker):
+    replies, requests = upstream
+    replies += [httpx.Response(500), httpx.Response(500)]
+    for _ in range(2):
+        with pytest.raises(HTTPException):
+            await request_ai_response({"question": "q"})
+    assert breaker.state == breaker.OPEN
+
+    with pytest.raises(HTTPException) as error:
+        await request_ai_response({"question": "q"})
+    assert error.value.status_code == 503
+    assert int(error.value.headers["Retry-After"]) > 0
+    assert len(requests) == 2
+
+
+async def test_half_open_trial_closes_the_breaker(upstream, breaker):
+    replies, _ = upstream
+    breaker.record_failure()
+    breaker.record_failure()
+    _expire(breaker)
+    replies.append(httpx.Response(200, json=ANSWER))
+
+    await request_ai_response({"question": "q"})
+    assert breaker.state == breaker.CLOSED
+
+
+def test_half_open_lets_one_trial_through():
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=30)
+    breaker.record_failure()
+    _expire(breaker)
+
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+
+
+def test_abandoned_trial_expires():
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=30)
+    breaker.record_failure()
+    _expire(breaker)
+    assert breaker.allow_request()
+
+    # The trial's outcome is never recorded; its lease runs out instead
+    breaker.trial_started_at -= breaker.reset_seconds
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+
+
+def test_failed_trial_reopens_the_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=30)
+    breaker.record_failure()
+    _expire(breaker)
+    assert breaker.allow_request()
+
+    breaker.record_failure()
+    assert breaker.state == breaker.OPEN
+    assert not breaker.allow_request()
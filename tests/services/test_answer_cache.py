@@ -0,0 +1,84 @@
+import pytest
+
+from app.repositories import answer_cache as answer_cache_repo
+from app.services import answer_cache
+from app.services.answer_cache import cache_key, get_cached_answer, invalidate_category, store_answer
+from app.settings import settings
+from app.utils.cache import LRUCache
+
+pytestmark = pytest.mark.anyio
+
+ANSWER = ({"fr": "Oui"}, {"627": "Article 627"})
+
+
+@pytest.fixture(autouse=True)
+def memory(monkeypatch):
+    monkeypatch.setattr(answer_cache, "_memory", LRUCache(100, 60))
+    monkeypatch.setattr(settings, "answer_cache_persistent", False)
+
+
+def _key(question="Préavis ?"):
+    return cache_key(question, ["civil", "bail"], "fr", "NORMAL")
+
+
+def test_cache_key_ignores_case_spacing_and_category_order():
+    assert cache_key("  Préavis   du BAIL ?", ["bail", "civil"], "fr", "NORMAL") == \
+        cache_key("préavis du bail ?", ["civil", "bail"], "fr", "NORMAL")
+
+
+async def test_stored_answers_are_served_from_memory(db):
+    await store_answer(db, _key(), ["civil", "bail"], *ANSWER)
+
+    assert await get_cached_answer(db, _key()) == ANSWER
+    assert await get_cached_answer(db, _key("Autre ?")) is None
+
+
+async def test_invalidating_a_category(db):
+    await store_answer(db, _key(), ["civil", "bail"], *ANSWER)
+
+    await invalidate_category(db, "bail")
+
+    assert await get_cached_answer(db, _key()) is None
+
+
+async def test_invalidation_by_another_worker_is_seen_on_memory_hits(db):
+    await store_answer(db, _key(), ["civil", "bail"], *ANSWER)
+    await store_answer(db, _key("Héritage ?"), ["famille"], *ANSWER)
+
+    # Another worker bumped the generation; this worker's LRU still has the entry
+    await answer_cache_repo.bump_category_generation(db, "civil")
+
+    assert await get_cached_answer(db, _key()) is None
+    assert len(answer_cache._memory) == 1
+    assert await get_cached_answer(db, _key("Héritage ?")) == ANSWER
+
+
+async def test_answers_stored_after_an_invalidation_are_served(db):
+    await invalidate_category(db, "civil")
+    await store_answer(db, _key(), ["civil", "bail"], *ANSWER)
+
+    assert await get_cached_answer(db, _key()) == ANSWER
+
+
+async def test_answer_generated_across_an_invalidation_is_not_cached(db, monkeypatch):
+    monkeypatch.setattr(settings, "answer_cache_persistent", True)
+    generations = await answer_cache.answer_generations(db, ["civil", "bail"])
+
+    # Invalidated by another worker while the upstream was still answering
+    await invalidate_category(db, "bail")
+    await store_answer(db, _key(), ["civil", "bail"], *ANSWER, generations)
+
+    assert await get_cached_answer(db, _key()) is None
+    assert await answer_cache_repo.find_answer(db, _key()) is None
+
+
+async def test_persistent_hit_is_invalidated_on_every_worker(db, monkeypatch):
+    monkeypatch.setattr(settings, "answer_cache_persistent", True)
+    await store_answer(db, _key(), ["civil", "bail"], *ANSWER)
+    # A second worker with an empty memory cache picks the answer up from Mongo
+    monkeypatch.setattr(answer_cache, "_memory", LRUCache(100, 60))
+    assert await get_cached_answer(db, _key()) == ANSWER
+
+    await invalidate_category(db, "civil")
+
+    assert await get_cached_answer(db, _key()) is None
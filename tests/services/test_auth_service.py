@@ -0,0 +1,149 @@
+import pytest
+from fastapi import HTTPException
+
+from app.schemas.user import ForgotPassword, LoginData, PasswordReset, UserRegister
+from app.services import auth_service
+from app.services.auth_service import (
+    create_access_token,
+    generate_login_access_token,
+    handle_forgot_password,
+    handle_password_reset,
+    handle_user_registration,
+)
+from app.services.auth_cache import decode_access_token
+
+pytestmark = pytest.mark.anyio
+
+
+def _registration(**overrides):
+    fields = {
+        "username": "youssef",
+        "email": "youssef@example.ma",
+        "phoneNumber": "0698765432",
+        "role": "PRO",
+        "password": "Str0ng#Pass",
+        "passwordConfirmation": "Str0ng#Pass",
+    }
+    fields.update(overrides)
+    return UserRegister(**fields)
+
+
+async def test_login_returns_a_token_for_the_user(db, user):
+    response = await generate_login_access_token(LoginData(username="amina", password="Secret#123"), db)
+
+    assert response["user"]["email"] == "amina@example.ma"
+    assert decode_access_token(response["access_token"])["sub"] == "amina"
+
+
+@pytest.mark.parametrize("username, password", [("amina", "wrong"), ("nobody", "Secret#123")])
+async def test_login_rejects_bad_credentials(db, user, username, password):
+    with pytest.raises(HTTPException) as error:
+        await generate_login_access_token(LoginData(username=username, password=password), db)
+    assert error.value.status_code == 401
+
+
+async def test_register_stores_a_hashed_password(db):
+    response = await handle_user_registration(_registration(), db)
+
+    assert response["user"]["consultation_balance"] == 5
+    stored = await db.users.find_one({"username": "youssef"})
+    assert stored["hashed_password"] != "Str0ng#Pass"
+    login = await generate_login_access_token(LoginData(username="youssef", password="Str0ng#Pass"), db)
+    assert login["user"]["role"] == "PRO"
+
+
+@pytest.mark.parametrize("overrides", [
+    {"passwordConfirmation": "Other#Pass1"},
+    {"password": "weak", "passwordConfirmation": "weak"},
+    {"role": "ADMIN"},
+    {"phoneNumber": "12345"},
+])
+async def test_register_validates_input(db, overrides):
+    with pytest.raises(HTTPException) as error:
+        await handle_user_registration(_registration(**overrides), db)
+    assert error.value.status_code == 400
+    assert await db.users.count_documents({}) == 0
+
+
+async def test_forgot_password_queues_a_reset_email(db, user):
+    await handle_forgot_password(ForgotPassword(email="amina@example.ma"), db)
+
+    stored = await db.users.find_one({"username": "amina"})
+    assert stored["reset_token"]
+    message = await db.email_outbox.find_one({"to": "amina@example.ma"})
+    assert stored["reset_token"] in message["body"]
+
+
+async def test_forgot_password_for_unknown_email(db):
+    with pytest.raises(HTTPException) as error:
+        await handle_forgot_password(ForgotPassword(email="ghost@example.ma"), db)
+    assert error.value.status_code == 404
+
+
+async def test_reset_password(db, user):
+    token = auth_service.generate_password_reset_token("amina@example.ma")
+    reset = PasswordReset(newPassword="N3w#Secret", confirmNewPassword="N3w#Secret")
+
+    await handle_password_reset(reset, token, db)
+
+    login = await generate_login_access_token(LoginData(username="amina", password="N3w#Secret"), db)
+    assert login["user"]["username"] == "amina"
+    with pytest.raises(HTTPException):
+        await generate_login_access_token(LoginData(username="amina", password="Secret#123"), db)
+
+
+@pytest.mark.parametrize("token, confirmation, status_code", [
+    ("not-a-jwt", "N3w#Secret", 401),
+    (None, "Mismatch#1", 400),
+])
+async def test_reset_password_rejects(db, user, token, confirmation, status_code):
+    token = token or create_access_token({"sub": "amina@example.ma"})
+    reset = PasswordReset(newPassword="N3w#Secret", confirmNewPassword=confirmation)
+    with pytest.raises(HTTPException) as error:
+        await handle_password_reset(reset, token, db)
+    assert error.value.status_code == status_code
+
+
+async def test_login_rehashes_a_password_stored_with_fewer_rounds(db, user, monkeypatch):
+    from passlib.context import CryptContext
+
+    from app.security import security
+
+    # The configured cost went up since amina's hash (4 rounds in tests) was stored
+    stronger = CryptContext(
+        schemes=["bcrypt"], deprecated="auto",
+        bcrypt__default_rounds=5, bcrypt__min_rounds=5, bcrypt__max_rounds=5,
+    )
+    monkeypatch.setattr(security, "pwd_context", stronger)
+    old_hash = user["hashed_password"]
+    assert stronger.identify(old_hash) == "bcrypt" and "$04$" in old_hash
+
+    await generate_login_access_token(LoginData(username="amina", password="Secret#123"), db)
+
+    new_hash = (await db.users.find_one({"_id": user["_id"]}))["hashed_password"]
+    assert new_hash != old_hash and "$05$" in new_hash
+    assert stronger.verify("Secret#123", new_hash)
+    assert not stronger.needs_update(new_hash)
+
+    # A wrong password leaves the stored hash alone
+    await db.users.update_one({"_id": user["_id"]}, {"$set": {"hashed_password": old_hash}})
+    with pytest.raises(HTTPException):
+        await generate_login_access_token(LoginData(username="amina", password="wrong"), db)
+    assert (await db.users.find_one({"_id": user["_id"]}))["hashed_password"] == old_hash
+
+
+async def test_cached_user_is_dropped_after_a_write_from_another_worker(db, user):
+    from app.repositories import users as users_repo
+    from app.services import auth_cache
+
+    credentials_error = HTTPException(status_code=401)
+    cached = await auth_service.verify_token(None, credentials_error, db, payload={"sub": "amina"})
+    assert await auth_cache.get_cached_user(db, "amina") is cached
+
+    # Another worker takes a unit: its invalidate_user() never reaches this process
+    await users_repo.reserve_consultation_balance(db, str(user["_id"]))
+
+    fresh = await auth_service.verify_token(None, credentials_error, db, payload={"sub": "amina"})
+    assert fresh is not cached
+    assert fresh.consultation_balance == 4
+    assert await auth_cache.get_cached_user(db, "amina") is fresh
@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.schemas.Consultation import ConsultationBase
+from app.services import consultation_jobs
+from app.services.admission import ai_admission
+from app.services.consultation_jobs import submit_consultation_job
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture(autouse=True)
+def queue(monkeypatch):
+    # Workers are not started: submitted jobs just wait in the queue
+    queue = asyncio.Queue(maxsize=10)
+    monkeypatch.setattr(consultation_jobs, "_queue", queue)
+    monkeypatch.setattr(ai_admission, "jobs_per_user", 2)
+    return queue
+
+
+def _request():
+    return ConsultationBase(category=["civil"], title="Bail", question="Préavis ?", lang="fr")
+
+
+async def test_submit_queues_a_pending_job(db, user, queue):
+    job = await submit_consultation_job(str(user["_id"]), _request(), db)
+
+    assert job["status"] == "pending"
+    assert queue.get_nowait() == job["id"]
+    assert (await db.users.find_one({"_id": user["_id"]}))["consultation_balance"] == 4
+
+
+async def test_one_account_cannot_fill_the_queue(db, user, queue):
+    for _ in range(2):
+        await submit_consultation_job(str(user["_id"]), _request(), db)
+
+    with pytest.raises(HTTPException) as error:
+        await submit_consultation_job(str(user["_id"]), _request(), db)
+    assert error.value.status_code == 429
+    assert "Retry-After" in error.value.headers
+    assert queue.qsize() == 2
+    assert (await db.users.find_one({"_id": user["_id"]}))["consultation_balance"] == 3
+
+
+async def test_finished_jobs_free_their_slot(db, user):
+    for _ in range(2):
+        await submit_consultation_job(str(user["_id"]), _request(), db)
+    await db.consultations.update_many({}, {"$set": {"status": "completed"}})
+
+    job = await submit_consultation_job(str(user["_id"]), _request(), db)
+    assert job["status"] == "pending"
+
+
+async def test_failed_insert_refunds_the_reservation(db, user, monkeypatch):
+    async def insert_consultation(db, consultation):
+        raise RuntimeError("insert failed")
+
+    monkeypatch.setattr(consultation_jobs.consultations_repo, "insert_consultation", insert_consultation)
+
+    with pytest.raises(RuntimeError):
+        await submit_consultation_job(str(user["_id"]), _request(), db)
+    assert (await db.users.find_one({"_id": user["_id"]}))["consultation_balance"] == 5
+
+
+async def test_slow_job_keeps_its_lease(db, user, monkeypatch):
+    monkeypatch.setattr(consultation_jobs, "_db", db)
+    monkeypatch.setattr(consultation_jobs.settings, "consultation_job_lease_seconds", 0.3)
+    job = await submit_consultation_job(str(user["_id"]), _request(), db)
+
+    async def get_ai_answer(consultation_data, role, db, interactive=True):
+        # Outlasts the lease several times over
+        await asyncio.sleep(1)
+        return {"answer": "Un mois."}, []
+
+    monkeypatch.setattr(consultation_jobs, "get_ai_answer", get_ai_answer)
+    running = asyncio.create_task(consultation_jobs._run_job(job["id"]))
+    await asyncio.sleep(0.8)
+
+    stale = await consultation_jobs.consultations_repo.find_claimable_job_ids(
+        db, consultation_jobs._stale_before(), False
+    )
+    assert job["id"] not in [str(i) for i in stale]
+    await running
+    assert (await db.consultations.find_one({}))["status"] == "completed"
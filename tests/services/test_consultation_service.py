@@ -0,0 +1,318 @@
+import asyncio
+from datetime import datetime
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+
+from app.schemas.Consultation import ConsultationBase
+from app.services import consultation_service
+from app.services.admission import ai_admission
+from app.services.consultation_service import (
+    create_consultation,
+    delete_consultation,
+    delete_consultations,
+    get_consultation_by_id,
+    get_consultations_by_ids,
+    get_user_consultations,
+    search_consultations,
+    stream_consultation,
+)
+
+pytestmark = pytest.mark.anyio
+
+
+def _request(question):
+    return ConsultationBase(category=["civil"], title="Bail", question=question, lang="fr")
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    """Replaces the AI upstream; set `upstream["error"]` to make it fail."""
+    state = {"calls": 0, "error": None}
+
+    async def request_ai_response(payload):
+        state["calls"] += 1
+        if state["error"] is not None:
+            raise state["error"]
+        return {"data": {
+            "llm_response": {"response": f"Réponse à: {payload['question']}", "output_lang": "fr"},
+            "articlesData": {"627": "Article 627"},
+        }}
+
+    monkeypatch.setattr(consultation_service, "request_ai_response", request_ai_response)
+    return state
+
+
+async def _balance(db, user):
+    return (await db.users.find_one({"_id": user["_id"]}))["consultation_balance"]
+
+
+async def test_create_consultation_stores_the_answer_and_takes_one_unit(db, user, upstream):
+    created = await create_consultation(str(user["_id"]), _request("Préavis du bail ?"), db)
+
+    assert created["aiResponse"] == {"fr": "Réponse à: Préavis du bail ?"}
+    assert await _balance(db, user) == 4
+    stored = await db.consultations.find_one({"_id": ObjectId(created["id"])})
+    assert stored["user_id"] == user["_id"] and stored["is_active"] == 1
+
+
+async def test_create_consultation_without_balance(db, user, upstream):
+    await db.users.update_one({"_id": user["_id"]}, {"$set": {"consultation_balance": 0}})
+
+    with pytest.raises(HTTPException) as error:
+        await create_consultation(str(user["_id"]), _request("Durée du préavis ?"), db)
+    assert error.value.status_code == 402
+    assert upstream["calls"] == 0
+
+
+async def test_create_consultation_refunds_when_the_upstream_fails(db, user, upstream):
+    upstream["error"] = HTTPException(status_code=502, detail="AI service unavailable")
+
+    with pytest.raises(HTTPException):
+        await create_consultation(str(user["_id"]), _request("Dépôt de garantie ?"), db)
+    assert await _balance(db, user) == 5
+    assert await db.consultations.count_documents({}) == 0
+
+
+async def test_read_list_and_delete_consultation(db, user, upstream):
+    user_id = str(user["_id"])
+    created = await create_consultation(user_id, _request("Loyer impayé ?"), db)
+
+    consultation = await get_consultation_by_id(created["id"], user_id, db)
+    assert consultation["question"] == "Loyer impayé ?"
+    # Left as the raw document: the route's response model is the only conversion
+    assert type(consultation) is dict and isinstance(consultation["id"], ObjectId)
+
+    listed, next_cursor = await get_user_consultations(user_id, db, page=1, size=10)
+    assert [str(c["id"]) for c in listed] == [created["id"]]
+    assert next_cursor is None
+
+    await delete_consultation(created["id"], user_id, db)
+    with pytest.raises(HTTPException) as error:
+        await get_consultation_by_id(created["id"], user_id, db)
+    assert error.value.status_code == 404
+    assert (await get_user_consultations(user_id, db, page=1, size=10))[0] == []
+
+
+async def test_other_users_cannot_read_or_delete(db, user, upstream):
+    created = await create_consultation(str(user["_id"]), _request("Expulsion ?"), db)
+    stranger = str(ObjectId())
+
+    with pytest.raises(HTTPException) as error:
+        await get_consultation_by_id(created["id"], stranger, db)
+    assert error.value.status_code == 404
+    with pytest.raises(HTTPException) as error:
+        await delete_consultation(created["id"], stranger, db)
+    assert error.value.status_code == 401
+
+
+@pytest.mark.parametrize("id", ["not-an-id", "123"])
+async def test_invalid_consultation_id(db, user, id):
+    with pytest.raises(HTTPException) as error:
+        await get_consultation_by_id(id, str(user["_id"]), db)
+    assert error.value.status_code == 400
+
+
+async def test_batch_get_and_delete(db, user, upstream):
+    user_id = str(user["_id"])
+    first = await create_consultation(user_id, _request("Question une ?"), db)
+    second = await create_consultation(user_id, _request("Question deux ?"), db)
+    unknown = str(ObjectId())
+
+    batch = await get_consultations_by_ids([second["id"], first["id"], unknown, first["id"]], user_id, db)
+    assert [str(c["id"]) for c in batch["consultations"]] == [second["id"], first["id"]]
+    assert batch["missing"] == [unknown]
+
+    deleted = await delete_consultations([first["id"], "bogus"], user_id, db)
+    assert deleted == {"deleted": [first["id"]], "missing": ["bogus"]}
+    listed, _ = await get_user_consultations(user_id, db, page=1, size=10)
+    assert [str(c["id"]) for c in listed] == [second["id"]]
+
+
+@pytest.fixture
+def stream_upstream(monkeypatch):
+    """A streaming upstream behind a fresh breaker that is in its half-open trial."""
+    from app.services import ai_client
+
+    breaker = ai_client.CircuitBreaker(failure_threshold=1, reset_seconds=30)
+    breaker.record_failure()
+    breaker.opened_at -= breaker.reset_seconds
+    monkeypatch.setattr(ai_client, "breaker", breaker)
+    upstream = SimpleNamespace(breaker=breaker, lines=[], responses=[])
+
+    def handler(request):
+        response = httpx.Response(200, content="".join(line + "\n" for line in upstream.lines).encode())
+        upstream.responses.append(response)
+        return response
+
+    monkeypatch.setattr(ai_client, "_client", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    return upstream
+
+
+async def test_stream_error_event_counts_as_an_upstream_failure(db, user, stream_upstream):
+    breaker, lines = stream_upstream.breaker, stream_upstream.lines
+    lines += ['{"chunk": "Oui"}', '{"error": true, "error_message": "model crashed"}']
+
+    events = [event async for event in await stream_consultation(str(user["_id"]), _request("Flux ?"), db)]
+
+    assert events[-1].startswith("event: error")
+    assert breaker.state == breaker.OPEN
+    assert await _balance(db, user) == 5
+    assert ai_admission.active == 0
+
+
+async def test_stream_abandoned_by_the_client_frees_the_trial(db, user, stream_upstream):
+    breaker, lines = stream_upstream.breaker, stream_upstream.lines
+    lines += ['{"chunk": "Oui"}', '{"chunk": ", bien sûr"}']
+
+    events = await stream_consultation(str(user["_id"]), _request("Déconnexion ?"), db)
+    assert (await events.__anext__()).startswith("event: chunk")
+    # What the server does when the client disconnects
+    await events.aclose()
+
+    assert breaker.trial_started_at is None
+    assert breaker.allow_request()
+    assert await _balance(db, user) == 5
+    assert ai_admission.active == 0
+
+
+async def test_stream_dropped_before_its_first_event_releases_everything(db, user, stream_upstream):
+    stream_upstream.lines.append('{"chunk": "Oui"}')
+
+    stream = await stream_consultation(str(user["_id"]), _request("Jamais lu ?"), db)
+    assert ai_admission.active == 1
+    [upstream] = stream_upstream.responses
+    # The response never started, so nothing iterated the stream
+    await stream.aclose()
+
+    assert upstream.is_closed
+    assert ai_admission.active == 0
+    assert ai_admission.stats()["user_slots"] == 0
+    assert await _balance(db, user) == 5
+    assert stream_upstream.breaker.trial_started_at is None
+
+
+@pytest.mark.parametrize("q, lang, language", [
+    ("préavis", None, "french"),
+    ("résiliation du bail", None, "french"),
+    ("how to end the lease", None, "english"),
+    ("fin de bail", None, "french"),
+    ("bail", None, "none"),
+    ("lease", "en", "english"),
+    ("إنهاء عقد الكراء", None, "none"),
+])
+def test_query_language(q, lang, language):
+    assert consultation_service._query_language(q, lang) == language
+
+
+@pytest.fixture
+def ranked(monkeypatch):
+    """Seven matches with tied scores, ranked the way the aggregation ranks them."""
+    user_id = ObjectId()
+    matches = [
+        {"_id": ObjectId(), "score": score, "title": f"Bail {i}", "question": "?", "category": ["civil"],
+         "role": "NORMAL", "creationDate": datetime.utcnow()}
+        for i, score in enumerate([3.0, 2.0, 2.0, 2.0, 1.5, 1.0, 1.0])
+    ]
+    calls = []
+
+    async def search_user_consultations(db, user_id, text, language, limit, projection=None, after=None):
+        calls.append({"language": language, "after": after})
+        ordered = sorted(matches, key=lambda m: (m["score"], m["_id"]), reverse=True)
+        if after is not None:
+            ordered = [m for m in ordered if (m["score"], m["_id"]) < after]
+        return [dict(m) for m in ordered[:limit]]
+
+    monkeypatch.setattr(consultation_service.consultations_repo, "search_user_consultations", search_user_consultations)
+    return SimpleNamespace(user_id=str(user_id), matches=matches, calls=calls)
+
+
+async def test_search_cursor_walks_every_match_once(db, ranked):
+    seen, cursor = [], None
+    while True:
+        page, cursor = await search_consultations(ranked.user_id, db, "bail", 3, cursor, "fr")
+        seen += [result["id"] for result in page]
+        if cursor is None:
+            break
+
+    assert len(seen) == len(set(seen)) == len(ranked.matches)
+    assert [call["language"] for call in ranked.calls] == ["french"] * 3
+
+
+async def test_search_rejects_a_forged_cursor(db, ranked):
+    with pytest.raises(HTTPException) as error:
+        await search_consultations(ranked.user_id, db, "bail", 3, "bm90LWpzb24")
+    assert error.value.status_code == 400
+
+
+@pytest.fixture
+def gated_upstream(monkeypatch):
+    """An upstream that holds every call until `release` is set, then answers or raises `error`."""
+    from app.services import answer_cache
+    from app.utils.cache import LRUCache
+
+    monkeypatch.setattr(answer_cache, "_memory", LRUCache(100, 60))
+    state = SimpleNamespace(calls=0, error=None, release=asyncio.Event())
+
+    async def request_ai_response(payload):
+        state.calls += 1
+        await state.release.wait()
+        if state.error is not None:
+            raise state.error
+        return {"data": {"llm_response": {"response": "Un mois.", "output_lang": "fr"}}}
+
+    monkeypatch.setattr(consultation_service, "request_ai_response", request_ai_response)
+    return state
+
+
+async def _users(db, user, count):
+    ids = [ObjectId() for _ in range(count)]
+    await db.users.insert_many([
+        {**user, "_id": _id, "username": f"user{i}", "email": f"user{i}@example.ma"}
+        for i, _id in enumerate(ids)
+    ])
+    return [str(_id) for _id in ids]
+
+
+async def _create_together(db, user_ids, question):
+    tasks = [asyncio.ensure_future(create_consultation(user_id, _request(question), db)) for user_id in user_ids]
+    # Let every request reach the upstream call before it answers
+    for _ in range(20):
+        await asyncio.sleep(0)
+    return tasks
+
+
+async def test_identical_requests_share_one_upstream_call(db, user, gated_upstream):
+    user_ids = await _users(db, user, 5)
+
+    coalesced = consultation_service.ai_requests.coalesced
+
+    tasks = await _create_together(db, user_ids, "Durée du préavis ?")
+    # All five are waiting on the same call, none on the answer cache
+    assert consultation_service.ai_requests.coalesced - coalesced == 4
+    gated_upstream.release.set()
+    created = await asyncio.gather(*tasks)
+
+    assert gated_upstream.calls == 1
+    assert len({consultation["id"] for consultation in created}) == 5
+    assert await db.consultations.count_documents({"question": "Durée du préavis ?"}) == 5
+    for user_id in user_ids:
+        assert (await db.users.find_one({"_id": ObjectId(user_id)}))["consultation_balance"] == 4
+
+
+async def test_every_coalesced_request_is_refunded_when_the_call_fails(db, user, gated_upstream):
+    user_ids = await _users(db, user, 5)
+    gated_upstream.error = HTTPException(status_code=502, detail="Failed to fetch AI response")
+
+    tasks = await _create_together(db, user_ids, "Durée du préavis ?")
+    gated_upstream.release.set()
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+
+    assert gated_upstream.calls == 1
+    assert all(isinstance(result, HTTPException) and result.status_code == 502 for result in results)
+    assert await db.consultations.count_documents({}) == 0
+    for user_id in user_ids:
+        assert (await db.users.find_one({"_id": ObjectId(user_id)}))["consultation_balance"] == 5
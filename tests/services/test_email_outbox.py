@@ -0,0 +1,124 @@
+import socket
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from aiosmtpd.controller import Controller
+from aiosmtpd.handlers import Sink
+from pydantic import SecretStr
+
+from app.services import email_outbox
+from app.services.email_outbox import dispatch_batch, enqueue_email
+from app.settings import settings
+
+pytestmark = pytest.mark.anyio
+
+
+class Inbox(Sink):
+    def __init__(self):
+        self.messages = []
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append(envelope)
+        return "250 OK"
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _use_server(monkeypatch, port: int):
+    monkeypatch.setattr(email_outbox, "conf", SimpleNamespace(
+        MAIL_FROM="noreply@mostachari.ma",
+        MAIL_SERVER="127.0.0.1",
+        MAIL_PORT=port,
+        MAIL_USERNAME=None,
+        MAIL_PASSWORD=SecretStr(""),
+        MAIL_SSL_TLS=False,
+        MAIL_STARTTLS=False,
+    ))
+
+
+@pytest.fixture
+async def outbox(db, monkeypatch):
+    monkeypatch.setattr(email_outbox, "_db", db)
+    yield db.email_outbox
+    await email_outbox._close_connection()
+
+
+@pytest.fixture
+def inbox(monkeypatch):
+    """A local SMTP sink the dispatcher delivers to."""
+    handler = Inbox()
+    controller = Controller(handler, hostname="127.0.0.1", port=_free_port())
+    controller.start()
+    _use_server(monkeypatch, controller.port)
+    yield handler
+    controller.stop()
+
+
+async def test_enqueued_message_is_sent(db, outbox, inbox):
+    await enqueue_email(db, "amina@example.ma", "Reset Your Password", "Hi, click on the link")
+    assert (await outbox.find_one())["status"] == "pending"
+
+    assert await dispatch_batch() == 1
+
+    message = await outbox.find_one()
+    assert message["status"] == "sent"
+    assert message["attempts"] == 1
+    assert message["sent_at"] is not None
+    # The reset link is not kept once delivered, and the record itself expires
+    assert message["body"] is None
+    retention = timedelta(seconds=settings.email_outbox_retention_seconds)
+    assert abs(message["expire_at"] - message["sent_at"] - retention) < timedelta(seconds=1)
+    [envelope] = inbox.messages
+    assert envelope.rcpt_tos == ["amina@example.ma"]
+    assert b"Subject: Reset Your Password" in envelope.content
+    assert await dispatch_batch() == 0
+
+
+async def test_failed_deliveries_back_off_then_give_up(db, outbox, monkeypatch):
+    # Nothing listens there, so every attempt is refused
+    _use_server(monkeypatch, _free_port())
+    monkeypatch.setattr(settings, "email_outbox_max_attempts", 2)
+    monkeypatch.setattr(settings, "email_outbox_retry_base_seconds", 30)
+    await enqueue_email(db, "amina@example.ma", "Subject", "Body")
+
+    assert await dispatch_batch() == 1
+    message = await outbox.find_one()
+    assert message["status"] == "pending"
+    assert message["attempts"] == 1
+    assert message["last_error"]
+    delay = message["next_attempt_at"] - datetime.utcnow()
+    assert timedelta(seconds=25) < delay <= timedelta(seconds=30)
+
+    # Not due yet
+    assert await dispatch_batch() == 0
+
+    await outbox.update_one({}, {"$set": {"next_attempt_at": datetime.utcnow()}})
+    assert await dispatch_batch() == 1
+    message = await outbox.find_one()
+    assert message["status"] == "failed"
+    assert message["attempts"] == 2
+    assert message["body"] is None and message["expire_at"] > datetime.utcnow()
+
+
+async def test_stale_sending_messages_are_reclaimed(db, outbox, inbox):
+    await enqueue_email(db, "stale@example.ma", "Subject", "Body")
+    await enqueue_email(db, "busy@example.ma", "Subject", "Body")
+    lease = timedelta(seconds=settings.email_outbox_lease_seconds)
+    # One dispatcher died mid-send long ago; another is sending right now
+    await outbox.update_one({"to": "stale@example.ma"}, {"$set": {
+        "status": "sending", "claimed_at": datetime.utcnow() - lease - timedelta(seconds=1),
+    }})
+    await outbox.update_one({"to": "busy@example.ma"}, {"$set": {
+        "status": "sending", "claimed_at": datetime.utcnow(),
+    }})
+
+    assert await dispatch_batch() == 1
+
+    assert (await outbox.find_one({"to": "stale@example.ma"}))["status"] == "sent"
+    assert (await outbox.find_one({"to": "busy@example.ma"}))["status"] == "sending"
+    assert [envelope.rcpt_tos for envelope in inbox.messages] == [["stale@example.ma"]]
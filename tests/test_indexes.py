@@ -0,0 +1,73 @@
+import pytest
+from bson import ObjectId
+
+from app import indexes
+from app.database import get_client
+from app.indexes import apply_indexes, index_drift
+from app.repositories.consultations import LISTING_INDEX
+from app.settings import settings
+
+
+@pytest.mark.anyio
+async def test_index_with_the_same_keys_is_renamed(db):
+    # As created before the registry named it
+    await db.consultations.create_index(LISTING_INDEX)
+
+    await apply_indexes(db)
+
+    names = set(await db.consultations.index_information())
+    assert names == {"_id_", "user_listing", "user_search"}
+
+
+@pytest.mark.anyio
+async def test_one_failing_index_does_not_block_the_rest(db):
+    await db.users.insert_many([
+        {"_id": ObjectId(), "username": "amina", "email": "a@example.ma"},
+        {"_id": ObjectId(), "username": "amina", "email": "b@example.ma"},
+    ])
+
+    await apply_indexes(db)
+
+    assert "username_unique" not in await db.users.index_information()
+    assert "email_unique" in await db.users.index_information()
+    assert "user_search" in await db.consultations.index_information()
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    # mongomock keeps no text index options, so the text index would always drift
+    registry = {
+        collection: [index for index in models if index.document["name"] != "user_search"]
+        for collection, models in indexes.INDEXES.items()
+    }
+    monkeypatch.setattr(indexes, "INDEXES", registry)
+    return registry
+
+
+def _apply_sync(database):
+    for collection, models in indexes.INDEXES.items():
+        database[collection].create_indexes(models)
+
+
+def test_drift_cli_passes_on_a_matching_database(registry, capsys):
+    _apply_sync(get_client()[settings.database_name])
+
+    assert indexes.main() == 0
+    assert "match the registry" in capsys.readouterr().out
+
+
+def test_drift_cli_reports_every_difference(registry, capsys):
+    database = get_client()[settings.database_name]
+    _apply_sync(database)
+    database.users.drop_index("email_unique")
+    database.users.create_index("email", name="email_unique")
+    database.consultations.create_index("category", name="by_category")
+    database.email_outbox.drop_index("dispatch_queue")
+
+    assert indexes.main() == 1
+    assert sorted(index_drift(database)) == [
+        "consultations: unregistered index by_category",
+        "email_outbox: missing index dispatch_queue {'status': 1, 'next_attempt_at': 1}",
+        "users: index email_unique has options {}, expected {'unique': True}",
+    ]
+    assert "missing index dispatch_queue" in capsys.readouterr().out
@@ -0,0 +1,71 @@
+from datetime import datetime
+from types import SimpleNamespace
+
+import mongomock
+import pytest
+from bson import ObjectId
+
+from app import migrations
+from app.database import get_client
+from app.repositories.payload_codec import FORMAT_FIELD, decode_payload
+from app.settings import settings
+
+ANSWER = {"fr": "Le préavis est d'un mois. " * 200}
+
+
+def _bulk_write(collection, requests, ordered=True):
+    # mongomock's bulk_write passes options this pymongo's UpdateOne no longer accepts
+    modified = sum(collection.update_one(request._filter, request._doc).modified_count for request in requests)
+    return SimpleNamespace(modified_count=modified)
+
+
+@pytest.fixture
+def consultations(monkeypatch):
+    monkeypatch.setattr(mongomock.Collection, "bulk_write", _bulk_write)
+    monkeypatch.setattr(migrations, "BATCH_SIZE", 2)
+    monkeypatch.setattr(migrations, "BATCH_PAUSE_SECONDS", 0)
+    return get_client()[settings.database_name]["consultations"]
+
+
+def _consultation(**fields):
+    return {
+        "_id": ObjectId(), "user_id": ObjectId(), "title": "Bail", "question": "Préavis ?", "lang": "fr",
+        "aiResponse": ANSWER, "articlesData": {"627": "Article 627"}, "creationDate": datetime(2024, 5, 1),
+        "role": "NORMAL", "is_active": 1, **fields,
+    }
+
+
+def test_search_fields_backfill(consultations):
+    consultations.insert_many([_consultation() for _ in range(3)] + [_consultation(search_language="english")])
+
+    assert migrations.backfill_search_fields(consultations.database) == 3
+    assert consultations.count_documents({"search_language": "french", "answer_text": ANSWER["fr"]}) == 3
+    # Already migrated, so a second run has nothing left to do
+    assert migrations.backfill_search_fields(consultations.database) == 0
+
+
+def test_compress_payloads_skips_unfinished_jobs_and_caps_search_text(consultations, monkeypatch):
+    monkeypatch.setattr(settings, "consultation_search_answer_max_chars", 100)
+    consultations.insert_many(
+        [_consultation() for _ in range(3)]
+        + [_consultation(status="pending", aiResponse=None), _consultation(status="running", aiResponse=None)]
+    )
+
+    assert migrations.compress_payloads(consultations.database) == 3
+
+    for stored in consultations.find({FORMAT_FIELD: {"$exists": True}}):
+        assert len(stored["answer_text"]) <= 100
+        assert stored["lang"] == "fr"
+        assert decode_payload(stored)["aiResponse"] == ANSWER
+    assert consultations.count_documents({FORMAT_FIELD: {"$exists": False}}) == 2
+    assert migrations.compress_payloads(consultations.database) == 0
+
+
+def test_cli(consultations, capsys):
+    consultations.insert_one(_consultation())
+
+    assert migrations.main(["search-fields"]) == 0
+    assert "1 consultations updated" in capsys.readouterr().out
+
+    assert migrations.main(["unknown"]) == 2
+    assert "usage" in capsys.readouterr().out
@@ -0,0 +1,54 @@
+import pytest
+
+from app.responses import ClosingStreamingResponse
+
+pytestmark = pytest.mark.anyio
+
+
+class Events:
+    def __init__(self):
+        self.pulled = 0
+        self.closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        self.pulled += 1
+        if self.pulled > 2:
+            raise StopAsyncIteration
+        return "event: chunk\n\n"
+
+    async def aclose(self):
+        self.closed = True
+
+
+SCOPE = {"type": "http", "asgi": {"spec_version": "2.4"}, "method": "POST", "path": "/"}
+
+
+async def _receive():
+    return {"type": "http.disconnect"}
+
+
+async def test_the_stream_is_closed_when_the_response_never_starts():
+    events = Events()
+
+    async def send(message):
+        raise OSError("connection reset")
+
+    with pytest.raises(Exception):
+        await ClosingStreamingResponse(events)(SCOPE, _receive, send)
+    assert events.pulled == 0
+    assert events.closed
+
+
+async def test_the_stream_is_closed_after_a_complete_response():
+    events = Events()
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    await ClosingStreamingResponse(events, media_type="text/event-stream")(SCOPE, _receive, send)
+    assert [m.get("more_body") for m in sent[1:]] == [True, True, False]
+    assert events.closed
@@ -0,0 +1,57 @@
+import threading
+
+from app.utils.cache import LRUCache
+
+
+def test_evicts_the_least_recently_used_entry():
+    cache = LRUCache(max_entries=2, ttl_seconds=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+
+
+def test_expired_entries_are_dropped():
+    cache = LRUCache(max_entries=2, ttl_seconds=0)
+    cache.set("a", 1)
+
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_invalidate_tag():
+    cache = LRUCache(max_entries=10, ttl_seconds=60)
+    cache.set("a", 1, tags=["civil"])
+    cache.set("b", 2, tags=["civil", "penal"])
+    cache.set("c", 3, tags=["penal"])
+
+    assert cache.invalidate_tag("civil") == 2
+    assert cache.get("c") == 3
+
+
+def test_concurrent_readers_and_invalidators():
+    cache = LRUCache(max_entries=50, ttl_seconds=60)
+    errors = []
+
+    def hammer(offset):
+        try:
+            for i in range(2000):
+                key = (i + offset) % 80
+                cache.set(key, i, tags=[key % 3])
+                cache.get((key + 1) % 80)
+                cache.invalidate_tag(i % 3)
+                cache.invalidate(key)
+        except Exception as e:  # a bare OrderedDict raises "mutated during iteration"
+            errors.append(e)
+
+    threads = [threading.Thread(target=hammer, args=(n * 7,)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert len(cache) <= 50